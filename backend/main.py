@@ -1,6 +1,11 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from .routes import router
+from .services.metrics import HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT
+from .services.tracing import trace_request, log_trace
+from .services.profiling import profile_request, PROFILE_HEADER, PROFILE_TOKEN_HEADER
 
 app = FastAPI(title="Excel Q&A API", description="API for querying Excel files using Pandas and Gemini")
 
@@ -14,6 +19,41 @@ app.add_middleware(
 
 app.include_router(router)
 
+def _route_template(request: Request) -> str:
+    # Label by path template ("/jobs/{job_id}"), not raw path, to keep label cardinality bounded
+    for route in [*router.routes, *app.router.routes]:
+        if not hasattr(route, "path"):
+            continue  # included-router wrappers; their routes are matched via `router` above
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Request metrics, a Server-Timing header with the stages traced while serving it, and
+    (opt-in via X-Profile or sampling) a profile whose artifact name is returned in X-Profile-Id.
+    """
+    route = _route_template(request)
+    HTTP_IN_FLIGHT.inc(route=route)
+    start = time.perf_counter()
+    status = 500
+    with trace_request(route) as trace, \
+            profile_request(request.headers.get(PROFILE_HEADER), route, request.headers.get(PROFILE_TOKEN_HEADER)) as profile:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["Server-Timing"] = trace.server_timing()
+            if profile is not None and profile["artifact"]:
+                response.headers["X-Profile-Id"] = profile["artifact"]
+            return response
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=status)
+            log_trace(trace, route=route, method=request.method, status=status)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Excel Q&A API"}
@@ -1,20 +1,60 @@
+import math
 import os
 import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import time
+import uuid
+from typing import List, Literal, Optional
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel
-from .services.excel_service import load_excel_and_get_summary, is_count_query, run_count_query
+from .services.excel_service import load_excel_and_get_summary, is_count_query, run_count_query, \
+    apply_delta, clear_delta_log
+from .services.delta_service import DeltaError
 from .services.llm_service import answer_generative_query
+from .services.metrics import registry, CONTENT_TYPE, QUERY_LATENCY
+from .services.tracing import span, current_trace
+from .services.profiling import profiled
 
 router = APIRouter()
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Generative answers: "retrieval" (relevant rows) or "map_reduce" (full dataset)
+GenerativeMode = Literal["retrieval", "map_reduce"]
+
 class QueryRequest(BaseModel):
-    filename: str
+    filename: Optional[str] = None
+    portfolio: Optional[str] = None  # query a portfolio of uploaded workbooks instead of one file
     query: str
+    mode: GenerativeMode = "retrieval"
+    debug: bool = False  # echo stage timings and cache hits in the response
+
+class PortfolioRequest(BaseModel):
+    filenames: List[str]  # uploaded workbooks, e.g. one per business unit
+
+class BatchQueryRequest(BaseModel):
+    filename: str
+    queries: List[str]
+    mode: GenerativeMode = "retrieval"
+
+class JobRequest(BaseModel):
+    filename: str
+    query: Optional[str] = None          # a single question, answered like /query/
+    queries: Optional[List[str]] = None  # or several, answered like /query/batch
+    mode: GenerativeMode = "retrieval"
+
+class ProfilingConfig(BaseModel):
+    sample_rate: Optional[float] = None    # fraction of profiled-endpoint requests to profile
+    mode: Optional[str] = None             # "cprofile" or "sampling"
+    allow_header: Optional[bool] = None    # honour the X-Profile request header
+
+# Longest a GET /jobs/{id}?wait= call may block waiting for the job to finish
+JOB_MAX_WAIT_SECONDS = 30
 
 @router.post("/upload/")
+@profiled
 async def upload_file(file: UploadFile = File(...)):
     if not file.filename.endswith(('.xls', '.xlsx')):
         raise HTTPException(status_code=400, detail="Only Excel files are supported")
@@ -22,6 +62,8 @@ async def upload_file(file: UploadFile = File(...)):
     file_path = os.path.join(UPLOAD_DIR, file.filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    # A full upload replaces the workbook, so deltas applied to the old one no longer apply
+    clear_delta_log(file_path)
         
     try:
         summary = load_excel_and_get_summary(file_path)
@@ -29,32 +71,283 @@ async def upload_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing Excel file: {str(e)}")
 
-@router.post("/query/")
-async def query_excel(request: QueryRequest):
-    file_path = os.path.join(UPLOAD_DIR, request.filename)
+@router.post("/upload/{filename}/delta")
+@profiled
+async def upload_delta(filename: str, file: UploadFile = File(...)):
+    """
+    Upsert a delta workbook (new and changed vendor rows) into an uploaded dataset,
+    matching rows on the delta key column, without reprocessing the whole workbook.
+    """
+    if not file.filename.endswith(('.xls', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Only Excel files are supported")
+    file_path = _resolve_upload(filename)
+    delta_path = os.path.join(UPLOAD_DIR, f".delta-{uuid.uuid4().hex}{os.path.splitext(file.filename)[1]}")
+    with open(delta_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    try:
+        changes = apply_delta(file_path, delta_path)
+        return {"filename": filename, "message": "Delta applied successfully", "changes": changes}
+    except DeltaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing delta file: {str(e)}")
+    finally:
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+
+@router.put("/portfolios/{name}")
+def put_portfolio(name: str, request: PortfolioRequest):
+    """
+    Create or replace a portfolio: uploaded workbooks queried together through /query/.
+    Workbooks already loaded (e.g. by another portfolio) are reused, not reprocessed.
+    All of them must have the same columns.
+    """
+    from .services.portfolio_service import Portfolio, PortfolioError, save_portfolio
+    portfolio = Portfolio(name, [_resolve_upload(filename) for filename in request.filenames])
+    try:
+        summary = portfolio.summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing Excel file: {str(e)}")
+    try:
+        portfolio.check_schema()
+        save_portfolio(name, request.filenames)
+    except PortfolioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"portfolio": name, "summary": summary}
+
+@router.get("/portfolios/")
+def get_portfolios():
+    from .services.portfolio_service import list_portfolios
+    return {"portfolios": list_portfolios()}
+
+@router.get("/portfolios/{name}")
+def get_portfolio(name: str):
+    return {"portfolio": name, "summary": _resolve_portfolio(name).summary()}
+
+@router.delete("/portfolios/{name}")
+def remove_portfolio(name: str):
+    from .services.portfolio_service import delete_portfolio
+    if not delete_portfolio(name):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return {"portfolio": name, "deleted": True}
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, query, cache, LLM and queue metrics."""
+    from .services import admission, filter_cache, job_queue  # noqa: F401 -- registers their metrics
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+@router.get("/cache/stats")
+async def cache_stats():
+    from .services.filter_cache import filter_cache_stats
+    return {"filter_results": filter_cache_stats()}
+
+def _resolve_upload(filename: str) -> str:
+    file_path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-        
+    return file_path
+
+def answer_query(file_path: str, query: str, mode: str = "retrieval", cancel_event=None) -> dict:
+    """Route one question to the graph, count or generative path; shared by /query/ and jobs."""
+    from .services.excel_service import run_graph_query
+    start = time.perf_counter()
+    result = _answer_query(
+        query,
+        lambda: run_graph_query(file_path, query),
+        lambda: run_count_query(file_path, query),
+        lambda: answer_generative_query(file_path, query, mode=mode, cancel_event=cancel_event),
+    )
+    QUERY_LATENCY.observe(time.perf_counter() - start, type=result["type"])
+    return result
+
+def answer_portfolio_query(portfolio, query: str, mode: str = "retrieval", cancel_event=None) -> dict:
+    """answer_query() over every workbook of a portfolio."""
+    from .services.llm_service import answer_portfolio_query as answer_portfolio_generative
+    from .services.portfolio_service import run_portfolio_graph_query, run_portfolio_count_query
+    start = time.perf_counter()
+    result = _answer_query(
+        query,
+        lambda: run_portfolio_graph_query(portfolio, query),
+        lambda: run_portfolio_count_query(portfolio, query),
+        lambda: answer_portfolio_generative(portfolio, query, mode=mode, cancel_event=cancel_event),
+    )
+    QUERY_LATENCY.observe(time.perf_counter() - start, type=result["type"])
+    return result
+
+def _answer_query(query: str, run_graph, run_count, run_generative) -> dict:
     # Check for graph keyword first
-    from .services.excel_service import is_graph_query, run_graph_query
-    if is_graph_query(request.query):
+    from .services.excel_service import is_graph_query
+    if is_graph_query(query):
         try:
-            graph_data = run_graph_query(file_path, request.query)
+            graph_data = run_graph()
             if "error" in graph_data:
                 return {"answer": graph_data["error"], "type": "error"}
             return {"answer": "Graph generated successfully.", "type": "graph", "graph_data": graph_data}
         except Exception as e:
             return {"answer": f"Error rendering graph: {str(e)}", "type": "error"}
             
-    elif is_count_query(request.query):
+    elif is_count_query(query):
         try:
-            result = run_count_query(file_path, request.query)
+            result = run_count()
             return {"answer": result, "type": "count"}
         except Exception as e:
             return {"answer": f"Error: {str(e)}", "type": "error"}
     else:
         try:
-            answer = answer_generative_query(file_path, request.query)
+            answer = run_generative()
             return {"answer": answer, "type": "generative"}
         except Exception as e:
             return {"answer": f"Error: {str(e)}", "type": "error"}
+
+def _resolve_portfolio(name: str):
+    from .services.portfolio_service import Portfolio, get_portfolio_filenames
+    filenames = get_portfolio_filenames(name)
+    if filenames is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return Portfolio(name, [_resolve_upload(filename) for filename in filenames])
+
+def _too_busy(e) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+@router.post("/query/")
+@profiled
+def query_excel(request: QueryRequest):
+    # Plain `def` so waiting for an admission slot happens in the threadpool, not the event loop
+    from .services.admission import admission, Overloaded
+    from .services.batch_service import classify_query
+    from .services.llm_service import degraded_generative_answer, degraded_portfolio_answer
+    if (request.filename is None) == (request.portfolio is None):
+        raise HTTPException(status_code=400, detail="Give either a filename or a portfolio")
+    if request.portfolio is not None:
+        target = _resolve_portfolio(request.portfolio)
+        answer, degraded_answer = answer_portfolio_query, degraded_portfolio_answer
+    else:
+        target = _resolve_upload(request.filename)
+        answer, degraded_answer = answer_query, degraded_generative_answer
+    with span("intent"):
+        kind = classify_query(request.query)
+    if kind == "generative" and admission.should_shed(kind):
+        admission.record_shed(kind)
+        result = {"answer": degraded_answer(target, request.query, mode=request.mode), "type": "generative",
+                  "degraded": True}
+        return _traced_response(result, request.debug)
+    try:
+        with admission.admit(kind):
+            result = answer(target, request.query, mode=request.mode)
+    except Overloaded as e:
+        raise _too_busy(e)
+    return _traced_response(result, request.debug)
+
+def _traced_response(result: dict, debug: bool) -> JSONResponse:
+    # Serialized here rather than by FastAPI so encoding shows up as its own stage
+    trace = current_trace()
+    if debug and trace is not None:
+        result = {**result, "debug": trace.to_dict()}
+    with span("serialize"):
+        return JSONResponse(jsonable_encoder(result))
+
+@router.get("/admission/stats")
+def admission_stats():
+    from .services.admission import admission
+    return {"shed_mode": admission.shed_mode, "lanes": admission.stats()}
+
+@router.post("/query/batch")
+@profiled
+def query_excel_batch(request: BatchQueryRequest):
+    """Answer several questions about one file; results are returned in query order with timings."""
+    from .services.batch_service import run_batch, BATCH_MAX_QUERIES
+    file_path = _resolve_upload(request.filename)
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    # Plain `def`: FastAPI runs it in its threadpool, so a long batch doesn't block the event loop
+    return run_batch(file_path, request.queries, mode=request.mode)
+
+@router.post("/jobs/", status_code=202)
+def submit_job(request: JobRequest):
+    """Run a long query (or batch) in the background; poll GET /jobs/{job_id} for the result."""
+    from .services.batch_service import run_batch, BATCH_MAX_QUERIES
+    from .services.job_queue import get_job_queue, JobQueueFull
+    file_path = _resolve_upload(request.filename)
+    if request.queries:
+        if len(request.queries) > BATCH_MAX_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+        kind = "batch"
+        fn = lambda cancel_event: run_batch(file_path, request.queries, mode=request.mode, cancel_event=cancel_event)
+    elif request.query:
+        from .services.admission import admission
+        from .services.batch_service import classify_query
+        kind = "query"
+        # Shares the /query/ concurrency limits, but waits for a slot instead of returning 429
+        fn = lambda cancel_event: admission.run_when_admitted(
+            classify_query(request.query),
+            lambda: answer_query(file_path, request.query, mode=request.mode, cancel_event=cancel_event),
+            cancel_event=cancel_event,
+        )
+    else:
+        raise HTTPException(status_code=400, detail="Provide 'query' or 'queries'")
+    try:
+        job_id = get_job_queue().submit(kind, fn, params={"filename": request.filename, "query": request.query,
+                                                          "queries": request.queries, "mode": request.mode})
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/")
+def list_jobs(limit: int = 50):
+    from .services.job_queue import get_job_queue
+    return {"jobs": get_job_queue().list(limit=min(max(limit, 1), 500))}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, wait: float = 0):
+    """Job status and result. `wait` long-polls up to that many seconds for the job to finish."""
+    from .services.job_queue import get_job_queue
+    job = get_job_queue().get(job_id, wait=min(max(wait, 0), JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    from .services.job_queue import get_job_queue
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/profiling/")
+def list_profiles():
+    """Profiling settings and stored artifacts (newest first)."""
+    from .services.profiling import profiler
+    return {"settings": profiler.settings(), "profiles": profiler.list()}
+
+@router.put("/profiling/config")
+def configure_profiling(config: ProfilingConfig, x_profile_token: Optional[str] = Header(None)):
+    """Change profiling settings at runtime; needs the X-Profile-Token header to match PROFILE_ADMIN_TOKEN."""
+    from .services.profiling import profiler
+    if not profiler.admin_token:
+        raise HTTPException(status_code=403, detail="Runtime profiling configuration is disabled (PROFILE_ADMIN_TOKEN is not set)")
+    if not profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+    try:
+        profiler.configure(sample_rate=config.sample_rate, mode=config.mode, allow_header=config.allow_header)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return profiler.settings()
+
+@router.get("/profiling/{name}")
+def download_profile(name: str, top: int = 0):
+    """Download an artifact; for .pstats, `top=N` returns the N costliest functions as text instead."""
+    from .services.profiling import profiler
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if top > 0 and name.endswith(".pstats"):
+        import io
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(top)
+        return PlainTextResponse(out.getvalue())
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
@@ -0,0 +1,161 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .metrics import registry
+from .rate_limiter import RequestCancelled
+from .tracing import span
+
+# Per query type: (max concurrent, max waiting, default service time in seconds)
+ADMISSION_LIMITS = {
+    "count": (int(os.getenv("ADMISSION_COUNT_CONCURRENCY", "8")), int(os.getenv("ADMISSION_COUNT_QUEUE", "32")), 0.5),
+    "graph": (int(os.getenv("ADMISSION_GRAPH_CONCURRENCY", "4")), int(os.getenv("ADMISSION_GRAPH_QUEUE", "16")), 5.0),
+    "generative": (int(os.getenv("ADMISSION_GENERATIVE_CONCURRENCY", "2")),
+                   int(os.getenv("ADMISSION_GENERATIVE_QUEUE", "8")), 30.0),
+}
+# Longest a request waits for a slot before it is turned away
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+# "auto": degrade generative answers when their queue is full; "on": always; "off": never (429 instead)
+ADMISSION_SHED_MODE = os.getenv("ADMISSION_SHED_MODE", "auto")
+# Weight of the newest sample in the service-time moving average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """No capacity for this query type; `retry_after` is the estimated wait in seconds."""
+
+    def __init__(self, kind: str, retry_after: float):
+        self.kind = kind
+        self.retry_after = retry_after
+        super().__init__(f"Too many concurrent {kind} queries. Please retry in about {math.ceil(retry_after)}s.")
+
+
+class _Lane:
+    def __init__(self, concurrency: int, max_queue: int, service_time: float):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.service_time = service_time  # moving average of completed requests
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+
+
+class AdmissionController:
+    """
+    Bounded concurrency per query type with a bounded wait queue in front of it.
+    Requests beyond the queue, or that wait longer than `max_wait`, get Overloaded
+    with a Retry-After estimate from the recent average service time.
+    """
+
+    def __init__(self, limits: dict = None, max_wait: float = ADMISSION_MAX_WAIT, shed_mode: str = ADMISSION_SHED_MODE):
+        self.max_wait = max_wait
+        self.shed_mode = shed_mode
+        self._lanes = {kind: _Lane(*spec) for kind, spec in (limits or ADMISSION_LIMITS).items()}
+        self._cond = threading.Condition()
+
+    def _retry_after(self, lane: _Lane) -> float:
+        # Time for everyone ahead (and this request) to be served at the lane's concurrency
+        return max(1.0, lane.service_time * (lane.waiting + 1) / lane.concurrency)
+
+    def should_shed(self, kind: str) -> bool:
+        """True when requests of `kind` should take the degraded path instead of queueing."""
+        if self.shed_mode == "on":
+            return True
+        if self.shed_mode != "auto":
+            return False
+        with self._cond:
+            lane = self._lanes[kind]
+            return lane.active >= lane.concurrency and lane.waiting >= lane.max_queue
+
+    def record_shed(self, kind: str):
+        with self._cond:
+            self._lanes[kind].shed += 1
+
+    def _acquire(self, kind: str) -> _Lane:
+        lane = self._lanes[kind]
+        with self._cond:
+            if lane.active >= lane.concurrency:
+                if lane.waiting >= lane.max_queue:
+                    lane.rejected += 1
+                    raise Overloaded(kind, self._retry_after(lane))
+                lane.waiting += 1
+                deadline = time.monotonic() + self.max_wait
+                try:
+                    while lane.active >= lane.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            lane.rejected += 1
+                            raise Overloaded(kind, self._retry_after(lane))
+                        self._cond.wait(remaining)
+                finally:
+                    lane.waiting -= 1
+            lane.active += 1
+            lane.admitted += 1
+        return lane
+
+    def _release(self, lane: _Lane, elapsed: float):
+        with self._cond:
+            lane.active -= 1
+            lane.service_time += SERVICE_TIME_ALPHA * (elapsed - lane.service_time)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, kind: str):
+        """Hold one of `kind`'s slots for the duration of the block, or raise Overloaded."""
+        with span("admission_wait"):
+            lane = self._acquire(kind)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(lane, time.monotonic() - start)
+
+    def run_when_admitted(self, kind: str, fn, cancel_event=None):
+        """
+        Run `fn()` in one of `kind`'s slots, waiting out Overloaded instead of failing.
+        For background jobs, which have no client to send a 429 to.
+        """
+        while True:
+            try:
+                lane = self._acquire(kind)
+                break
+            except Overloaded as e:
+                if cancel_event is None:
+                    time.sleep(e.retry_after)
+                elif cancel_event.wait(e.retry_after):
+                    raise RequestCancelled("Cancelled while waiting for capacity")
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self._release(lane, time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                kind: {
+                    "active": lane.active, "waiting": lane.waiting, "concurrency": lane.concurrency,
+                    "max_queue": lane.max_queue, "admitted": lane.admitted, "rejected": lane.rejected,
+                    "shed": lane.shed, "avg_service_seconds": round(lane.service_time, 3),
+                }
+                for kind, lane in self._lanes.items()
+            }
+
+
+admission = AdmissionController()
+
+
+def _lane_stat(field: str):
+    return lambda: {kind: lane[field] for kind, lane in admission.stats().items()}
+
+
+registry.gauge("admission_active", "Queries holding an admission slot, by type.", ("type",), callback=_lane_stat("active"))
+registry.gauge("admission_waiting", "Queries waiting for an admission slot, by type.", ("type",),
+               callback=_lane_stat("waiting"))
+registry.counter("admission_rejected_total", "Queries turned away with 429, by type.", ("type",),
+                 callback=_lane_stat("rejected"))
+registry.counter("admission_shed_total", "Generative queries answered on the degraded path.", ("type",),
+                 callback=_lane_stat("shed"))
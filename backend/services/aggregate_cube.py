@@ -0,0 +1,358 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Group columns with more distinct values than this are aggregated directly, not cached
+MAX_CUBE_CARDINALITY = 200
+# Cached (group column, measure column, row subset) cells
+CUBE_CACHE_SIZE = 256
+CUBE_AGGREGATIONS = {"count", "sum", "mean", "min", "max"}
+
+
+def group_aggregate(frame: pd.DataFrame, x_col, y_col=None, aggregation: str = "count") -> pd.DataFrame:
+    """
+    Plain-pandas counterpart of AggregateCube.aggregate(): one row per `x_col` value
+    that has rows in `frame`, in sorted order. Missing keys and groups without rows
+    (e.g. unused categories) are left out, whichever pandas version is installed.
+    """
+    grouped = frame.groupby(x_col, observed=True, sort=True, dropna=True)
+    if aggregation == "count":
+        result = grouped.size().reset_index(name="count")
+        return result[result["count"] > 0].reset_index(drop=True)
+    return grouped[y_col].agg(aggregation).reset_index()
+
+
+def group_crosstab(frame: pd.DataFrame, row_col, col_col) -> pd.DataFrame:
+    """Plain-pandas counterpart of AggregateCube.crosstab(): no missing keys, no all-zero rows or columns."""
+    table = frame.groupby([row_col, col_col], observed=True, sort=True).size().unstack(fill_value=0)
+    return table.loc[table.any(axis=1), table.any(axis=0)].astype("int64")
+
+
+class AggregateCube:
+    """
+    Lazily materialized group-by cube over one DataFrame. The first request for a
+    (group column, measure column) pair computes size, count, sum, mean, min and
+    max per group in one vectorized pass over factorized codes; every later chart
+    on that pair, with any of those aggregations, is a lookup. Results for a row
+    subset (e.g. sidebar filters) are cached under the caller's `frame_key`.
+
+    Two-dimensional contingency tables (`crosstab`) work the same way: each column
+    pair is encoded once as a single code per row, and the table for any row subset
+    is a bincount over that code masked to the subset.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_cardinality: int = MAX_CUBE_CARDINALITY,
+                 cache_size: int = CUBE_CACHE_SIZE):
+        self.df = df
+        self.max_cardinality = max_cardinality
+        self.cache_size = cache_size
+        self._codes = {}
+        self._pair_codes = {}
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _factorized(self, col):
+        """(codes, uniques) with groups in groupby's sorted order, or None for high-cardinality columns."""
+        if col not in self._codes:
+            try:
+                codes, uniques = pd.factorize(self.df[col], sort=True, use_na_sentinel=True)
+            except TypeError:  # unorderable mixed values
+                codes, uniques = None, None
+            if uniques is not None and len(uniques) > self.max_cardinality:
+                codes, uniques = None, None
+            self._codes[col] = (codes, uniques)
+        return self._codes[col]
+
+    def supports(self, x_col) -> bool:
+        return x_col in self.df.columns and self._factorized(x_col)[0] is not None
+
+    def _compute_cell(self, x_col, y_col, positions) -> dict:
+        codes, uniques = self._factorized(x_col)
+        if positions is not None:
+            codes = codes[positions]
+        valid = codes >= 0
+        codes = codes[valid]
+        n_groups = len(uniques)
+        cell = {"size": np.bincount(codes, minlength=n_groups)}
+        if y_col is not None:
+            values = self.df[y_col].to_numpy(dtype=float, na_value=np.nan)
+            if positions is not None:
+                values = values[positions]
+            values = values[valid]
+            present = ~np.isnan(values)
+            group_codes, values = codes[present], values[present]
+            count = np.bincount(group_codes, minlength=n_groups)
+            total = np.bincount(group_codes, weights=values, minlength=n_groups)
+            lowest = np.full(n_groups, np.nan)
+            highest = np.full(n_groups, np.nan)
+            if len(values):
+                order = np.argsort(group_codes, kind="stable")
+                sorted_codes, sorted_values = group_codes[order], values[order]
+                starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+                groups = sorted_codes[starts]
+                lowest[groups] = np.minimum.reduceat(sorted_values, starts)
+                highest[groups] = np.maximum.reduceat(sorted_values, starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = total / count
+            integer = pd.api.types.is_integer_dtype(self.df[y_col])
+            cell.update({
+                "count": count,
+                "sum": total.astype(np.int64) if integer else total,
+                "mean": mean,
+                "min": lowest,  # float (NaN for empty groups); see _extremes
+                "max": highest,
+            })
+        return cell
+
+    def _positions(self, frame):
+        if frame is None:
+            return None
+        positions = self.df.index.get_indexer(frame.index)
+        if (positions < 0).any():
+            raise ValueError("frame must be a row subset of the cube's DataFrame")
+        return positions
+
+    def _cached(self, key, frame, frame_key, compute):
+        key = key + (frame_key if frame is not None else None,)
+        cacheable = frame is None or frame_key is not None
+        if cacheable:
+            with self._lock:
+                cell = self._cells.get(key)
+                if cell is not None:
+                    self._cells.move_to_end(key)
+                    self.hits += 1
+                    return cell
+                self.misses += 1
+        cell = compute(self._positions(frame))
+        if cacheable:
+            with self._lock:
+                self._cells[key] = cell
+                while len(self._cells) > self.cache_size:
+                    self._cells.popitem(last=False)
+        return cell
+
+    def aggregate(self, x_col, y_col=None, aggregation: str = "count", frame: pd.DataFrame = None,
+                  frame_key=None) -> pd.DataFrame:
+        """
+        Same result as `frame.groupby(x_col).size()` (aggregation "count") or
+        `frame.groupby(x_col)[y_col].agg(aggregation)`, reset to columns
+        [x_col, "count" | y_col]. `frame` defaults to the whole dataset; pass a
+        hashable `frame_key` describing the subset to cache its result too.
+        """
+        source = self.df if frame is None else frame
+        numeric_measure = y_col is not None and pd.api.types.is_numeric_dtype(self.df[y_col]) \
+            and not pd.api.types.is_bool_dtype(self.df[y_col])
+        if not self.supports(x_col) or aggregation not in CUBE_AGGREGATIONS or \
+                (aggregation != "count" and not numeric_measure):
+            return group_aggregate(source, x_col, y_col, aggregation)
+
+        y_col = None if aggregation == "count" else y_col
+        cell = self._cached(("group", x_col, y_col), frame, frame_key,
+                            lambda positions: self._compute_cell(x_col, y_col, positions))
+        _, uniques = self._factorized(x_col)
+        present = cell["size"] > 0  # groupby only reports groups that have rows
+        if aggregation == "count":
+            name, values = "count", cell["size"][present]
+        elif aggregation in ("min", "max"):
+            name, values = y_col, self._extremes(y_col, cell[aggregation][present])
+        else:
+            name, values = y_col, cell[aggregation][present]
+        return pd.DataFrame({
+            x_col: uniques[present],
+            name: values,
+        }).reset_index(drop=True)
+
+    def _extremes(self, y_col, values: np.ndarray) -> np.ndarray:
+        """
+        Per-group minima or maxima of the groups being reported, as integers for an
+        integer column like groupby returns, unless one of them has only missing values.
+        """
+        if pd.api.types.is_integer_dtype(self.df[y_col]) and not np.isnan(values).any():
+            return values.astype(np.int64)
+        return values
+
+    def partials(self, x_col, y_col=None, frame: pd.DataFrame = None, frame_key=None) -> pd.DataFrame:
+        """
+        Mergeable parts of the per-group aggregates: [x_col, "size"] and, for a `y_col`,
+        its non-null "count", "sum" (numeric measures only), "min" and "max". Adding sizes,
+        counts and sums and taking the min of mins and max of maxes over several row sets
+        (e.g. one cube per workbook) gives the aggregates of their union.
+        """
+        source = self.df if frame is None else frame
+        numeric_measure = y_col is not None and pd.api.types.is_numeric_dtype(self.df[y_col]) \
+            and not pd.api.types.is_bool_dtype(self.df[y_col])
+        if not self.supports(x_col) or (y_col is not None and not numeric_measure):
+            grouped = source.groupby(x_col, observed=True)
+            if y_col is None:
+                return grouped.size().reset_index(name="size")
+            parts = ["size", "count", "sum", "min", "max"] if numeric_measure else ["size", "count", "min", "max"]
+            return grouped[y_col].agg(parts).reset_index()
+
+        cell = self._cached(("group", x_col, y_col), frame, frame_key,
+                            lambda positions: self._compute_cell(x_col, y_col, positions))
+        _, uniques = self._factorized(x_col)
+        present = cell["size"] > 0
+        parts = {x_col: uniques[present], "size": cell["size"][present]}
+        if y_col is not None:
+            parts.update({name: cell[name][present] for name in ("count", "sum")})
+            parts.update({name: self._extremes(y_col, cell[name][present]) for name in ("min", "max")})
+        return pd.DataFrame(parts).reset_index(drop=True)
+
+    def _pair(self, row_col, col_col):
+        """Row code `r * n_cols + c` for a column pair (-1 where either value is missing)."""
+        key = (row_col, col_col)
+        if key not in self._pair_codes:
+            row_codes, row_uniques = self._factorized(row_col)
+            col_codes, col_uniques = self._factorized(col_col)
+            combined = row_codes.astype(np.int64) * len(col_uniques) + col_codes
+            combined[(row_codes < 0) | (col_codes < 0)] = -1
+            self._pair_codes[key] = combined
+        return self._pair_codes[key]
+
+    def crosstab(self, row_col, col_col, frame: pd.DataFrame = None, frame_key=None) -> pd.DataFrame:
+        """
+        Counts of rows per (row_col value, col_col value), like `pd.crosstab` on
+        `frame` (default: the whole dataset): missing values are dropped, as are
+        rows/columns with no matches. Both columns must be low-cardinality.
+        """
+        for col in (row_col, col_col):
+            if not self.supports(col):
+                raise ValueError(f"Column '{col}' has too many distinct values for a cross-tab")
+        _, row_uniques = self._factorized(row_col)
+        _, col_uniques = self._factorized(col_col)
+        shape = (len(row_uniques), len(col_uniques))
+
+        def compute(positions):
+            combined = self._pair(row_col, col_col)
+            if positions is not None:
+                combined = combined[positions]
+            return np.bincount(combined[combined >= 0], minlength=shape[0] * shape[1]).reshape(shape)
+
+        counts = self._cached(("crosstab", row_col, col_col), frame, frame_key, compute)
+        rows, cols = counts.any(axis=1), counts.any(axis=0)
+        return pd.DataFrame(
+            counts[rows][:, cols],
+            index=pd.Index(row_uniques[rows], name=row_col),
+            columns=pd.Index(col_uniques[cols], name=col_col),
+        )
+
+    def updated(self, df: pd.DataFrame, changed: np.ndarray) -> "AggregateCube":
+        """
+        Cube over `df`, a later version of this cube's frame in which the rows at the
+        sorted `changed` positions were rewritten or appended. Whole-dataset cells are
+        carried over, with the changed rows' old contributions taken out and their new
+        ones added; cells for row subsets are dropped, since their frames have changed.
+        """
+        cube = AggregateCube(df, self.max_cardinality, self.cache_size)
+        old_changed = changed[changed < len(self.df)]
+        with self._lock:
+            cells = [(key, cell) for key, cell in self._cells.items() if key[3] is None]
+        for key, cell in cells:
+            kind, x_col, y_col, _ = key
+            if kind == "group":
+                patched = self._patch_group(cube, x_col, y_col, cell, old_changed, changed)
+            else:
+                patched = self._patch_crosstab(cube, x_col, y_col, cell, old_changed, changed)
+            if patched is not None:
+                cube._cells[key] = patched
+        return cube
+
+    def _remap(self, cube, col):
+        """
+        (old codes -> new codes with unmatched values sent to a spare slot at the end,
+        new codes, new group count) for `col` in this cube and the updated `cube`.
+        """
+        new_codes, new_uniques = cube._factorized(col)
+        if new_codes is None:
+            return None
+        _, old_uniques = self._factorized(col)
+        remap = pd.Index(new_uniques).get_indexer(pd.Index(old_uniques))
+        return np.where(remap >= 0, remap, len(new_uniques)), new_codes, len(new_uniques)
+
+    def _patch_group(self, cube, x_col, y_col, cell, old_changed, changed):
+        remapped = self._remap(cube, x_col)
+        if remapped is None:
+            return None
+        remap, new_codes, n_groups = remapped
+        old_codes = self._factorized(x_col)[0][old_changed]
+        old_valid = old_codes >= 0
+        old_codes = remap[old_codes]
+        new_codes = new_codes[changed]
+        new_valid = new_codes >= 0
+
+        def carried(values, fill=0):
+            out = np.full(n_groups + 1, fill, dtype=float)
+            out[remap] = values
+            return out
+
+        size = carried(cell["size"])
+        size -= np.bincount(old_codes[old_valid], minlength=n_groups + 1)
+        size += np.bincount(new_codes[new_valid], minlength=n_groups + 1)
+        patched = {"size": size[:n_groups].astype(np.int64)}
+        if y_col is None:
+            return patched
+
+        old_values = self.df[y_col].iloc[old_changed].to_numpy(dtype=float, na_value=np.nan)
+        new_values = cube.df[y_col].iloc[changed].to_numpy(dtype=float, na_value=np.nan)
+        old_present = old_valid & ~np.isnan(old_values)
+        new_present = new_valid & ~np.isnan(new_values)
+        removed_codes, removed = old_codes[old_present], old_values[old_present]
+        added_codes, added = new_codes[new_present], new_values[new_present]
+        count = carried(cell["count"])
+        count -= np.bincount(removed_codes, minlength=n_groups + 1)
+        count += np.bincount(added_codes, minlength=n_groups + 1)
+        total = carried(cell["sum"])
+        total -= np.bincount(removed_codes, weights=removed, minlength=n_groups + 1)
+        total += np.bincount(added_codes, weights=added, minlength=n_groups + 1)
+        lowest, highest = carried(cell["min"], np.nan), carried(cell["max"], np.nan)
+        # Removing a group's current extreme leaves its new extreme unknown: rescan those groups
+        stale = np.unique(removed_codes[(removed <= lowest[removed_codes]) | (removed >= highest[removed_codes])])
+        np.fmin.at(lowest, added_codes, added)
+        np.fmax.at(highest, added_codes, added)
+        stale = stale[stale < n_groups]
+        if len(stale):
+            all_codes = cube._factorized(x_col)[0]
+            rows = np.flatnonzero(np.isin(all_codes, stale))
+            values = cube.df[y_col].iloc[rows].to_numpy(dtype=float, na_value=np.nan)
+            present = ~np.isnan(values)
+            lowest[stale], highest[stale] = np.nan, np.nan
+            np.fmin.at(lowest, all_codes[rows][present], values[present])
+            np.fmax.at(highest, all_codes[rows][present], values[present])
+        count, total = count[:n_groups].astype(np.int64), total[:n_groups]
+        lowest, highest = lowest[:n_groups], highest[:n_groups]
+        lowest[count == 0], highest[count == 0] = np.nan, np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+        integer = pd.api.types.is_integer_dtype(cube.df[y_col])
+        patched.update({
+            "count": count,
+            "sum": total.astype(np.int64) if integer else total,
+            "mean": mean,
+            "min": lowest,
+            "max": highest,
+        })
+        return patched
+
+    def _patch_crosstab(self, cube, row_col, col_col, counts, old_changed, changed):
+        remapped_rows, remapped_cols = self._remap(cube, row_col), self._remap(cube, col_col)
+        if remapped_rows is None or remapped_cols is None:
+            return None
+        row_remap, new_row_codes, n_rows = remapped_rows
+        col_remap, new_col_codes, n_cols = remapped_cols
+        patched = np.zeros((n_rows + 1, n_cols + 1), dtype=np.int64)
+        patched[np.ix_(row_remap, col_remap)] = counts
+        old_rows = self._factorized(row_col)[0][old_changed]
+        old_cols = self._factorized(col_col)[0][old_changed]
+        valid = (old_rows >= 0) & (old_cols >= 0)
+        np.subtract.at(patched, (row_remap[old_rows[valid]], col_remap[old_cols[valid]]), 1)
+        new_rows, new_cols = new_row_codes[changed], new_col_codes[changed]
+        valid = (new_rows >= 0) & (new_cols >= 0)
+        np.add.at(patched, (new_rows[valid], new_cols[valid]), 1)
+        return patched[:n_rows, :n_cols]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cells": len(self._cells), "hits": self.hits, "misses": self.misses}
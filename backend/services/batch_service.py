@@ -0,0 +1,123 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .admission import admission
+from .excel_service import (
+    load_dataframe, is_graph_query, is_count_query, parse_count_filter, count_with_filter, build_graph_data
+)
+from .llm_service import (
+    answer_generative_query, generate_pandas_filters, generate_graph_configs, PRIORITY_BULK
+)
+from .rate_limiter import RequestCancelled
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+
+def classify_query(query: str) -> str:
+    """Same routing order as /query/: graph keywords first, then count, else generative."""
+    if is_graph_query(query):
+        return "graph"
+    if is_count_query(query):
+        return "count"
+    return "generative"
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def run_batch(file_path: str, queries: list, mode: str = "retrieval", api_key: str = "",
+              max_workers: int = BATCH_WORKERS, cancel_event=None) -> dict:
+    """
+    Answer many questions about one workbook. The file is loaded once, count
+    filters the fast path can't resolve and all chart configs are each generated
+    with a single LLM call, and the pandas work runs concurrently. Results come
+    back in query order, each in the /query/ response shape plus its timings.
+    Setting `cancel_event` skips queries that haven't started and aborts model calls.
+    Each query runs in its type's admission lane, waiting for a slot rather than
+    failing, so batches share the /query/ concurrency limits.
+    """
+    batch_start = time.perf_counter()
+    df = load_dataframe(file_path)
+    columns = df.columns.tolist()
+    load_ms = _ms(batch_start)
+
+    kinds = [classify_query(q) for q in queries]
+    timings = [{} for _ in queries]
+    results = [None] * len(queries)
+
+    # Count questions: local parser first, then one LLM call for the rest
+    count_idx = [i for i, kind in enumerate(kinds) if kind == "count"]
+    filters = {}
+    for i in count_idx:
+        start = time.perf_counter()
+        try:
+            filters[i] = parse_count_filter(file_path, queries[i])
+        except Exception:
+            # A fast-path failure only costs this question its shortcut; the LLM handles it
+            filters[i] = None
+        timings[i]["parse_ms"] = _ms(start)
+    unresolved = [i for i in count_idx if filters[i] is None]
+    if unresolved:
+        start = time.perf_counter()
+        generated = generate_pandas_filters([queries[i] for i in unresolved], columns, api_key=api_key,
+                                            priority=PRIORITY_BULK)
+        llm_ms = _ms(start)
+        for i, filter_string in zip(unresolved, generated):
+            filters[i] = filter_string
+            timings[i]["llm_ms"] = llm_ms  # shared by every query in the LLM batch
+
+    # Chart questions: one LLM call for all configs
+    graph_idx = [i for i, kind in enumerate(kinds) if kind == "graph"]
+    configs = {}
+    if graph_idx:
+        start = time.perf_counter()
+        try:
+            generated = generate_graph_configs([queries[i] for i in graph_idx], columns, api_key=api_key,
+                                               df=df, priority=PRIORITY_BULK)
+        except Exception as e:
+            generated = [e] * len(graph_idx)
+        llm_ms = _ms(start)
+        for i, config in zip(graph_idx, generated):
+            configs[i] = config
+            timings[i]["llm_ms"] = llm_ms
+
+    def answer(i):
+        query, kind = queries[i], kinds[i]
+        if kind == "count":
+            return {"answer": count_with_filter(file_path, filters[i]), "type": "count"}
+        if kind == "graph":
+            if isinstance(configs[i], Exception):
+                raise configs[i]
+            graph_data = build_graph_data(file_path, configs[i])
+            if "error" in graph_data:
+                return {"answer": graph_data["error"], "type": "error"}
+            return {"answer": "Graph generated successfully.", "type": "graph", "graph_data": graph_data}
+        return {"answer": answer_generative_query(file_path, query, api_key=api_key, mode=mode,
+                                                  cancel_event=cancel_event),
+                "type": "generative"}
+
+    def execute(i):
+        start = time.perf_counter()
+        try:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelled("Batch cancelled")
+            result = admission.run_when_admitted(kinds[i], lambda: answer(i), cancel_event=cancel_event)
+        except Exception as e:
+            result = {"answer": f"Error: {str(e)}", "type": "error"}
+        timings[i]["execute_ms"] = _ms(start)
+        timings[i]["elapsed_ms"] = _ms(batch_start)
+        results[i] = dict(result, query=queries[i], timings=timings[i])
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        list(pool.map(execute, range(len(queries))))
+
+    return {
+        "results": results,
+        "timings": {
+            "load_ms": load_ms,
+            "total_ms": _ms(batch_start),
+            "llm_batches": int(bool(unresolved)) + int(bool(graph_idx)),
+        },
+    }
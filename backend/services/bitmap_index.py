@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+
+# Columns with more distinct values than this are not bitmap-indexed
+MAX_BITMAP_CARDINALITY = 64
+# Values present in fewer than 1/SPARSE_RATIO of rows are stored as position arrays,
+# which are smaller than a bitmap below that density (4 bytes per row vs 1 bit per row)
+SPARSE_RATIO = 32
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(bits: np.ndarray) -> int:
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+else:  # numpy < 2.0
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(bits: np.ndarray) -> int:
+        return int(_POPCOUNT_TABLE[bits].sum(dtype=np.int64))
+
+
+class Bitmap:
+    """
+    Row set over a dataset of `n_rows` rows, held either as packed bits (1 bit per
+    row) or, when sparse, as sorted uint32 positions. Set operations work on packed
+    bits; sparse AND sparse stays sparse. A Bitmap never changes after it is built,
+    so the ones an index or cache holds keep the size they were stored at.
+    """
+
+    __slots__ = ("n_rows", "_bits", "_positions")
+
+    def __init__(self, n_rows: int, bits: np.ndarray = None, positions: np.ndarray = None):
+        self.n_rows = n_rows
+        self._bits = bits
+        self._positions = positions
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        return cls(len(mask), bits=np.packbits(np.asarray(mask, dtype=bool)))
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, n_rows: int) -> "Bitmap":
+        return cls(n_rows, positions=np.asarray(positions, dtype=np.uint32))
+
+    @classmethod
+    def empty(cls, n_rows: int) -> "Bitmap":
+        return cls(n_rows, positions=np.empty(0, dtype=np.uint32))
+
+    @property
+    def bits(self) -> np.ndarray:
+        """Packed bits; built afresh for a sparse bitmap, not kept on it."""
+        if self._bits is None:
+            return np.packbits(self.to_mask())
+        return self._bits
+
+    def compact(self) -> "Bitmap":
+        """Choose the smaller representation for storage."""
+        count = self.count()
+        if count * SPARSE_RATIO < self.n_rows:
+            return Bitmap(self.n_rows, positions=self.positions())
+        return Bitmap(self.n_rows, bits=self.bits)
+
+    def count(self) -> int:
+        if self._positions is not None:
+            return len(self._positions)
+        return _popcount(self._bits)
+
+    def to_mask(self) -> np.ndarray:
+        if self._positions is not None and self._bits is None:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[self._positions] = True
+            return mask
+        return np.unpackbits(self._bits, count=self.n_rows).astype(bool)
+
+    def positions(self) -> np.ndarray:
+        if self._positions is not None:
+            return self._positions
+        return np.flatnonzero(self.to_mask()).astype(np.uint32)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if self._positions is not None and other._positions is not None:
+            return Bitmap(self.n_rows, positions=np.intersect1d(self._positions, other._positions, assume_unique=True))
+        return Bitmap(self.n_rows, bits=self.bits & other.bits)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.n_rows, bits=self.bits | other.bits)
+
+    def __invert__(self) -> "Bitmap":
+        bits = ~self.bits
+        tail = self.n_rows % 8
+        if tail:
+            bits[-1] &= (0xFF << (8 - tail)) & 0xFF  # clear padding past the last row
+        return Bitmap(self.n_rows, bits=bits)
+
+    def patched(self, n_rows: int, cleared: np.ndarray, added: np.ndarray) -> "Bitmap":
+        """
+        This row set over `n_rows` rows (at least as many as now; new rows start unset),
+        without the `cleared` positions and with the `added` ones. Costs a copy of the
+        bits plus work proportional to the positions, not a pass over the rows.
+        """
+        if self._bits is None:
+            positions = self._positions
+            if len(cleared):
+                positions = np.setdiff1d(positions, cleared, assume_unique=True)
+            if len(added):
+                positions = np.union1d(positions, added)
+            return Bitmap.from_positions(positions, n_rows).compact()
+        bits = np.zeros((n_rows + 7) // 8, dtype=np.uint8)
+        bits[:len(self._bits)] = self._bits  # padding past the old last row is already clear
+        for positions, set_bits in ((cleared, False), (added, True)):
+            if len(positions):
+                positions = np.asarray(positions, dtype=np.int64)
+                flags = (0x80 >> (positions & 7)).astype(np.uint8)
+                if set_bits:
+                    np.bitwise_or.at(bits, positions >> 3, flags)
+                else:
+                    np.bitwise_and.at(bits, positions >> 3, ~flags)
+        return Bitmap(n_rows, bits=bits).compact()
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self._bits, self._positions) if array is not None)
+
+
+class BitmapIndex:
+    """
+    One compressed bitmap per (column, value) for every low-cardinality column,
+    plus a null bitmap per column. Built once per dataset at ingest; counts and
+    filter combinations then reduce to bitwise AND/OR/NOT and a popcount.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_cardinality: int = MAX_BITMAP_CARDINALITY):
+        self.df = df
+        self.n_rows = len(df)
+        self.max_cardinality = max_cardinality
+        self._bitmaps = {}  # column -> {value: Bitmap}
+        self._nulls = {}    # column -> Bitmap
+        for col in df.columns:
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            if len(uniques) > max_cardinality:
+                continue
+            order = np.argsort(codes, kind="stable").astype(np.uint32)
+            counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            # Positions come out sorted because the argsort is stable
+            self._nulls[col] = Bitmap.from_positions(order[offsets[0]:offsets[1]], self.n_rows).compact()
+            self._bitmaps[col] = {
+                value: Bitmap.from_positions(order[offsets[i + 1]:offsets[i + 2]], self.n_rows).compact()
+                for i, value in enumerate(uniques)
+            }
+
+    def updated(self, df: pd.DataFrame, changed: np.ndarray) -> "BitmapIndex":
+        """
+        Index over `df`, a later version of the indexed frame in which the rows at the
+        sorted `changed` positions were rewritten or appended. Only the bitmaps of
+        values found in those rows, before or after the change, are patched; the rest
+        are just resized. A column whose values outgrow max_cardinality drops out.
+        """
+        index = BitmapIndex.__new__(BitmapIndex)
+        index.df = df
+        index.n_rows = len(df)
+        index.max_cardinality = self.max_cardinality
+        index._bitmaps = {}
+        index._nulls = {}
+        old_changed = changed[changed < self.n_rows]
+        nothing = np.empty(0, dtype=np.int64)
+        for col, bitmaps in self._bitmaps.items():
+            if col not in df.columns:
+                continue
+            old_codes, old_uniques = pd.factorize(self.df[col].iloc[old_changed], use_na_sentinel=True)
+            new_codes, new_uniques = pd.factorize(df[col].iloc[changed], use_na_sentinel=True)
+            added_values = [v for v in new_uniques if v not in bitmaps]
+            if len(bitmaps) + len(added_values) > self.max_cardinality:
+                continue
+            old_lookup = {value: i for i, value in enumerate(old_uniques)}
+            new_lookup = {value: i for i, value in enumerate(new_uniques)}
+            patched = {}
+            for value in list(bitmaps) + added_values:
+                cleared = old_changed[old_codes == old_lookup[value]] if value in old_lookup else nothing
+                added = changed[new_codes == new_lookup[value]] if value in new_lookup else nothing
+                bitmap = bitmaps[value] if value in bitmaps else Bitmap.empty(self.n_rows)
+                bitmap = bitmap.patched(index.n_rows, cleared, added)
+                if not len(cleared) or bitmap.count():  # a fresh index has no bitmap for vanished values
+                    patched[value] = bitmap
+            index._bitmaps[col] = patched
+            index._nulls[col] = self._nulls[col].patched(index.n_rows, old_changed[old_codes < 0], changed[new_codes < 0])
+        return index
+
+    def has(self, col) -> bool:
+        return col in self._bitmaps
+
+    def values(self, col) -> list:
+        return list(self._bitmaps.get(col, {}))
+
+    def get(self, col, value) -> Bitmap:
+        """Rows where `col == value` (empty if the value never occurs). `col` must be indexed."""
+        bitmap = self._bitmaps[col].get(value)
+        return bitmap if bitmap is not None else Bitmap.empty(self.n_rows)
+
+    def null(self, col) -> Bitmap:
+        return self._nulls[col]
+
+    def any_of(self, col, values) -> Bitmap:
+        bitmaps = [self._bitmaps[col][v] for v in values if v in self._bitmaps[col]]
+        if not bitmaps:
+            return Bitmap.empty(self.n_rows)
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result | bitmap
+        return result
+
+    def where(self, col, predicate) -> Bitmap:
+        """
+        Rows whose value in `col` satisfies `predicate(value)`. The predicate runs once
+        per distinct value, and once with NaN for missing values.
+        """
+        if not self.has(col):
+            codes, uniques = pd.factorize(self.df[col], use_na_sentinel=True)
+            lut = np.array([bool(predicate(v)) for v in uniques] + [bool(predicate(np.nan))], dtype=bool)
+            return Bitmap.from_mask(lut[codes])  # code -1 picks the trailing NaN entry
+        result = self.any_of(col, [v for v in self._bitmaps[col] if predicate(v)])
+        if predicate(np.nan):
+            result = result | self._nulls[col]
+        return result
+
+    def all_rows(self) -> Bitmap:
+        return ~Bitmap.empty(self.n_rows)
+
+    def selection(self, index) -> Bitmap:
+        """Bitmap of the rows with the given index labels (e.g. a filtered frame's index)."""
+        positions = self.df.index.get_indexer(index)
+        return Bitmap.from_positions(np.sort(positions[positions >= 0]), self.n_rows)
+
+    def take(self, frame: pd.DataFrame, bitmap: Bitmap) -> pd.DataFrame:
+        """Rows of `frame` (a row subset of the indexed frame) that are in `bitmap`."""
+        positions = self.df.index.get_indexer(frame.index)
+        return frame[bitmap.to_mask()[positions]]
+
+    def nbytes(self) -> int:
+        return sum(b.nbytes() for col in self._bitmaps.values() for b in col.values()) + \
+            sum(b.nbytes() for b in self._nulls.values())
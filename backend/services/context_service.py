@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+from .dtype_optimizer import plain_values
+from .llm_service import estimate_tokens
+
+RISK_COLUMN = "Risk Level"
+RISK_BREAKDOWN_COLUMNS = ["Primary Industry", "Revenue Range"]
+# Columns with at most this many distinct values get full value counts
+MAX_CATEGORY_CARDINALITY = 20
+# Comma-separated list columns (e.g. compliance frameworks) are exploded when their items are this few
+MAX_MULTI_VALUE_ITEMS = 40
+MAX_VALUES_PER_LINE = 12
+DIGEST_CACHE_SIZE = 32
+
+_digest_cache = OrderedDict()
+_digest_cache_lock = threading.Lock()
+
+
+def _format_counts(counts: pd.Series) -> str:
+    items = [
+        f"{'(blank)' if pd.isna(value) else value} {count}"
+        for value, count in counts.head(MAX_VALUES_PER_LINE).items()
+    ]
+    if len(counts) > MAX_VALUES_PER_LINE:
+        items.append(f"+{len(counts) - MAX_VALUES_PER_LINE} more")
+    return ", ".join(items)
+
+
+def _multi_value_counts(series: pd.Series):
+    """Item counts for comma-separated list columns, or None if the column isn't one."""
+    text = series.dropna().astype(str)
+    if text.empty or text.str.contains(",", regex=False).mean() < 0.3:
+        return None
+    items = text.str.split(",").explode().str.strip()
+    counts = items[items != ""].value_counts()
+    return counts if len(counts) <= MAX_MULTI_VALUE_ITEMS else None
+
+
+def build_dataset_digest(df: pd.DataFrame) -> list:
+    """
+    Compact summary of `df` as (priority, line) pairs: row count, risk breakdowns,
+    multi-value item counts (frameworks), value counts of low-cardinality columns
+    and numeric quantiles. Lower priority values are kept first under a budget.
+    """
+    lines = [(0, f"Rows: {len(df)}")]
+    if df.empty:
+        return lines
+
+    if RISK_COLUMN in df.columns:
+        risk = df[RISK_COLUMN].value_counts(sort=False)
+        lines.append((1, f"{RISK_COLUMN}: {_format_counts(risk)}"))
+        for col in RISK_BREAKDOWN_COLUMNS:
+            if col in df.columns:
+                table = pd.crosstab(df[col], df[RISK_COLUMN])
+                parts = [
+                    f"{idx} " + "/".join(f"{lvl[:1]}{n}" for lvl, n in row.items())
+                    for idx, row in table.head(MAX_VALUES_PER_LINE).iterrows()
+                ]
+                lines.append((2, f"{RISK_COLUMN} by {col} ({'/'.join(str(c)[:1] for c in table.columns)}): "
+                                 + "; ".join(parts)))
+
+    for col in df.columns:
+        if col == RISK_COLUMN:
+            continue
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            if pd.api.types.is_datetime64_any_dtype(series):
+                if series.notna().any():
+                    lines.append((4, f"{col}: {series.min():%Y-%m-%d} to {series.max():%Y-%m-%d}"))
+                else:
+                    lines.append((4, f"{col}: no dates"))
+                continue
+            n_unique = series.nunique()
+            if n_unique <= MAX_CATEGORY_CARDINALITY:
+                lines.append((3, f"{col}: {_format_counts(plain_values(series).value_counts(dropna=False))}"))
+            else:
+                multi = _multi_value_counts(series)
+                if multi is not None:
+                    lines.append((2, f"{col} (items in comma-separated lists): {_format_counts(multi)}"))
+        else:
+            q = series.quantile([0, 0.25, 0.5, 0.75, 1]).tolist()
+            lines.append((4, f"{col}: min {q[0]:g}, p25 {q[1]:g}, median {q[2]:g}, p75 {q[3]:g}, "
+                             f"max {q[4]:g}, mean {series.mean():.4g}"))
+    return lines
+
+
+def serialize_digest(lines: list, token_budget: int) -> str:
+    """Keep the most important digest lines that fit `token_budget`, in their original order."""
+    ranked = sorted(range(len(lines)), key=lambda i: (lines[i][0], i))
+    kept = set()
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(lines[i][1]) + 1
+        if used + cost > token_budget:
+            continue
+        kept.add(i)
+        used += cost
+    return "\n".join(lines[i][1] for i in sorted(kept))
+
+
+def get_dataset_context(cache_key, df: pd.DataFrame, token_budget: int = 800) -> str:
+    """
+    Serialized digest of `df`, cached under `cache_key` (identify the dataset and
+    filter state, e.g. (file id, filters)). Only the first call per key scans the data.
+    """
+    with _digest_cache_lock:
+        entry = _digest_cache.get(cache_key)
+        if entry is not None:
+            _digest_cache.move_to_end(cache_key)
+    if entry is None:
+        entry = {"lines": build_dataset_digest(df), "text": {}}
+        with _digest_cache_lock:
+            _digest_cache[cache_key] = entry
+            while len(_digest_cache) > DIGEST_CACHE_SIZE:
+                _digest_cache.popitem(last=False)
+    if token_budget not in entry["text"]:
+        entry["text"][token_budget] = serialize_digest(entry["lines"], token_budget)
+    return entry["text"][token_budget]
@@ -0,0 +1,159 @@
+"""
+Data logic behind the Streamlit dashboard (risk classification, sidebar filters,
+KPIs, custom charts), kept free of Streamlit so benchmarks can run it directly.
+"""
+import pandas as pd
+import plotly.express as px
+from .aggregate_cube import group_aggregate, group_crosstab
+
+
+def apply_risk_classification(df):
+    def calculate_risk(row):
+        # Normalize text to lower case to make matching robust
+        breach = str(row.get('Security Breach Last 2 Years', '')).lower()
+        infosec = str(row.get('Formal InfoSec Policy', '')).lower()
+        ir_plan = str(row.get('Incident Response Plan', '')).lower()
+        bcp = str(row.get('Business Continuity Plan', '')).lower()
+        insurance = str(row.get('Cyber Insurance', '')).lower()
+
+        # HIGH RISK RULES:
+        # Security breach exists (not none/no) OR No InfoSec Policy OR No Incident Response Plan
+        has_breach = breach not in ['none', 'no', 'nan', '']
+        if has_breach or infosec == 'no' or ir_plan == 'no':
+            return "High"
+            
+        # MEDIUM RISK RULES:
+        # Missing BCP OR No Cyber Insurance
+        if bcp == 'no' or insurance == 'no':
+            return "Medium"
+            
+        # OTHERWISE
+        return "Low"
+        
+    df['Risk Level'] = df.apply(calculate_risk, axis=1)
+    
+    # Custom sort order for Risk Level
+    risk_order = ['High', 'Medium', 'Low']
+    df['Risk Level'] = pd.Categorical(df['Risk Level'], categories=risk_order, ordered=True)
+    return df
+
+
+def is_no(value):
+    return str(value).lower() == 'no'
+
+
+def apply_sidebar_filters(df, search_vendor="", risk_filter=(), compliance_filter=()):
+    """Rows matching the dashboard's sidebar selections."""
+    filtered_df = df.copy()
+    if search_vendor:
+        filtered_df = filtered_df[filtered_df['Legal Name'].str.contains(search_vendor, case=False, na=False)]
+    if risk_filter:
+        filtered_df = filtered_df[filtered_df['Risk Level'].isin(risk_filter)]
+    if compliance_filter:
+        # Vendor must have at least one of the selected frameworks
+        pattern = '|'.join(compliance_filter)
+        filtered_df = filtered_df[filtered_df['Regulatory Compliance'].str.contains(pattern, case=False, na=False)]
+    return filtered_df
+
+
+def kpi_bitmaps(bitmaps, rows):
+    """
+    Bitmaps behind the KPI tiles for the selected `rows` of a BitmapIndex: vendors with
+    breaches, and vendors missing each key control. Counts are popcounts of these.
+    """
+    selection = bitmaps.selection(rows)
+    breach_bitmap = selection & ~bitmaps.where('Security Breach Last 2 Years', lambda v: str(v).lower() in ['none', 'nan', 'no', ''])
+    missing_bitmaps = {
+        "InfoSec Policy": selection & bitmaps.where('Formal InfoSec Policy', is_no),
+        "BCP": selection & bitmaps.where('Business Continuity Plan', is_no),
+        "Incident Response": selection & bitmaps.where('Incident Response Plan', is_no),
+        "Cyber Insurance": selection & bitmaps.where('Cyber Insurance', is_no),
+    }
+    return breach_bitmap, missing_bitmaps
+
+
+def generate_custom_chart_figure(df, config, cube=None, frame_key=None, filter_context=None):
+    x_col = config.get("x_col")
+    y_col = config.get("y_col") 
+    aggr = config.get("aggregation", "count")
+    graph_type = config.get("graph_type", "bar")
+    chart_name = config.get("title", "Untitled Chart")
+    
+    # If the LLM generates a literal None/null for aggregation, fallback to count
+    if not aggr or str(aggr).lower() == 'none':
+        aggr = 'count'
+    
+    # Handle x_col being None or not in columns — try fuzzy matching
+    if not x_col or x_col not in df.columns:
+        matched = [c for c in df.columns if c.lower() == str(x_col).lower()]
+        if matched:
+            x_col = matched[0]
+        else:
+            raise ValueError(f"Column '{x_col}' not found in data. Chart: '{chart_name}'")
+    
+    # Optional row filter from the chart config (e.g. only vendors with breaches)
+    row_filter = config.get("filter")
+    if row_filter and str(row_filter).lower() != 'none' and filter_context is not None:
+        df = filter_context.apply(row_filter, df)
+        frame_key = (frame_key, row_filter)
+    
+    # 2-D breakdowns: contingency table of group_col x x_col
+    group_col = config.get("group_col")
+    if graph_type in ("heatmap", "stacked_bar") or group_col:
+        if not group_col or group_col not in df.columns:
+            raise ValueError(f"Valid 'group_col' required for a '{graph_type}' chart. Chart: '{chart_name}'")
+        if cube is not None:
+            table = cube.crosstab(group_col, x_col, frame=df, frame_key=frame_key)
+        else:
+            table = group_crosstab(df, group_col, x_col)
+        chart_title = config.get("title", f"{group_col} by {x_col}")
+        if graph_type == "stacked_bar":
+            long_df = table.reset_index().melt(id_vars=group_col, value_name='count')
+            return px.bar(long_df, x=x_col, y='count', color=group_col, title=chart_title)
+        return px.imshow(table, text_auto=True, aspect="auto", color_continuous_scale="Reds", title=chart_title)
+    
+    # Auto-detect date columns → force line chart grouped by month
+    is_date = pd.api.types.is_datetime64_any_dtype(df[x_col])
+    if not is_date:
+        try:
+            pd.to_datetime(df[x_col], errors='raise')
+            is_date = True
+        except Exception:
+            pass
+    
+    if is_date:
+        graph_type = "line"  # Never pie for dates
+        temp = df.copy()
+        temp[x_col] = pd.to_datetime(temp[x_col], errors='coerce')
+        temp['_month'] = temp[x_col].dt.to_period('M').astype(str)
+        grouped = temp.groupby('_month').size().reset_index(name='count')
+        grouped = grouped.sort_values('_month')
+        chart_title = config.get("title", f"Trend: {x_col}")
+        return px.line(grouped, x='_month', y='count', title=chart_title, markers=True)
+    
+    # Too many categories? Force bar instead of pie
+    n_unique = df[x_col].nunique()
+    if graph_type == "pie" and n_unique > 10:
+        graph_type = "bar"
+    
+    if aggr == 'count':
+        y_col = None
+        y_col_out = 'count'
+    else:
+        if not y_col or y_col not in df.columns:
+            raise ValueError(f"Valid 'y_col' required for aggregation '{aggr}'")
+        y_col_out = y_col
+    if cube is not None:
+        # `df` is a row subset of the cube's frame; repeated charts are cache lookups
+        grouped = cube.aggregate(x_col, y_col, aggr, frame=df, frame_key=frame_key)
+    else:
+        grouped = group_aggregate(df, x_col, y_col, aggr)
+        
+    chart_title = config.get("title", f"{y_col_out} by {x_col}")
+        
+    if graph_type == "line":
+        return px.line(grouped, x=x_col, y=y_col_out, title=chart_title, markers=True)
+    elif graph_type == "pie":
+        return px.pie(grouped, names=x_col, values=y_col_out, title=chart_title)
+    else:
+        return px.bar(grouped, x=x_col, y=y_col_out, title=chart_title)
@@ -0,0 +1,169 @@
+"""
+Incremental dataset updates. A delta workbook holds new and changed vendor rows
+keyed on `Business Registration Number`; `upsert` merges it into an ingested frame
+(rewriting matched rows in place, appending new ones) and reports which row
+positions changed, so the bitmap index, aggregate cube and cached filter results
+can be patched for those rows instead of rebuilt over the whole dataset.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .numeric_parsing import add_parsed_columns_like, derived_columns
+
+# Column identifying a vendor across the base workbook and its deltas
+KEY_COLUMN = os.getenv("DELTA_KEY_COLUMN", "Business Registration Number")
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def _conform(values: pd.Series, dtype) -> pd.Series:
+    """Delta values as read from a workbook, converted to the base column's type where it differs."""
+    if pd.api.types.is_datetime64_any_dtype(dtype) and not pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, errors="coerce", format="mixed")
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) \
+            and not pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values, errors="coerce")
+    if pd.api.types.is_integer_dtype(dtype) and pd.api.types.is_integer_dtype(values) \
+            and not pd.api.types.is_extension_array_dtype(dtype) and len(values):
+        # Keep a downcast column's small integer type when the delta's values fit it
+        limits = np.iinfo(dtype)
+        if limits.min <= values.min() and values.max() <= limits.max:
+            return values.astype(dtype)
+    return values
+
+
+def _unchanged(base: pd.DataFrame, positions: np.ndarray, rows: pd.DataFrame, columns) -> np.ndarray:
+    """Per delta row, whether it repeats the base row at `positions` in every column."""
+    same = np.ones(len(rows), dtype=bool)
+    for col in columns:
+        old = base[col].iloc[positions].to_numpy(dtype=object)
+        new = rows[col].to_numpy(dtype=object)
+        same &= (old == new) | (pd.isna(old) & pd.isna(new))
+    return same
+
+
+def _merge_column(old: pd.Series, updated_positions: np.ndarray, updated: pd.Series,
+                  inserted: pd.Series) -> pd.Series:
+    """`old` with `updated` written at `updated_positions` and `inserted` appended."""
+    n_rows = len(old) + len(inserted)
+    if isinstance(old.dtype, pd.CategoricalDtype):
+        new_values = pd.concat([updated, inserted], ignore_index=True).astype(object)
+        added = pd.Index(new_values.dropna().unique()).difference(old.cat.categories, sort=False)
+        dtype = pd.CategoricalDtype(old.cat.categories.append(added), ordered=old.cat.ordered)
+        new_codes = pd.Categorical(new_values, dtype=dtype).codes
+        codes = np.empty(n_rows, dtype=np.result_type(old.cat.codes.dtype, new_codes.dtype))
+        codes[:len(old)] = old.cat.codes.to_numpy()
+        codes[updated_positions] = new_codes[:len(updated)]
+        codes[len(old):] = new_codes[len(updated):]
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), name=old.name)
+    merged = pd.concat([old, updated, inserted], ignore_index=True)
+    order = np.arange(n_rows)
+    order[updated_positions] = len(old) + np.arange(len(updated))
+    order[len(old):] = len(old) + len(updated) + np.arange(len(inserted))
+    merged = merged.take(order).reset_index(drop=True)
+    if merged.dtype != old.dtype and pd.api.types.is_integer_dtype(merged) \
+            and not pd.api.types.is_extension_array_dtype(merged):
+        merged = pd.to_numeric(merged, downcast="integer")
+    return merged
+
+
+def upsert(base: pd.DataFrame, delta: pd.DataFrame, key: str = KEY_COLUMN, enrich=None) -> tuple:
+    """
+    Merge `delta` (a workbook's rows, as read) into `base` (an ingested frame).
+    Rows whose `key` matches a base row replace it in place; the rest are appended.
+    Derived numeric columns are parsed for the delta rows only, and `enrich(rows)`
+    (e.g. risk classification) adds base's remaining computed columns to them.
+
+    Returns (new frame, changes) where changes holds the "updated" and "inserted" row
+    positions, their union "changed" (sorted), "unchanged" (delta rows identical to
+    the current data, which are skipped) and "n_rows_before".
+    """
+    if key not in base.columns:
+        raise DeltaError(f"Dataset has no '{key}' column to match delta rows on")
+    if key not in delta.columns:
+        raise DeltaError(f"Delta workbook has no '{key}' column")
+    derived = derived_columns(base)
+    source_columns = [col for col in base.columns if col not in derived]
+    unknown = [col for col in delta.columns if col not in base.columns]
+    if unknown:
+        raise DeltaError(f"Delta workbook has columns the dataset doesn't: {', '.join(map(str, unknown))}")
+    if delta[key].isna().any():
+        raise DeltaError(f"Delta workbook has rows without a '{key}'")
+    # One hash table over the keys serves both the uniqueness check and the lookup
+    key_index = pd.Index(base[key])
+    if not key_index.is_unique:
+        raise DeltaError(f"'{key}' is not unique in the dataset, so delta rows can't be matched")
+
+    rows = delta.drop_duplicates(key, keep="last").reset_index(drop=True)
+    rows = pd.DataFrame({col: _conform(rows[col], base[col].dtype) for col in rows.columns})
+    positions = key_index.get_indexer(rows[key])
+    # Columns the delta leaves out keep their current values on updated rows
+    missing = [col for col in source_columns if col not in rows.columns]
+    is_update = positions >= 0
+    for col in missing:
+        filled = pd.Series(np.nan, index=rows.index, dtype=object)
+        filled[is_update] = base[col].iloc[positions[is_update]].to_numpy(dtype=object)
+        rows[col] = _conform(filled, base[col].dtype)
+    unchanged = _unchanged(base, positions[is_update], rows[is_update], [c for c in source_columns if c in rows])
+    keep = ~is_update
+    keep[np.flatnonzero(is_update)[~unchanged]] = True
+    rows, positions = rows[keep].reset_index(drop=True), positions[keep]
+
+    rows = add_parsed_columns_like(rows[[col for col in source_columns if col in rows]], base)
+    if enrich is not None and len(rows):
+        rows = enrich(rows)
+    absent = [col for col in base.columns if col not in rows.columns]
+    if absent:
+        raise DeltaError(f"Delta rows are missing columns: {', '.join(map(str, absent))}")
+
+    is_update = positions >= 0
+    order = np.argsort(positions[is_update], kind="stable")
+    updated_positions = positions[is_update][order]
+    updated_rows = rows[is_update].iloc[order]
+    inserted_rows = rows[~is_update]
+    merged = pd.DataFrame({
+        col: _merge_column(base[col], updated_positions, updated_rows[col], inserted_rows[col])
+        for col in base.columns
+    })
+    merged.attrs = dict(base.attrs)
+    n_rows_before = len(base)
+    inserted_positions = np.arange(n_rows_before, len(merged))
+    changes = {
+        "updated": updated_positions.astype(np.int64),
+        "inserted": inserted_positions,
+        "changed": np.concatenate([updated_positions, inserted_positions]).astype(np.int64),
+        "unchanged": int(unchanged.sum()),
+        "n_rows_before": n_rows_before,
+    }
+    return merged, changes
+
+
+def changes_summary(changes: dict) -> dict:
+    """JSON-friendly counts for an upsert's changes."""
+    return {
+        "updated": len(changes["updated"]),
+        "inserted": len(changes["inserted"]),
+        "unchanged": changes["unchanged"],
+    }
+
+
+def migrate_filter_results(old_key, new_key, df: pd.DataFrame, changes: dict):
+    """
+    Carry the cached filter results of one dataset version over to the next, evaluating
+    each cached filter on the changed rows only.
+    """
+    from .filter_cache import filter_result_cache
+    from .filter_engine import FilterContext
+    changed = changes["changed"]
+    old_changed = changed[changed < changes["n_rows_before"]]
+    changed_rows = FilterContext(df.iloc[changed])
+
+    def update(plan, bitmap):
+        matches = changed[changed_rows._evaluate(plan)]
+        return bitmap.patched(len(df), old_changed, matches)
+
+    filter_result_cache.migrate(old_key, new_key, update)
@@ -0,0 +1,91 @@
+"""
+Ingest-time dtype compaction. Workbooks arrive as one Python string per cell; most
+assessment columns repeat a handful of values, so they are stored far more
+compactly as categoricals, integers as the smallest type that holds them, and
+date columns as datetime64. Values and comparisons (`== 'Yes'`, `.str.contains`)
+are unchanged, so every consumer sees the same results on the smaller frame.
+"""
+import logging
+import os
+
+import pandas as pd
+
+# Set to 0 to keep the frames exactly as pandas reads them
+DTYPE_OPTIMIZE = os.getenv("DTYPE_OPTIMIZE", "1") == "1"
+# A string column becomes categorical when its distinct values are at most this share of its rows...
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))
+# ...and at most this many
+CATEGORY_MAX_UNIQUE = int(os.getenv("CATEGORY_MAX_UNIQUE", "5000"))
+
+YES_NO_VALUES = {"Yes", "No"}
+
+logger = logging.getLogger(__name__)
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _parse_dates(series: pd.Series):
+    """datetime64 version of a text date column, or None if any value doesn't parse."""
+    try:
+        parsed = pd.to_datetime(series, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.notna().sum() == series.notna().sum() else None
+
+
+def _compact(series: pd.Series):
+    """(new series, kind) for one column, or (None, None) to leave it as is."""
+    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+        downcast = pd.to_numeric(series, downcast="integer")
+        return (downcast, "integer") if downcast.dtype != series.dtype else (None, None)
+    if not _is_text(series):
+        return None, None
+    non_null = series.dropna()
+    if non_null.empty or not all(isinstance(v, str) for v in non_null.unique()[:1000]):
+        return None, None
+    if "date" in str(series.name).lower():
+        parsed = _parse_dates(series)
+        if parsed is not None:
+            return parsed, "datetime"
+    n_unique = non_null.nunique()
+    if set(non_null.unique()) <= YES_NO_VALUES:
+        # Two-value categorical: one byte per row, and still compares equal to 'Yes'/'No'
+        return series.astype(pd.CategoricalDtype(["No", "Yes"])), "yes_no"
+    if n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= CATEGORY_MAX_RATIO * len(series):
+        return series.astype("category"), "category"
+    return None, None
+
+
+def plain_values(series: pd.Series) -> pd.Series:
+    """
+    `series` with categorical values as plain objects. Use before value_counts(), whose
+    tie order and zero-count rows would otherwise differ from the uncompacted column.
+    """
+    return series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
+
+
+def optimize_dtypes(df: pd.DataFrame) -> tuple:
+    """
+    Compact copy of `df` plus a report: bytes before and after (deep) and the
+    columns changed by kind. Returns `df` itself when DTYPE_OPTIMIZE is off.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    if not DTYPE_OPTIMIZE:
+        return df, {"before_bytes": before, "after_bytes": before, "converted": {}}
+    columns = {}
+    converted = {}
+    for col in df.columns:
+        compacted, kind = _compact(df[col])
+        if compacted is not None:
+            columns[col] = compacted
+            converted.setdefault(kind, []).append(col)
+    optimized = df.copy(deep=False) if columns else df
+    for col, compacted in columns.items():
+        optimized[col] = compacted
+    after = int(optimized.memory_usage(deep=True).sum())
+    report = {"before_bytes": before, "after_bytes": after, "converted": converted}
+    logger.info("dtype optimizer: %.1f MB -> %.1f MB (%d columns converted)",
+                before / 1e6, after / 1e6, len(columns))
+    return optimized, report
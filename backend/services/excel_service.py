@@ -1,13 +1,199 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
+from .dtype_optimizer import optimize_dtypes
+from .numeric_parsing import add_parsed_columns, derived_columns
+from .metrics import registry
+from .tracing import span, record_cache
+
+# Parsed workbooks kept in memory, keyed by path and invalidated when the file changes
+DATASET_CACHE_SIZE = int(os.getenv("DATASET_CACHE_SIZE", "8"))
+# Delta workbooks applied to `<workbook>` are kept, in order, in `<workbook>.deltas/`
+DELTA_LOG_SUFFIX = ".deltas"
+
+_dataset_cache = OrderedDict()
+_dataset_cache_lock = threading.Lock()
+# Serializes delta upserts, so each one builds on the version the previous one produced
+_delta_lock = threading.Lock()
+
+EXCEL_PARSE_SECONDS = registry.histogram("excel_parse_seconds", "Time to read and parse a workbook.")
+DATASET_CACHE_LOOKUPS = registry.counter("dataset_cache_lookups_total", "Parsed-workbook cache lookups.", ("result",))
+DATASET_CACHE_EVICTIONS = registry.counter("dataset_cache_evictions_total", "Parsed workbooks evicted from the cache.")
+registry.gauge("dataset_cache_entries", "Parsed workbooks held in memory.", callback=lambda: len(_dataset_cache))
+registry.gauge("dataset_cache_bytes", "Memory held by cached workbook frames, after dtype compaction.",
+               callback=lambda: sum(entry["memory"]["after_bytes"] for entry in list(_dataset_cache.values())))
+
+
+def _delta_files(file_path: str) -> list:
+    """Delta workbooks applied on top of `file_path`, in the order they were applied."""
+    log_dir = delta_log_dir(file_path)
+    if not os.path.isdir(log_dir):
+        return []
+    return [os.path.join(log_dir, name) for name in sorted(os.listdir(log_dir)) if name.endswith(('.xls', '.xlsx'))]
+
+def _file_signature(file_path: str) -> tuple:
+    stat = os.stat(file_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    deltas = tuple((os.path.basename(p), os.stat(p).st_size) for p in _delta_files(file_path))
+    return signature + (deltas,) if deltas else signature
+
+def _new_entry(key: str, signature: tuple, df: pd.DataFrame, memory: dict, artifacts: dict = None) -> dict:
+    return {
+        "signature": signature,
+        "fingerprint": hashlib.sha1(f"{key}:{signature}".encode()).hexdigest()[:16],
+        "df": df,
+        "memory": memory,
+        "artifacts": artifacts or {},
+        "lock": threading.RLock(),  # builders may request other artifacts
+    }
+
+def _store_entry(key: str, entry: dict):
+    """Cache `entry` for `key`, dropping the filter results of the version it replaces."""
+    with _dataset_cache_lock:
+        stale = _dataset_cache.get(key)
+        _dataset_cache[key] = entry
+        _dataset_cache.move_to_end(key)
+        while len(_dataset_cache) > DATASET_CACHE_SIZE:
+            _dataset_cache.popitem(last=False)
+            DATASET_CACHE_EVICTIONS.inc()
+    if stale is not None and stale["fingerprint"] != entry["fingerprint"]:
+        from .filter_cache import filter_result_cache
+        filter_result_cache.invalidate(stale["fingerprint"])
+
+
+def _get_dataset_entry(file_path: str) -> dict:
+    key = os.path.abspath(file_path)
+    signature = _file_signature(file_path)
+    with _dataset_cache_lock:
+        entry = _dataset_cache.get(key)
+        if entry is not None and entry["signature"] == signature:
+            _dataset_cache.move_to_end(key)
+            DATASET_CACHE_LOOKUPS.inc(result="hit")
+            record_cache("dataset", True)
+            return entry
+
+    DATASET_CACHE_LOOKUPS.inc(result="miss")
+    record_cache("dataset", False)
+    start = time.perf_counter()
+    with span("excel_load"):
+        df = pd.read_excel(file_path)
+    EXCEL_PARSE_SECONDS.observe(time.perf_counter() - start)
+    with span("dtype_optimize"):
+        df, memory = optimize_dtypes(df)
+    with span("numeric_parse"):
+        df = add_parsed_columns(df)
+    delta_files = _delta_files(file_path)
+    if delta_files:
+        from .delta_service import upsert
+        with span("delta_replay"):
+            for delta_file in delta_files:
+                df, _ = upsert(df, pd.read_excel(delta_file))
+    entry = _new_entry(key, signature, df, memory)
+    _store_entry(key, entry)
+    return entry
+
+def clear_dataset_cache():
+    """Forget every parsed workbook (and its artifacts); the next access re-reads the file."""
+    with _dataset_cache_lock:
+        _dataset_cache.clear()
+
 
 def load_dataframe(file_path: str) -> pd.DataFrame:
-    return pd.read_excel(file_path)
+    """Load a workbook, reusing the cached frame while the file is unchanged. Treat it as read-only."""
+    return _get_dataset_entry(file_path)["df"]
+
+
+def dataset_fingerprint(file_path: str) -> str:
+    """Short identifier of the current contents of `file_path`."""
+    return _get_dataset_entry(file_path)["fingerprint"]
+
+def dataset_memory_report(file_path: str) -> dict:
+    """Bytes before and after ingest-time dtype compaction, and the columns converted."""
+    return _get_dataset_entry(file_path)["memory"]
+
+
+def get_dataset_artifact(file_path: str, name: str, builder):
+    """Return a derived structure (index, digest, ...) built once per dataset version by `builder(df)`."""
+    entry = _get_dataset_entry(file_path)
+    artifacts = entry["artifacts"]
+    if name not in artifacts:
+        with entry["lock"]:
+            if name not in artifacts:
+                with span(f"build_{name}"):
+                    artifacts[name] = builder(entry["df"])
+    return artifacts[name]
+
+# ---------- Delta updates ----------
+
+def delta_log_dir(file_path: str) -> str:
+    return f"{file_path}{DELTA_LOG_SUFFIX}"
+
+def clear_delta_log(file_path: str):
+    """Forget the deltas applied to a workbook, e.g. because a full upload replaced it."""
+    shutil.rmtree(delta_log_dir(file_path), ignore_errors=True)
+
+def _updated_artifacts(artifacts: dict, df: pd.DataFrame, changes: dict) -> dict:
+    """
+    Artifacts for the upserted frame: the bitmap index and aggregate cube are patched
+    for the changed rows; the others are rebuilt from the new frame when next requested.
+    """
+    updated = {}
+    for name in ("bitmap_index", "aggregate_cube"):
+        if name in artifacts:
+            with span(f"update_{name}"):
+                updated[name] = artifacts[name].updated(df, changes["changed"])
+    return updated
+
+def apply_delta(file_path: str, delta_path: str) -> dict:
+    """
+    Upsert the rows of the workbook at `delta_path` into the dataset at `file_path`
+    (matched on the delta key column) and move that workbook into the dataset's delta
+    log, so a cold load replays it. The cached frame, its bitmap index and aggregate
+    cube and its cached filter results are updated for the changed rows only.
+    Raises DeltaError, leaving the dataset untouched, if the delta doesn't fit it.
+    """
+    from .delta_service import upsert, changes_summary, migrate_filter_results
+    key = os.path.abspath(file_path)
+    with _delta_lock:
+        entry = _get_dataset_entry(file_path)
+        with span("delta_load"):
+            delta = pd.read_excel(delta_path)
+        with span("delta_upsert"):
+            df, changes = upsert(entry["df"], delta)
+        log_dir = delta_log_dir(file_path)
+        os.makedirs(log_dir, exist_ok=True)
+        extension = os.path.splitext(delta_path)[1]
+        shutil.move(delta_path, os.path.join(log_dir, f"{len(_delta_files(file_path)) + 1:04d}{extension}"))
+
+        with entry["lock"]:
+            artifacts = _updated_artifacts(entry["artifacts"], df, changes)
+        new_entry = _new_entry(key, _file_signature(file_path), df, entry["memory"], artifacts)
+        with span("delta_filter_cache"):
+            migrate_filter_results(entry["fingerprint"], new_entry["fingerprint"], df, changes)
+        _store_entry(key, new_entry)
+    return {**changes_summary(changes), "rows_count": len(df)}
+
+def _build_filter_context(file_path: str):
+    from .bitmap_index import BitmapIndex
+    from .filter_engine import FilterContext
+    bitmap_index = get_dataset_artifact(file_path, "bitmap_index", BitmapIndex)
+    fingerprint = dataset_fingerprint(file_path)
+    return lambda df: FilterContext(df, bitmap_index=bitmap_index, dataset_key=fingerprint)
 
 def load_excel_and_get_summary(file_path: str) -> dict:
+    from .bitmap_index import BitmapIndex
     df = load_dataframe(file_path)
+    # Build categorical bitmaps at ingest so the first count query doesn't pay for them
+    get_dataset_artifact(file_path, "bitmap_index", BitmapIndex)
     return {
         "columns": df.columns.tolist(),
-        "rows_count": len(df)
+        "rows_count": len(df),
+        "memory": dataset_memory_report(file_path),
+        "derived_columns": derived_columns(df)
     }
 
 def is_count_query(query: str) -> bool:
@@ -18,58 +204,137 @@ def is_graph_query(query: str) -> bool:
     query_lower = query.lower()
     return any(kw in query_lower for kw in ["plot", "graph", "chart", "visualize", "draw"])
 
+def parse_count_filter(file_path: str, query: str):
+    """Deterministic fast path for common count phrasings; None when the LLM is needed."""
+    from .nl_filter import NLFilterParser
+    return get_dataset_artifact(file_path, "nl_filter_parser", NLFilterParser).parse(query)
+
 def run_count_query(file_path: str, query: str) -> str:
     df = load_dataframe(file_path)
     from .llm_service import generate_pandas_filter
-    
-    filter_string = generate_pandas_filter(query, df.columns.tolist())
-    
+
+    # Anything the fast path isn't sure about goes to the LLM
+    with span("nl_filter"):
+        filter_string = parse_count_filter(file_path, query)
+    if filter_string is None:
+        with span("llm_filter"):
+            filter_string = generate_pandas_filter(query, df.columns.tolist())
+    return count_with_filter(file_path, filter_string)
+
+def filter_count(file_path: str, filter_string: str) -> int:
+    """Rows matching `filter_string`; raises FilterError when it doesn't compile against the schema."""
+    # Compiled against the schema first, so arbitrary expressions never reach the data
+    filter_context = get_dataset_artifact(file_path, "filter_context", _build_filter_context(file_path))
+    with span("filter_count"):
+        return filter_context.count(filter_string)
+
+def count_answer(filter_string: str, count_rows, total_rows: int) -> str:
+    """Answer text for a count question, with `count_rows(filter_string)` doing the counting."""
     if filter_string and filter_string.lower() != "none":
         try:
-            # Some safety/cleanup for common LLM query string errors
-            # E.g. replacing '==' with '==' if already correct, but just in case
-            filtered_df = df.query(filter_string)
-            return f"Count based on filter `{filter_string}`: {len(filtered_df)}"
+            return f"Count based on filter `{filter_string}`: {count_rows(filter_string)}"
         except Exception as e:
             return f"Could not count. LLM generated invalid filter: `{filter_string}`. Error: {str(e)}"
     
-    return f"Total rows in dataset: {len(df)} (No specific filter detected)"
+    return f"Total rows in dataset: {total_rows} (No specific filter detected)"
+
+def count_with_filter(file_path: str, filter_string: str) -> str:
+    df = load_dataframe(file_path)
+    return count_answer(filter_string, lambda f: filter_count(file_path, f), len(df))
 
 def run_graph_query(file_path: str, query: str) -> dict:
     df = load_dataframe(file_path)
     from .llm_service import generate_graph_config
     
     try:
-        config = generate_graph_config(query, df.columns.tolist())
-        # The LLM gives us a dict specifying x_col, y_col, aggregation, graph_type
-        # e.g., {'x_col': 'Department', 'y_col': None, 'aggregation': 'count', 'graph_type': 'bar'}
+        with span("llm_graph_config"):
+            configs = generate_graph_config(query, df.columns.tolist())
+    except Exception as e:
+        return {"error": f"Error generating graph: {str(e)}"}
+    with span("aggregate"):
+        return build_graph_data(file_path, configs)
+
+def filtered_frame(file_path: str, row_filter):
+    """Rows matching `row_filter`, or None (meaning every row) when there is no filter."""
+    if not row_filter or str(row_filter).lower() == "none":
+        return None
+    filter_context = get_dataset_artifact(file_path, "filter_context", _build_filter_context(file_path))
+    return filter_context.apply(row_filter)
+
+def build_graph_data(file_path: str, configs) -> dict:
+    """Serializable chart payload for the first of the chart `configs` produced by the LLM."""
+    df = load_dataframe(file_path)
+    from .aggregate_cube import AggregateCube
+
+    # Aggregates come from the per-dataset cube, so a repeated chart is a lookup
+    def aggregate(x_col, y_col, aggregation, row_filter):
+        cube = get_dataset_artifact(file_path, "aggregate_cube", AggregateCube)
+        return cube.aggregate(x_col, y_col, aggregation, frame=filtered_frame(file_path, row_filter),
+                              frame_key=row_filter)
+
+    def crosstab(row_col, col_col, row_filter):
+        cube = get_dataset_artifact(file_path, "aggregate_cube", AggregateCube)
+        return cube.crosstab(row_col, col_col, frame=filtered_frame(file_path, row_filter), frame_key=row_filter)
+
+    return chart_payload(configs, df.columns, aggregate, crosstab)
+
+def chart_payload(configs, columns, aggregate, crosstab) -> dict:
+    """
+    Chart payload for the first of `configs` over a dataset with `columns`, where
+    `aggregate(x_col, y_col, aggregation, row_filter)` returns [x_col, "count" | y_col]
+    groups and `crosstab(row_col, col_col, row_filter)` a contingency table.
+    """
+    try:
+        # The LLM gives us a list of dicts specifying x_col, y_col, aggregation, graph_type
+        # e.g., [{'x_col': 'Department', 'y_col': None, 'aggregation': 'count', 'graph_type': 'bar'}]
         
-        if not config:
+        if not configs:
             return {"error": "Could not understand the graph request parameters."}
+        config = configs[0] if isinstance(configs, list) else configs
             
         x_col = config.get("x_col")
         y_col = config.get("y_col") 
         aggr = config.get("aggregation", "count")
         graph_type = config.get("graph_type", "bar")
         
-        if x_col not in df.columns:
+        if x_col not in columns:
             return {"error": f"Column '{x_col}' not found in data."}
             
-        # Execute grouping safely in pandas and return the serializable payload
+        row_filter = config.get("filter")
+        if not row_filter or str(row_filter).lower() == "none":
+            row_filter = None
+
+        group_col = config.get("group_col")
+        if graph_type in ("heatmap", "stacked_bar") or group_col:
+            if group_col not in columns:
+                return {"error": f"A valid group_col is required for a '{graph_type}' chart"}
+            table = crosstab(group_col, x_col, row_filter)
+            return {
+                "x": table.columns.tolist(),
+                "y": table.index.tolist(),
+                "z": table.to_numpy().tolist(),
+                "x_label": x_col,
+                "y_label": group_col,
+                "z_label": "count",
+                "filter": config.get("filter"),
+                "graph_type": graph_type if graph_type == "stacked_bar" else "heatmap"
+            }
+
         if aggr == 'count':
-            grouped = df.groupby(x_col).size().reset_index(name='count')
+            grouped = aggregate(x_col, None, "count", row_filter)
             y_col_out = 'count'
         else:
-            if not y_col or y_col not in df.columns:
+            if not y_col or y_col not in columns:
                 return {"error": f"A valid numeric y_col is required for aggregation '{aggr}'"}
-            grouped = df.groupby(x_col)[y_col].agg(aggr).reset_index()
+            grouped = aggregate(x_col, y_col, aggr, row_filter)
             y_col_out = y_col
             
         # Convert df to dictionary format that Streamlit can easily plot: 
         # {'x': [List of X values], 'y': [List of Y values], 'type': 'bar'}
         response_data = {
             "x": grouped[x_col].tolist(),
-            "y": grouped[y_col_out].tolist(),
+            # Open-ended ranges (e.g. "> $100M" has no upper bound) aggregate to NaN, which JSON can't carry
+            "y": [None if pd.isna(v) else v for v in grouped[y_col_out].tolist()],
             "x_label": x_col,
             "y_label": y_col_out,
             "graph_type": graph_type
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+from .metrics import registry
+
+# Memory budget for cached filter results (bitmaps / position arrays), in bytes
+FILTER_CACHE_BYTES = int(os.getenv("FILTER_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Rough per-entry bookkeeping cost (key tuple, dict slot, Bitmap object)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class FilterResultCache:
+    """
+    LRU of filter results keyed by (dataset key, canonical plan). Values are compact
+    Bitmaps, so a hit on a common filter costs a dict lookup instead of a scan.
+    Entries are evicted oldest-first once their total size exceeds `max_bytes`.
+    Bitmaps are immutable, so what callers do with a hit never changes an entry's size.
+    """
+
+    def __init__(self, max_bytes: int = FILTER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (Bitmap, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, bitmap):
+        size = bitmap.nbytes() + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (bitmap, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, dataset_key):
+        """Drop every cached result for one dataset (e.g. after the file is replaced)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_key]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def migrate(self, old_key, new_key, update):
+        """
+        Re-key one dataset's results to a new version of it (e.g. after a delta upsert).
+        `update(plan, bitmap)` returns each result as it is for the new version.
+        """
+        with self._lock:
+            moved = [(k, self._entries.pop(k)) for k in [k for k in self._entries if k[0] == old_key]]
+            for _, (_, size) in moved:
+                self._bytes -= size
+        for key, (bitmap, _) in moved:
+            self.put((new_key,) + key[1:], update(key[1], bitmap))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared by every FilterContext in the process (backend requests, dashboard sessions)
+filter_result_cache = FilterResultCache()
+
+
+def filter_cache_stats() -> dict:
+    return filter_result_cache.stats()
+
+
+registry.gauge("filter_cache_entries", "Cached filter results.", callback=lambda: filter_cache_stats()["entries"])
+registry.gauge("filter_cache_bytes", "Memory held by cached filter results.", callback=lambda: filter_cache_stats()["bytes"])
+registry.counter("filter_cache_lookups_total", "Filter-result cache lookups.", ("result",),
+                 callback=lambda: {"hit": filter_result_cache.hits, "miss": filter_result_cache.misses})
+registry.counter("filter_cache_evictions_total", "Filter results evicted from the cache.",
+                 callback=lambda: filter_result_cache.evictions)
@@ -0,0 +1,368 @@
+import ast
+import io
+import operator
+import re
+import threading
+import tokenize
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .bitmap_index import Bitmap
+from .filter_cache import filter_result_cache
+from .tracing import record_cache
+
+BACKTICK_RE = re.compile(r"`([^`]*)`")
+COMPARE_OPS = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+    ast.In: "in", ast.NotIn: "not in",
+}
+FLIPPED_OPS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "==", "!=": "!="}
+PY_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+          "==": operator.eq, "!=": operator.ne}
+STR_METHODS = {"contains", "startswith", "endswith"}
+NULL_METHODS = {"isna": False, "isnull": False, "notna": True, "notnull": True}
+
+
+class FilterError(ValueError):
+    """Raised when a filter expression is outside the supported subset or references unknown columns."""
+
+
+# ---------- Compilation ----------
+#
+# Plans are nested tuples so they are hashable and cheap to cache:
+#   ("cmp", col, op, value)            op in == != < <= > >=
+#   ("in", col, values, negate)        values is a tuple of literals
+#   ("str", col, method, pattern, case)
+#   ("null", col, negate)              negate=True means "not null"
+#   ("and", children) / ("or", children) / ("not", child) / ("const", bool)
+
+def _literal(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool, type(None))):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _literal(node.operand)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return -value
+    raise FilterError(f"Unsupported value: {ast.unparse(node)}")
+
+
+def _literal_list(node) -> tuple:
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return tuple(_literal(elt) for elt in node.elts)
+    return (_literal(node),)
+
+
+class _Compiler:
+    def __init__(self, columns: tuple, placeholders: dict):
+        self.columns = set(columns)
+        self.placeholders = placeholders
+
+    def column(self, node):
+        """Column name for a Name node, or None if the node isn't a column reference."""
+        if not isinstance(node, ast.Name):
+            return None
+        name = self.placeholders.get(node.id, node.id)
+        if name not in self.columns:
+            raise FilterError(f"Unknown column: {name}")
+        return name
+
+    def compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            kind = "and" if isinstance(node.op, ast.And) else "or"
+            return (kind, tuple(self.compile(v) for v in node.values))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            return ("not", self.compile(node.operand))
+        if isinstance(node, ast.Compare):
+            return self.compare(node)
+        if isinstance(node, ast.Call):
+            return self.call(node)
+        if isinstance(node, ast.Constant) and isinstance(node.value, bool):
+            return ("const", node.value)
+        raise FilterError(f"Unsupported expression: {ast.unparse(node)}")
+
+    def compare(self, node):
+        parts = []
+        left = node.left
+        for op_node, right in zip(node.ops, node.comparators):
+            op = COMPARE_OPS.get(type(op_node))
+            if op is None:
+                raise FilterError(f"Unsupported operator in: {ast.unparse(node)}")
+            parts.append(self.pairwise(left, op, right))
+            left = right
+        return parts[0] if len(parts) == 1 else ("and", tuple(parts))
+
+    def pairwise(self, left, op, right):
+        col = self.column(left)
+        if col is None:
+            col = self.column(right)
+            if col is None or op in ("in", "not in"):
+                raise FilterError("Comparisons must be between a column and a literal value")
+            left, right, op = right, left, FLIPPED_OPS[op]
+        elif self.column(right) is not None:
+            raise FilterError("Comparisons between two columns are not supported")
+
+        if op in ("in", "not in"):
+            return ("in", col, _literal_list(right), op == "not in")
+        if isinstance(right, (ast.List, ast.Tuple, ast.Set)) and op in ("==", "!="):
+            # df.query semantics: `col == [a, b]` means membership
+            return ("in", col, _literal_list(right), op == "!=")
+        value = _literal(right)
+        if value is None:
+            if op not in ("==", "!="):
+                raise FilterError("Only == and != can compare against None")
+            return ("null", col, op == "!=")
+        return ("cmp", col, op, value)
+
+    def call(self, node):
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            raise FilterError(f"Unsupported call: {ast.unparse(node)}")
+        if func.attr in NULL_METHODS and not node.args and not node.keywords:
+            col = self.column(func.value)
+            if col is not None:
+                return ("null", col, NULL_METHODS[func.attr])
+        if (func.attr in STR_METHODS and isinstance(func.value, ast.Attribute) and func.value.attr == "str"
+                and len(node.args) == 1):
+            col = self.column(func.value.value)
+            pattern = _literal(node.args[0])
+            case = True
+            for kw in node.keywords:
+                if kw.arg == "case":
+                    case = bool(_literal(kw.value))
+                elif kw.arg not in ("na", "regex"):
+                    raise FilterError(f"Unsupported argument: {kw.arg}")
+            if col is not None and isinstance(pattern, str):
+                return ("str", col, func.attr, pattern, case)
+        raise FilterError(f"Unsupported call: {ast.unparse(node)}")
+
+
+def _replace_booleans(source: str) -> str:
+    """
+    `&` and `|` rewritten to `and` / `or`, as df.query does, so they bind looser than
+    comparisons: `a == 1 & b == 2` means `(a == 1) and (b == 2)`. String literals are
+    left alone.
+    """
+    line_starts = [0]
+    for line in source.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+    spans = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type == tokenize.OP and tok.string in ("&", "|"):
+                row, col = tok.start
+                spans.append((line_starts[row - 1] + col, " and " if tok.string == "&" else " or "))
+    except (tokenize.TokenError, SyntaxError):
+        # Unbalanced brackets etc.: leave it for ast.parse to report
+        return source
+    for start, word in reversed(spans):
+        source = source[:start] + word + source[start + 1:]
+    return source
+
+
+@lru_cache(maxsize=1024)
+def compile_filter(expression: str, columns: tuple) -> tuple:
+    """
+    Parse a df.query()-style string into a validated plan over `columns`. Only
+    comparisons, membership, null checks, .str.contains/startswith/endswith and
+    boolean combinations of those are accepted; anything else raises FilterError.
+    """
+    placeholders = {}
+
+    def substitute(match):
+        key = f"__col{len(placeholders)}__"
+        placeholders[key] = match.group(1)
+        return key
+
+    source = _replace_booleans(BACKTICK_RE.sub(substitute, expression.strip()))
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise FilterError(f"Invalid filter syntax: {e.msg}")
+    return _Compiler(columns, placeholders).compile(tree.body)
+
+
+def canonicalize(plan: tuple) -> tuple:
+    """Order-independent form of a plan, so `a and b` and `b and a` compare equal."""
+    kind = plan[0]
+    if kind in ("and", "or"):
+        children = []
+        for child in (canonicalize(c) for c in plan[1]):
+            # Flatten nested and/and, or/or
+            children.extend(child[1] if child[0] == kind else (child,))
+        children = tuple(sorted(set(children), key=repr))
+        return children[0] if len(children) == 1 else (kind, children)
+    if kind == "not":
+        return ("not", canonicalize(plan[1]))
+    if kind == "in":
+        return ("in", plan[1], tuple(sorted(set(plan[2]), key=repr)), plan[3])
+    return plan
+
+
+# ---------- Evaluation ----------
+
+class FilterContext:
+    """
+    Evaluates compiled plans against one DataFrame. Columns are factorized on first
+    use so equality, membership and string predicates run once per distinct value
+    and are broadcast to rows through integer codes. With a BitmapIndex, counts over
+    categorical predicates are answered from bitmaps without building a row mask.
+
+    When `dataset_key` identifies the dataset version (e.g. its fingerprint), results
+    are kept in the shared filter-result cache under (dataset_key, canonical plan),
+    so the same filter is evaluated once no matter how it is phrased or who asks.
+    """
+
+    def __init__(self, df: pd.DataFrame, bitmap_index=None, dataset_key=None):
+        self.df = df
+        self.bitmap_index = bitmap_index
+        self.dataset_key = dataset_key
+        self.columns = tuple(df.columns)
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def _factorized(self, col):
+        if col not in self._codes:
+            with self._lock:
+                if col not in self._codes:
+                    codes, uniques = pd.factorize(self.df[col], use_na_sentinel=True)
+                    lookup = {}
+                    for i, value in enumerate(uniques):
+                        lookup.setdefault(value, i)
+                    self._codes[col] = (codes, uniques, lookup)
+        return self._codes[col]
+
+    def _uses_codes(self, col) -> bool:
+        # Datetime columns compare against date strings, which only pandas knows how to parse
+        return not pd.api.types.is_datetime64_any_dtype(self.df[col])
+
+    def _membership(self, col, values) -> np.ndarray:
+        if not self._uses_codes(col):
+            series = self.df[col]
+            mask = np.zeros(len(series), dtype=bool)
+            for value in values:
+                mask |= (series == value).to_numpy(dtype=bool, na_value=False)
+            return mask
+        codes, _, lookup = self._factorized(col)
+        wanted = [lookup[v] for v in values if v in lookup]
+        if not wanted:
+            return np.zeros(len(codes), dtype=bool)
+        if len(wanted) == 1:
+            return codes == wanted[0]
+        return np.isin(codes, wanted)
+
+    def _evaluate(self, plan) -> np.ndarray:
+        kind = plan[0]
+        if kind == "and":
+            mask = self._evaluate(plan[1][0])
+            for child in plan[1][1:]:
+                mask = mask & self._evaluate(child)
+            return mask
+        if kind == "or":
+            mask = self._evaluate(plan[1][0])
+            for child in plan[1][1:]:
+                mask = mask | self._evaluate(child)
+            return mask
+        if kind == "not":
+            return ~self._evaluate(plan[1])
+        if kind == "const":
+            return np.full(len(self.df), plan[1], dtype=bool)
+        if kind == "in":
+            _, col, values, negate = plan
+            mask = self._membership(col, values)
+            return ~mask if negate else mask
+        if kind == "null":
+            _, col, negate = plan
+            mask = self.df[col].isna().to_numpy()
+            return ~mask if negate else mask
+        if kind == "cmp":
+            _, col, op, value = plan
+            if op in ("==", "!="):
+                mask = self._membership(col, (value,))
+                return ~mask if op == "!=" else mask
+            try:
+                return PY_OPS[op](self.df[col], value).to_numpy(dtype=bool, na_value=False)
+            except TypeError as e:
+                raise FilterError(f"Cannot compare `{col}` {op} {value!r}: {e}")
+        if kind == "str":
+            _, col, method, pattern, case = plan
+            codes, uniques, _ = self._factorized(col)
+            values = pd.Series(uniques).astype(str)
+            if method == "contains":
+                hits = values.str.contains(pattern, case=case, na=False)
+            else:
+                if not case:
+                    values, pattern = values.str.lower(), pattern.lower()
+                hits = getattr(values.str, method)(pattern)
+            lut = np.append(hits.to_numpy(dtype=bool), False)  # code -1 (missing) -> False
+            return lut[codes]
+        raise FilterError(f"Unknown plan node: {kind}")
+
+    def _evaluate_bitmap(self, plan):
+        """Bitmap for `plan` when every leaf is a predicate on a bitmap-indexed column, else None."""
+        index = self.bitmap_index
+        kind = plan[0]
+        if kind in ("and", "or"):
+            result = None
+            for child in plan[1]:
+                bitmap = self._evaluate_bitmap(child)
+                if bitmap is None:
+                    return None
+                result = bitmap if result is None else (result & bitmap if kind == "and" else result | bitmap)
+            return result
+        if kind == "not":
+            bitmap = self._evaluate_bitmap(plan[1])
+            return None if bitmap is None else ~bitmap
+        if kind == "const":
+            return index.all_rows() if plan[1] else ~index.all_rows()
+        col = plan[1]
+        if not index.has(col) or not self._uses_codes(col):
+            return None
+        if kind == "in":
+            bitmap = index.any_of(col, plan[2])
+            return ~bitmap if plan[3] else bitmap
+        if kind == "null":
+            return ~index.null(col) if plan[2] else index.null(col)
+        if kind == "cmp" and plan[2] in ("==", "!="):
+            bitmap = index.get(col, plan[3])
+            return ~bitmap if plan[2] == "!=" else bitmap
+        return None
+
+    def _compute_bitmap(self, plan) -> Bitmap:
+        if self.bitmap_index is not None:
+            bitmap = self._evaluate_bitmap(plan)
+            if bitmap is not None:
+                return bitmap
+        return Bitmap.from_mask(self._evaluate(plan))
+
+    def bitmap(self, expression: str) -> Bitmap:
+        """Matching rows as a Bitmap, served from the filter-result cache when possible."""
+        plan = compile_filter(expression, self.columns)
+        if self.dataset_key is None:
+            return self._compute_bitmap(plan)
+        key = (self.dataset_key, canonicalize(plan))
+        bitmap = filter_result_cache.get(key)
+        record_cache("filter", bitmap is not None)
+        if bitmap is None:
+            bitmap = self._compute_bitmap(plan).compact()
+            filter_result_cache.put(key, bitmap)
+        return bitmap
+
+    def count(self, expression: str) -> int:
+        """Number of matching rows, via bitmap AND/OR + popcount when possible."""
+        return self.bitmap(expression).count()
+
+    def mask(self, expression: str) -> np.ndarray:
+        """Boolean row mask for `expression`; raises FilterError before touching data if invalid."""
+        return self.bitmap(expression).to_mask()
+
+    def apply(self, expression: str, frame: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Rows of `frame` (default: the whole dataset) matching `expression`. `frame`
+        may be any row subset of this context's DataFrame, e.g. sidebar-filtered rows.
+        """
+        if frame is None:
+            return self.df[self.mask(expression)]
+        positions = self.df.index.get_indexer(frame.index)
+        if (positions < 0).any():
+            return FilterContext(frame).apply(expression)
+        return frame[self.mask(expression)[positions]]
@@ -0,0 +1,54 @@
+import bisect
+import threading
+
+# Geometric bucket bounds in seconds: 5ms .. ~330s
+DEFAULT_BUCKETS = tuple(round(0.005 * (1.5 ** i), 4) for i in range(28))
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram with interpolated quantiles."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += seconds
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def quantile(self, q: float):
+        """Estimate the q-quantile (0..1); returns None when empty."""
+        with self._lock:
+            total = self._count
+            counts = list(self._counts)
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for idx, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * ((rank - seen) / n)
+            seen += n
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts, sum and count (Prometheus histogram layout)."""
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), self._counts):
+                running += n
+                cumulative.append((bound, running))
+            return {"buckets": cumulative, "sum": self._sum, "count": self._count}
@@ -0,0 +1,250 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from .metrics import registry
+from .rate_limiter import RequestCancelled
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+# Finished jobs kept in memory for fast polling; older ones are read back from SQLite
+JOB_MEMORY_LIMIT = int(os.getenv("JOB_MEMORY_LIMIT", "200"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "5000"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when JOB_MAX_PENDING jobs are already waiting."""
+
+
+class JobQueue:
+    """
+    In-process background jobs: a bounded pool of worker threads runs submitted
+    callables, callers poll or long-poll (`wait`) for status, and every job is
+    persisted to a local SQLite file as it changes state, so results survive restarts
+    and jobs a restart interrupted report as failed. No broker needed.
+
+    A job's callable receives a threading.Event that is set on cancellation; work
+    that honours it (LLM calls, map-reduce, batches) stops early.
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = queue.Queue()
+        self._jobs = OrderedDict()  # job_id -> job dict (active + recently finished)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._db_lock = threading.Lock()
+        self._init_db()
+
+    # ---------- Persistence ----------
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        with self._db_lock, self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # Jobs that were queued/running when the process died can't resume
+            conn.execute("UPDATE jobs SET status = ?, error = ? WHERE status IN (?, ?)",
+                         (FAILED, "Server restarted before the job finished", QUEUED, RUNNING))
+
+    def _persist(self, job: dict):
+        row = (job["id"], job["kind"], job["status"], json.dumps(job["params"], default=str),
+               json.dumps(job["result"], default=str), job["error"],
+               job["created_at"], job["started_at"], job["finished_at"])
+        with self._db_lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            conn.execute("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                         (JOB_HISTORY_LIMIT,))
+
+    def _save(self, job: dict):
+        try:
+            self._persist(job)
+        except sqlite3.Error:
+            pass  # the job is still served from memory; it just won't outlive a restart
+
+    def _load(self, job_id: str):
+        with self._db_lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "kind", "status", "params", "result", "error", "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"]) if job["params"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # ---------- Workers ----------
+
+    def _ensure_workers(self):
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for _ in range(self.workers - len(self._threads)):
+                thread = threading.Thread(target=self._worker, daemon=True, name="job-worker")
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job_id = self._pending.get()
+            with self._cond:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue  # cancelled while waiting
+                job["status"] = RUNNING
+                job["started_at"] = time.time()
+                self._cond.notify_all()
+            # Only this thread writes the job until it finishes, so this can't overwrite a later state
+            self._save(job)
+            try:
+                result = job["fn"](job["cancel_event"])
+                status, error = (CANCELLED, "Cancelled") if job["cancel_event"].is_set() else (SUCCEEDED, None)
+            except RequestCancelled:
+                result, status, error = None, CANCELLED, "Cancelled"
+            except Exception as e:
+                result, status, error = None, FAILED, str(e)
+            self._finish(job, status, result, error)
+
+    def _finish(self, job: dict, status: str, result=None, error=None):
+        outcome = {"status": status, "result": result, "error": error, "finished_at": time.time()}
+        # Stored before it's visible, so a finished job outlives a restart from then on
+        self._save(dict(job, **outcome))
+        with self._cond:
+            job.update(outcome)
+            self._cond.notify_all()
+            finished = [jid for jid, j in self._jobs.items() if j["status"] in FINISHED_STATES]
+            for jid in finished[:max(0, len(finished) - JOB_MEMORY_LIMIT)]:
+                del self._jobs[jid]
+
+    # ---------- Public API ----------
+
+    def submit(self, kind: str, fn, params: dict = None) -> str:
+        """Queue `fn(cancel_event)` and return its job id; raises JobQueueFull when saturated."""
+        if self.pending_count() >= self.max_pending:
+            raise JobQueueFull(f"{self.max_pending} jobs are already waiting")
+        job = {
+            "id": uuid.uuid4().hex, "kind": kind, "status": QUEUED, "params": params or {},
+            "result": None, "error": None, "created_at": time.time(), "started_at": None, "finished_at": None,
+            "fn": fn, "cancel_event": threading.Event(),
+        }
+        self._save(job)  # before anyone can see (and cancel) it, so QUEUED never overwrites CANCELLED
+        with self._cond:
+            self._jobs[job["id"]] = job
+        self._ensure_workers()
+        self._pending.put(job["id"])
+        return job["id"]
+
+    def get(self, job_id: str, wait: float = 0) -> dict:
+        """Public view of a job, or None. With `wait`, blocks up to that many seconds for it to finish."""
+        deadline = time.monotonic() + max(0.0, wait)
+        with self._cond:
+            job = self._jobs.get(job_id)
+            while job is not None and job["status"] not in FINISHED_STATES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if job is not None:
+                return self._public(job)
+        job = self._load(job_id)
+        return self._public(job) if job is not None else None
+
+    def cancel(self, job_id: str) -> dict:
+        """Request cancellation; queued jobs are cancelled at once, running ones when they next check."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return self.get(job_id) if job is None else self._public(job)
+            job["cancel_event"].set()
+            queued = job["status"] == QUEUED
+            if queued:
+                job["status"] = CANCELLED  # under the lock, so no worker can pick it up
+        if queued:
+            self._finish(job, CANCELLED, error="Cancelled")
+        return self.get(job_id)
+
+    def list(self, limit: int = 50) -> list:
+        with self._cond:
+            active = [self._public(j, include_result=False) for j in reversed(self._jobs.values())]
+        if len(active) >= limit:
+            return active[:limit]
+        seen = {j["job_id"] for j in active}
+        with self._db_lock, self._connect() as conn:
+            rows = conn.execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        for (job_id,) in rows:
+            if job_id not in seen and len(active) < limit:
+                active.append(self._public(self._load(job_id), include_result=False))
+        return active
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return sum(1 for j in self._jobs.values() if j["status"] == QUEUED)
+
+    def running_count(self) -> int:
+        with self._cond:
+            return sum(1 for j in self._jobs.values() if j["status"] == RUNNING)
+
+    @staticmethod
+    def _public(job: dict, include_result: bool = True) -> dict:
+        def ms(start, end):
+            return round((end - start) * 1000, 1) if start and end else None
+
+        view = {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "params": job["params"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "timings": {
+                "queued_ms": ms(job["created_at"], job["started_at"] or job["finished_at"] or time.time()),
+                "run_ms": ms(job["started_at"], job["finished_at"] or (time.time() if job["started_at"] else None)),
+            },
+        }
+        if include_result:
+            view["result"] = job["result"]
+        return view
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def _job_counts() -> dict:
+    if _job_queue is None:
+        return {QUEUED: 0, RUNNING: 0}
+    return {QUEUED: _job_queue.pending_count(), RUNNING: _job_queue.running_count()}
+
+
+registry.gauge("background_jobs", "Background jobs by state.", ("state",), callback=_job_counts)
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue, created on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
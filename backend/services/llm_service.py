@@ -1,76 +1,268 @@
 import requests
 import json
+import os
+import queue
+import re
+import threading
 import time
-
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+from collections import OrderedDict
+from .metrics import registry
+from .tracing import span
+from .rate_limiter import (
+    PriorityScheduler, RateLimitExceeded, RequestCancelled, PRIORITY_INTERACTIVE, PRIORITY_BULK
+)
+
+# Both endpoints can be pointed elsewhere, e.g. at benchmarks/fake_llm_server.py for load tests
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_API_URL = f"{OLLAMA_BASE_URL}/api/generate"
 MODEL_NAME = "mistral"
 GEMINI_MODEL = "gemini-2.5-flash"
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+
+# Gemini quota (free tier defaults), shared by every thread in the process
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "10"))
+GEMINI_TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT", "250000"))
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "32"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "60"))
+
+# Hedged mode: start Gemini in parallel once Ollama is slower than its recent p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "30"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# Prompt budget for data rows picked by the retrieval index
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000"))
+
+# Prompt budget for the pre-aggregated dataset summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+
+# Map-reduce answering over the full dataset
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_TOKENS", "3000"))
+MAP_REDUCE_WORKERS = int(os.getenv("MAP_REDUCE_WORKERS", "4"))
+MAP_REDUCE_MAX_CHUNKS = int(os.getenv("MAP_REDUCE_MAX_CHUNKS", "64"))
+
+# Recent generative answers, served as-is when the backend sheds load
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+
+_gemini_scheduler = PriorityScheduler(
+    GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT, max_queue=GEMINI_MAX_QUEUE, max_wait=GEMINI_MAX_WAIT
+)
+
+LLM_LATENCY = registry.histogram("llm_call_duration_seconds", "Latency of successful LLM calls, by engine.",
+                                 ("engine",))
+LLM_FAILURES = registry.counter("llm_call_failures_total", "LLM calls that raised an error, by engine.", ("engine",))
+GEMINI_RATE_LIMITED = registry.counter("gemini_rate_limited_total", "Gemini responses with HTTP 429 (each is retried).")
+registry.gauge("gemini_scheduler_queue_depth", "Gemini calls waiting for rate-limit capacity.",
+               callback=lambda: _gemini_scheduler.queue_depth())
+
+_engine_latency = {"ollama": LLM_LATENCY.labels(engine="ollama"), "gemini": LLM_LATENCY.labels(engine="gemini")}
+
+_answer_cache = OrderedDict()
+_answer_cache_lock = threading.Lock()
 
 # ---------- Internal helpers ----------
 
 def _ollama_available():
     """Quick check if Ollama is reachable."""
     try:
-        r = requests.get("http://localhost:11434/api/tags", timeout=2)
+        r = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=2)
         return r.status_code == 200
     except Exception:
         return False
 
 
-def _call_ollama(prompt: str, format_json: bool = False, timeout: int = 60) -> str:
-    """Call the local Ollama API and return the raw text response."""
+def _call_ollama(prompt: str, format_json: bool = False, timeout: int = 60, cancel_event=None) -> str:
+    """Call the local Ollama API and return the raw text response.
+
+    With a `cancel_event` the response is streamed so the request can be abandoned
+    mid-generation; closing the connection makes Ollama stop generating.
+    """
     payload = {
         "model": MODEL_NAME,
         "prompt": prompt,
-        "stream": False
+        "stream": cancel_event is not None
     }
     if format_json:
         payload["format"] = "json"
-    response = requests.post(OLLAMA_API_URL, json=payload, timeout=timeout)
-    response.raise_for_status()
-    return response.json().get("response", "").strip()
+    if cancel_event is None:
+        response = requests.post(OLLAMA_API_URL, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json().get("response", "").strip()
+
+    chunks = []
+    with requests.post(OLLAMA_API_URL, json=payload, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if cancel_event.is_set():
+                raise RequestCancelled("Ollama request cancelled")
+            if not line:
+                continue
+            data = json.loads(line)
+            chunks.append(data.get("response", ""))
+            if data.get("done"):
+                break
+    return "".join(chunks).strip()
+
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for TPM budgeting."""
+    return max(1, len(text) // 4)
 
-def _call_gemini(prompt: str, api_key: str, timeout: int = 60, max_retries: int = 3, format_json: bool = False) -> str:
-    """Call Google Gemini API with retry logic for rate limits."""
+
+def _retry_after_seconds(response, default: float) -> float:
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _call_gemini(prompt: str, api_key: str, timeout: int = 60, max_retries: int = 3, format_json: bool = False,
+                 priority: int = PRIORITY_INTERACTIVE, cancel_event=None) -> str:
+    """Call Google Gemini API through the shared rate-limit scheduler."""
     url = f"{GEMINI_BASE_URL}/{GEMINI_MODEL}:generateContent?key={api_key}"
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
     }
     if format_json:
         payload["generationConfig"] = {"responseMimeType": "application/json"}
-    
+
+    estimated_tokens = estimate_tokens(prompt)
     for attempt in range(max_retries):
+        # Raises RateLimitExceeded with an estimated wait if the queue is saturated
+        _gemini_scheduler.acquire(estimated_tokens, priority=priority, cancel_event=cancel_event)
         response = requests.post(url, json=payload, timeout=timeout)
         if response.status_code == 429:
-            wait_time = 2 ** (attempt + 1)  # 2s, 4s, 8s
-            time.sleep(wait_time)
+            GEMINI_RATE_LIMITED.inc()
+            # Pause the whole scheduler so queued requests stop hitting the quota
+            _gemini_scheduler.penalize(_retry_after_seconds(response, 2 ** (attempt + 1)))
             continue
         response.raise_for_status()
         result = response.json()
+        used_tokens = result.get("usageMetadata", {}).get("totalTokenCount")
+        if used_tokens:
+            _gemini_scheduler.reconcile(estimated_tokens, used_tokens)
         candidates = result.get("candidates", [])
         if candidates:
             parts = candidates[0].get("content", {}).get("parts", [])
             if parts:
                 return parts[0].get("text", "").strip()
         return ""
-    
-    raise Exception("Gemini API rate limit exceeded. Please wait a moment and try again.")
+
+    raise RateLimitExceeded(_gemini_scheduler.estimate_wait(estimated_tokens, priority))
 
 
-def _call_llm(prompt: str, api_key: str = "", format_json: bool = False, timeout: int = 60) -> str:
-    """Try Ollama first, fall back to Gemini if unavailable or on error."""
+def _timed(engine: str, fn):
+    """Run an engine call and record its latency when it succeeds."""
+    start = time.monotonic()
+    try:
+        with span(f"llm_{engine}"):
+            result = fn()
+    except RequestCancelled:
+        raise
+    except Exception:
+        LLM_FAILURES.inc(engine=engine)
+        raise
+    _engine_latency[engine].observe(time.monotonic() - start)
+    return result
+
+
+def _hedge_delay() -> float:
+    """Seconds to give Ollama before hedging, from its observed latency distribution."""
+    hist = _engine_latency["ollama"]
+    if hist.count < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return min(LLM_HEDGE_MAX_DELAY, max(LLM_HEDGE_MIN_DELAY, hist.quantile(LLM_HEDGE_QUANTILE)))
+
+
+def _call_llm_hedged(prompt: str, api_key: str, format_json: bool, timeout: int, priority: int) -> str:
+    """
+    Start Ollama; if it hasn't answered within the hedge delay (or fails), start Gemini
+    in parallel. The first non-empty response wins and the other call is cancelled.
+    """
+    cancel_event = threading.Event()
+    results = queue.Queue()
+
+    def run(engine, fn):
+        start = time.monotonic()
+        try:
+            text = fn()
+        except RequestCancelled:
+            # Lower bound of the engine's latency; keeps the histogram honest about slow calls
+            _engine_latency[engine].observe(time.monotonic() - start)
+            results.put((engine, None, None))
+            return
+        except Exception as e:
+            LLM_FAILURES.inc(engine=engine)
+            results.put((engine, None, e))
+            return
+        _engine_latency[engine].observe(time.monotonic() - start)
+        results.put((engine, text, None))
+
+    def start(engine, fn):
+        threading.Thread(target=run, args=(engine, fn), daemon=True).start()
+
+    start("ollama", lambda: _call_ollama(prompt, format_json=format_json, timeout=timeout,
+                                         cancel_event=cancel_event))
+    pending = 1
+    gemini_started = False
+    hedge_at = time.monotonic() + _hedge_delay()
+    last_error = None
+
+    while pending:
+        wait = None if gemini_started else max(0.0, hedge_at - time.monotonic())
+        try:
+            engine, text, error = results.get(timeout=wait)
+        except queue.Empty:
+            pass
+        else:
+            pending -= 1
+            if text:
+                cancel_event.set()
+                return text
+            last_error = error or last_error
+        if not gemini_started:
+            gemini_started = True
+            pending += 1
+            start("gemini", lambda: _call_gemini(prompt, api_key, timeout=timeout, format_json=format_json,
+                                                 priority=priority, cancel_event=cancel_event))
+
+    cancel_event.set()
+    if last_error:
+        raise last_error
+    return ""
+
+
+def _call_llm(prompt: str, api_key: str = "", format_json: bool = False, timeout: int = 60,
+              priority: int = PRIORITY_INTERACTIVE, hedge: bool = None, cancel_event=None) -> str:
+    """Try Ollama first, fall back to Gemini if unavailable or on error.
+
+    With `hedge` (default: LLM_HEDGE_ENABLED) and both engines available, the
+    Gemini fallback is started early instead of waiting for Ollama's timeout.
+    A caller-supplied `cancel_event` aborts the call and disables hedging.
+    """
+    if hedge is None:
+        hedge = LLM_HEDGE_ENABLED
     if _ollama_available():
+        if hedge and api_key and cancel_event is None:
+            with span("llm_hedged"):
+                return _call_llm_hedged(prompt, api_key, format_json, timeout, priority)
         try:
-            return _call_ollama(prompt, format_json=format_json, timeout=timeout)
+            return _timed("ollama", lambda: _call_ollama(prompt, format_json=format_json, timeout=timeout,
+                                                         cancel_event=cancel_event))
+        except RequestCancelled:
+            raise
         except Exception:
             # Ollama timed out or errored — fall back to Gemini
             if api_key:
-                return _call_gemini(prompt, api_key, timeout=timeout, format_json=format_json)
+                return _timed("gemini", lambda: _call_gemini(prompt, api_key, timeout=timeout, format_json=format_json,
+                                                             priority=priority, cancel_event=cancel_event))
             raise
     elif api_key:
-        return _call_gemini(prompt, api_key, timeout=timeout, format_json=format_json)
+        return _timed("gemini", lambda: _call_gemini(prompt, api_key, timeout=timeout, format_json=format_json,
+                                                     priority=priority, cancel_event=cancel_event))
     else:
         raise ConnectionError(
             "Ollama is not running and no Gemini API key is configured. "
@@ -80,33 +272,278 @@ def _call_llm(prompt: str, api_key: str = "", format_json: bool = False, timeout
 
 # ---------- Public functions ----------
 
-def answer_generative_query(file_path: str, query: str, api_key: str = "") -> str:
-    from .excel_service import load_dataframe
+def answer_generative_query(file_path: str, query: str, api_key: str = "", mode: str = "retrieval",
+                            cancel_event=None) -> str:
+    """
+    Answer a free-form question. `mode` is "retrieval" (relevant rows only) or "map_reduce"
+    (every row). Setting `cancel_event` aborts the model call(s) with RequestCancelled.
+    """
+    from .context_service import get_dataset_context
+    from .excel_service import load_dataframe, get_dataset_artifact, dataset_fingerprint
+    from .retrieval_service import RowRetrievalIndex
     df = load_dataframe(file_path)
 
-    sample_df = df.head(30)
-    data_csv = sample_df.to_csv(index=False)
+    cache_key = _answer_cache_key(file_path, query, mode)
+    if mode == "map_reduce":
+        return _answer_every_row(df, query, cache_key, api_key, cancel_event)
+
+    # Rows most relevant to the question instead of the first N
+    index = get_dataset_artifact(file_path, "retrieval_index", RowRetrievalIndex)
+    with span("retrieval"):
+        data_rows, n_rows = index.build_context(query, token_budget=RETRIEVAL_TOKEN_BUDGET)
+    with span("context_summary"):
+        summary = get_dataset_context(dataset_fingerprint(file_path), df, token_budget=CONTEXT_TOKEN_BUDGET)
+    return _answer_from_rows(query, summary, data_rows, n_rows, len(df), cache_key, api_key, cancel_event)
+
+
+def answer_portfolio_query(portfolio, query: str, api_key: str = "", mode: str = "retrieval",
+                           cancel_event=None) -> str:
+    """answer_generative_query() over every workbook of a portfolio (see portfolio_service.Portfolio)."""
+    cache_key = _portfolio_cache_key(portfolio, query, mode)
+    if mode == "map_reduce":
+        # The one portfolio path that needs every row in one frame
+        with span("portfolio_concat"):
+            df = portfolio.concat()
+        return _answer_every_row(df, query, cache_key, api_key, cancel_event)
+
+    with span("retrieval"):
+        data_rows, n_rows = portfolio.build_context(query, token_budget=RETRIEVAL_TOKEN_BUDGET)
+    with span("context_summary"):
+        summary = portfolio.dataset_context(token_budget=CONTEXT_TOKEN_BUDGET)
+    return _answer_from_rows(query, summary, data_rows, n_rows, portfolio.n_rows, cache_key, api_key, cancel_event)
+
+
+def _answer_every_row(df, query: str, cache_key: tuple, api_key: str, cancel_event) -> str:
+    try:
+        with span("map_reduce"):
+            answer = answer_map_reduce(df, query, api_key=api_key, cancel_event=cancel_event)
+        return _remember_answer(cache_key, answer)
+    except RequestCancelled:
+        raise
+    except ConnectionError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error communicating with AI model: {str(e)}"
+
 
+def _answer_from_rows(query: str, summary: str, data_rows: str, n_rows: int, total_rows: int, cache_key: tuple,
+                      api_key: str, cancel_event) -> str:
     prompt = f"""
 You are an expert data analyst AI assistant helping a user answer questions based on their Excel data.
-Here is a sample of the data (in CSV format) to give you context:
+Summary statistics computed over ALL rows:
 
-{data_csv}
+{summary}
+
+Here are the {n_rows} rows (out of {total_rows}) most relevant to the question, as a pipe-separated table:
+
+{data_rows}
 
 User Question: {query}
 
 Please answer the user's question clearly and concisely based on the data provided. 
-If the question asks about data beyond the sample provided, mention that you are only 
-analyzing a sample of {len(sample_df)} rows.
+Use the summary statistics for counts and distributions. If the question needs row-level
+details beyond the rows provided, mention that you are only seeing {n_rows} of {total_rows} rows.
 """
     try:
-        return _call_llm(prompt, api_key=api_key, timeout=120)
+        return _remember_answer(cache_key, _call_llm(prompt, api_key=api_key, timeout=120, cancel_event=cancel_event))
+    except RequestCancelled:
+        raise
     except ConnectionError as e:
         return str(e)
     except Exception as e:
         return f"Error communicating with AI model: {str(e)}"
 
 
+def _answer_cache_key(file_path: str, query: str, mode: str) -> tuple:
+    from .excel_service import dataset_fingerprint
+    return (dataset_fingerprint(file_path), " ".join(query.lower().split()), mode)
+
+
+def _portfolio_cache_key(portfolio, query: str, mode: str) -> tuple:
+    return (portfolio.fingerprint, " ".join(query.lower().split()), mode)
+
+
+def _remember_answer(key: tuple, answer: str) -> str:
+    with _answer_cache_lock:
+        _answer_cache[key] = answer
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+    return answer
+
+
+def degraded_generative_answer(file_path: str, query: str, mode: str = "retrieval") -> str:
+    """
+    Answer without calling a model, for load shedding: a previous answer to the same
+    question on the same data if there is one, else the digest lines that mention
+    the question's words (or the whole digest).
+    """
+    from .context_service import get_dataset_context
+    from .excel_service import load_dataframe, dataset_fingerprint
+    return _degraded_answer(
+        lambda key_mode: _answer_cache_key(file_path, query, key_mode), query, mode,
+        lambda: get_dataset_context(dataset_fingerprint(file_path), load_dataframe(file_path),
+                                    token_budget=CONTEXT_TOKEN_BUDGET)
+    )
+
+
+def degraded_portfolio_answer(portfolio, query: str, mode: str = "retrieval") -> str:
+    """degraded_generative_answer() for a portfolio."""
+    return _degraded_answer(
+        lambda key_mode: _portfolio_cache_key(portfolio, query, key_mode), query, mode,
+        lambda: portfolio.dataset_context(token_budget=CONTEXT_TOKEN_BUDGET)
+    )
+
+
+def _degraded_answer(cache_key, query: str, mode: str, summarize) -> str:
+    for key_mode in (mode, "retrieval", "map_reduce"):
+        with _answer_cache_lock:
+            cached = _answer_cache.get(cache_key(key_mode))
+        if cached is not None:
+            return f"(Served from a recent answer while the AI model is at capacity.)\n\n{cached}"
+
+    summary = summarize()
+    words = {w for w in re.findall(r"[a-z0-9]+", query.lower()) if len(w) > 3}
+    relevant = [line for line in summary.splitlines() if words & set(re.findall(r"[a-z0-9]+", line.lower()))]
+    return (
+        "The AI model is at capacity right now, so here are the relevant statistics computed over "
+        "all rows instead of a written answer. Please retry shortly for a full answer.\n\n"
+        + "\n".join(relevant or summary.splitlines())
+    )
+
+
+def _partition_rows(df, token_budget: int) -> list:
+    """Split `df` into consecutive row slices whose compact encoding fits `token_budget`."""
+    from .retrieval_service import encode_rows_compact
+    if df.empty:
+        return []
+    probe = df.head(20)
+    tokens_per_row = estimate_tokens(encode_rows_compact(probe)) / len(probe)
+    rows_per_chunk = max(1, int(token_budget * 0.9 / max(tokens_per_row, 1)))
+    return [(start, min(start + rows_per_chunk, len(df))) for start in range(0, len(df), rows_per_chunk)]
+
+
+def answer_map_reduce(df, query: str, api_key: str = "", progress_callback=None, cancel_event=None,
+                      max_workers: int = MAP_REDUCE_WORKERS, chunk_tokens: int = MAP_REDUCE_CHUNK_TOKENS) -> str:
+    """
+    Answer `query` over every row: each token-budgeted chunk is summarised in parallel
+    (map), then the partial answers are combined (reduce).
+
+    `progress_callback(done, total)` is called as chunk prompts finish; setting
+    `cancel_event` stops scheduling new chunks, aborts in-flight calls and raises
+    RequestCancelled. Gemini calls stay within the shared rate-limit scheduler.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from .retrieval_service import encode_rows_compact
+
+    if df.empty:
+        if progress_callback:
+            progress_callback(1, 1)
+        return "There are no rows to analyse, so the question can't be answered from this data."
+    chunks = _partition_rows(df, chunk_tokens)
+    if len(chunks) > MAP_REDUCE_MAX_CHUNKS:
+        raise ValueError(
+            f"Dataset needs {len(chunks)} chunks, above the map-reduce limit of {MAP_REDUCE_MAX_CHUNKS}. "
+            "Narrow the data with filters first."
+        )
+    total_steps = len(chunks) + 1
+    cancel_event = cancel_event or threading.Event()
+
+    def map_chunk(i, start, end):
+        if cancel_event.is_set():
+            raise RequestCancelled("Map-reduce cancelled")
+        prompt = f"""
+You are a data analyst reading part {i + 1} of {len(chunks)} of a dataset (rows {start + 1}-{end} of {len(df)}).
+Data (pipe-separated):
+
+{encode_rows_compact(df.iloc[start:end])}
+
+Question: {query}
+
+Extract only what this part contributes to the answer: exact counts, totals, matching names
+or notable facts. Be terse. If nothing in this part is relevant, reply exactly: NO RELEVANT DATA
+"""
+        # Parallel fan-out already bounds latency; hedging would only double the load
+        return _call_llm(prompt, api_key=api_key, timeout=120, priority=PRIORITY_BULK,
+                         hedge=False, cancel_event=cancel_event)
+
+    partials = [None] * len(chunks)
+    errors = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(map_chunk, i, start, end): i for i, (start, end) in enumerate(chunks)}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    partials[i] = future.result()
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    errors.append(e)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total_steps)
+                if cancel_event.is_set():
+                    raise RequestCancelled("Map-reduce cancelled")
+        except BaseException:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            raise
+
+    findings = [
+        f"Part {i + 1}: {text}" for i, text in enumerate(partials)
+        if text and "NO RELEVANT DATA" not in text.upper()
+    ]
+    if errors and len(errors) == len(chunks):
+        raise errors[0]
+
+    answer = _reduce_partials(query, findings, len(df), len(chunks), len(errors), api_key, chunk_tokens, cancel_event)
+    if progress_callback:
+        progress_callback(total_steps, total_steps)
+    return answer
+
+
+def _reduce_partials(query: str, findings: list, n_rows: int, n_chunks: int, n_failed: int,
+                     api_key: str, token_budget: int, cancel_event) -> str:
+    """Combine partial answers, reducing in batches first when they exceed the prompt budget."""
+    while len(findings) > 1 and estimate_tokens("\n".join(findings)) > token_budget:
+        batches, batch = [], []
+        for item in findings:
+            if batch and estimate_tokens("\n".join(batch + [item])) > token_budget:
+                batches.append(batch)
+                batch = []
+            batch.append(item)
+        batches.append(batch)
+        if len(batches) == len(findings):
+            break  # every finding is already over budget on its own
+        findings = [
+            _call_llm(
+                f"Merge these partial findings for the question \"{query}\" into one terse list, "
+                f"summing counts that refer to the same thing:\n\n" + "\n".join(batch),
+                api_key=api_key, timeout=120, priority=PRIORITY_BULK, hedge=False, cancel_event=cancel_event,
+            )
+            for batch in batches
+        ]
+
+    missing_note = (
+        f"\nNote: {n_failed} of {n_chunks} parts could not be analysed; say so in the answer." if n_failed else ""
+    )
+    prompt = f"""
+You are an expert data analyst. A dataset of {n_rows} rows was split into {n_chunks} parts and each
+part was analysed separately. Partial findings (parts without relevant data are omitted):
+
+{chr(10).join(findings) if findings else "No part contained relevant data."}
+{missing_note}
+User Question: {query}
+
+Combine the partial findings into one clear, concise answer covering the whole dataset.
+Add up counts and totals across parts rather than repeating them.
+"""
+    return _call_llm(prompt, api_key=api_key, timeout=120, hedge=False, cancel_event=cancel_event)
+
+
 def generate_pandas_filter(query: str, columns: list, api_key: str = "") -> str:
     prompt = f"""
 You are an expert Python data scientist.
@@ -123,47 +560,61 @@ CRITICAL MANDATORY RULES:
 For example, if columns are ['Incident Response', 'Status'] and query is "open incidents": `Incident Response` == 'Yes' and Status == 'Open'
 """
     try:
-        result = _call_llm(prompt, api_key=api_key, timeout=30)
-        # Strip code formatting if the LLM includes it
-        if result.startswith("```"):
-            result = result.split("\n", 1)[-1].rsplit("\n", 1)[0]
-
-        result = result.strip()
-        if result.startswith("`") and result.endswith("`"):
-            result = result[1:-1].strip()
-        elif result.startswith('"') and result.endswith('"'):
-            result = result[1:-1].strip()
-
-        return result
+        return _clean_filter(_call_llm(prompt, api_key=api_key, timeout=30))
     except Exception:
         return "None"
 
 
-def generate_graph_config(query: str, columns: list, api_key: str = "", df=None) -> list:
-    """Returns a list of graph config dicts. Each has x_col, y_col, aggregation, graph_type."""
-    
-    # Build a column reference with sample values
-    col_ref = ""
-    if df is not None:
-        col_lines = []
-        for col in columns:
-            try:
-                samples = df[col].dropna().unique()[:4]
-                sample_str = ", ".join([str(s) for s in samples])
-                col_lines.append(f"  - \"{col}\" (e.g. {sample_str})")
-            except Exception:
-                col_lines.append(f"  - \"{col}\"")
-        col_ref = "\n".join(col_lines)
-    else:
-        col_ref = "\n".join([f"  - \"{col}\"" for col in columns])
-    
+def generate_pandas_filters(queries: list, columns: list, api_key: str = "",
+                            priority: int = PRIORITY_BULK) -> list:
+    """`generate_pandas_filter` for several count questions with one LLM call; "None" where no filter applies."""
+    if len(queries) <= 1:
+        return [generate_pandas_filter(q, columns, api_key=api_key) for q in queries]
+    numbered = "\n".join(f'{i + 1}. "{q}"' for i, q in enumerate(queries))
     prompt = f"""
-You are a data visualization assistant.
-Here are the available columns with sample values:
-{col_ref}
+You are an expert Python data scientist.
+Given the following pandas dataframe columns: {columns}
+And these {len(queries)} separate user queries:
+{numbered}
 
-User's request: "{query}"
+For EACH query, write a valid Pandas `df.query()` string that filters the dataframe to answer it.
+Map the user's terms to the closest matching column names.
+CRITICAL MANDATORY RULES:
+1. Output a JSON OBJECT whose keys are the query numbers ("1", "2", ...) and whose values are the query strings, or null if the query doesn't require filtering.
+2. If a column name contains spaces or special characters, you MUST wrap the column name in backticks (`).
+3. Each query string MUST be a full boolean condition (e.g. `Column Name` == 'Yes' or `Column Name` > 5). DO NOT just return the column name.
+For example, if columns are ['Incident Response', 'Status'] and query 1 is "open incidents": {{"1": "`Incident Response` == 'Yes' and Status == 'Open'"}}
+"""
+    try:
+        result_text = _strip_code_fence(_call_llm(prompt, api_key=api_key, format_json=True,
+                                                  timeout=30 + 5 * len(queries), priority=priority))
+        parsed = json.loads(result_text)
+        if isinstance(parsed, list) and len(parsed) == len(queries):
+            parsed = {str(i + 1): item for i, item in enumerate(parsed)}
+        if isinstance(parsed, dict):
+            return [_clean_filter(str(parsed.get(str(i + 1)) or "None")) for i in range(len(queries))]
+    except Exception:
+        pass
+    # The model ignored the batch format; ask one question at a time
+    return [generate_pandas_filter(q, columns, api_key=api_key) for q in queries]
+
+
+def _graph_column_reference(columns: list, df=None) -> str:
+    """Column list with a few sample values each, for chart-config prompts."""
+    if df is None:
+        return "\n".join([f"  - \"{col}\"" for col in columns])
+    col_lines = []
+    for col in columns:
+        try:
+            samples = df[col].dropna().unique()[:4]
+            sample_str = ", ".join([str(s) for s in samples])
+            col_lines.append(f"  - \"{col}\" (e.g. {sample_str})")
+        except Exception:
+            col_lines.append(f"  - \"{col}\"")
+    return "\n".join(col_lines)
 
+
+GRAPH_CONFIG_RULES = """
 Map the user's request to the EXACT column names listed above.
 Choose the BEST visualization for each aspect:
 
@@ -173,38 +624,58 @@ RULES:
 3. If a column has many categories (5+), use "bar".
 4. If a column has 3-6 categories, use "pie".
 5. If the request mentions multiple topics, generate MULTIPLE items.
+6. If the request breaks one category down by another (e.g. "breaches by industry by revenue range"), use "heatmap" (or "stacked_bar" if asked for bars) with x_col and group_col set to the two categories, and "filter" restricting rows to the counted condition.
 
-Output a JSON ARRAY. Each object must have:
+Each chart object must have:
 - "x_col": EXACT column name from the list above (REQUIRED, never null)
 - "y_col": column name for y-axis, or null if counting
-- "aggregation": "count", "sum", "mean", "min", or "max"
-- "graph_type": "bar", "line", "pie", or "metric"
+- "aggregation": "count", "sum", "mean", "median", "min", or "max"
+- "graph_type": "bar", "line", "pie", "metric", "heatmap", or "stacked_bar"
+- "group_col": second category column for "heatmap"/"stacked_bar", otherwise null
+- "filter": pandas query string restricting which rows are counted (e.g. "`Cyber Insurance` == 'No'"), or null
 - "title": descriptive title
 - "description": 1-2 sentence insight explaining WHY this matters or what the gap/concern is
 
+Columns named like "RTO (seconds)" or "Revenue Range Min (USD)" hold numbers parsed from the text column they
+name; use them as y_col for sum/mean/median/min/max, and the text column itself as x_col.
+
 For "metric" type: x_col is the column to count, the dashboard will show value counts as KPI widgets.
 
 CRITICAL: x_col MUST be one of the exact column names listed above. Never return null for x_col.
-
-DO NOT return Markdown, only raw JSON array.
 """
-    try:
-        result_text = _call_llm(prompt, api_key=api_key, format_json=True, timeout=45)
-        if result_text.startswith("```"):
-            result_text = result_text.split("\n", 1)[-1].rsplit("\n", 1)[0]
-        parsed = json.loads(result_text)
-        # Normalize: if LLM returns a single dict, wrap it in a list
-        if isinstance(parsed, dict):
-            parsed = [parsed]
-        if isinstance(parsed, list):
-            # Filter out configs with invalid/null x_col
-            valid = [c for c in parsed if c.get("x_col") and c["x_col"] in columns]
-            if valid:
-                return valid
-    except Exception:
-        pass
-    
-    # Fallback: keyword-match columns from the query
+
+
+def _strip_code_fence(text: str) -> str:
+    if text.startswith("```"):
+        return text.split("\n", 1)[-1].rsplit("\n", 1)[0]
+    return text
+
+
+def _clean_filter(text: str) -> str:
+    """A model's filter string without code fences or quotes wrapped around the whole of it."""
+    result = _strip_code_fence(text.strip()).strip()
+    if result.startswith("`") and result.endswith("`") and "`" not in result[1:-1]:
+        result = result[1:-1].strip()
+    elif result.startswith('"') and result.endswith('"'):
+        result = result[1:-1].strip()
+    return result or "None"
+
+
+def _valid_graph_configs(parsed, columns: list) -> list:
+    """Chart configs with a usable x_col; a single dict is wrapped in a list."""
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    if not isinstance(parsed, list):
+        return []
+    valid = [c for c in parsed if isinstance(c, dict) and c.get("x_col") and c["x_col"] in columns]
+    for c in valid:
+        if c.get("group_col") not in columns:
+            c["group_col"] = None
+    return valid
+
+
+def _keyword_graph_configs(query: str, columns: list) -> list:
+    """Fallback: keyword-match columns from the query."""
     query_lower = query.lower()
     matched_configs = []
     for col in columns:
@@ -223,6 +694,79 @@ DO NOT return Markdown, only raw JSON array.
     return matched_configs[:8]  # Cap at 8 charts max
 
 
+def generate_graph_config(query: str, columns: list, api_key: str = "", df=None,
+                          priority: int = PRIORITY_BULK) -> list:
+    """
+    Returns a list of graph config dicts. Each has x_col, y_col, aggregation, graph_type,
+    plus group_col for 2-D breakdowns (heatmap/stacked_bar) and an optional row filter.
+    """
+    prompt = f"""
+You are a data visualization assistant.
+Here are the available columns with sample values:
+{_graph_column_reference(columns, df)}
+
+User's request: "{query}"
+{GRAPH_CONFIG_RULES}
+Output a JSON ARRAY of chart objects.
+
+DO NOT return Markdown, only raw JSON array.
+"""
+    try:
+        result_text = _strip_code_fence(_call_llm(prompt, api_key=api_key, format_json=True, timeout=45,
+                                                  priority=priority))
+        valid = _valid_graph_configs(json.loads(result_text), columns)
+        if valid:
+            return valid
+    except Exception:
+        pass
+    
+    return _keyword_graph_configs(query, columns)
+
+
+def generate_graph_configs(queries: list, columns: list, api_key: str = "", df=None,
+                           priority: int = PRIORITY_BULK) -> list:
+    """Chart configs for several requests with one LLM call; one config list per query, in order."""
+    if len(queries) <= 1:
+        return [generate_graph_config(q, columns, api_key=api_key, df=df, priority=priority) for q in queries]
+    numbered = "\n".join(f'{i + 1}. "{q}"' for i, q in enumerate(queries))
+    prompt = f"""
+You are a data visualization assistant.
+Here are the available columns with sample values:
+{_graph_column_reference(columns, df)}
+
+There are {len(queries)} separate user requests:
+{numbered}
+{GRAPH_CONFIG_RULES}
+Output a JSON OBJECT whose keys are the request numbers ("1", "2", ...) and whose values
+are JSON ARRAYS of chart objects for that request.
+
+DO NOT return Markdown, only raw JSON.
+"""
+    parsed = {}
+    try:
+        result_text = _strip_code_fence(_call_llm(prompt, api_key=api_key, format_json=True,
+                                                  timeout=45 + 10 * len(queries), priority=priority))
+        parsed = json.loads(result_text)
+        if isinstance(parsed, list) and len(parsed) == len(queries):
+            parsed = {str(i + 1): item for i, item in enumerate(parsed)}
+        if not isinstance(parsed, dict):
+            parsed = {}
+    except Exception:
+        pass
+    return [
+        _valid_graph_configs(parsed.get(str(i + 1)), columns) or _keyword_graph_configs(q, columns)
+        for i, q in enumerate(queries)
+    ]
+
+
+def engine_latency_stats() -> dict:
+    """Per-engine call counts and latency quantiles (seconds)."""
+    return {
+        engine: {"count": hist.count, "p50": hist.quantile(0.5), "p95": hist.quantile(0.95)}
+        for engine, hist in _engine_latency.items()
+    }
+
+
 def call_generative(prompt: str, api_key: str = "", timeout: int = 60) -> str:
     """Generic generative call used by the dashboard copilot."""
     try:
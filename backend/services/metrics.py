@@ -0,0 +1,159 @@
+import threading
+from .histogram import LatencyHistogram, DEFAULT_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic value; with `callback`, the value(s) are read at scrape time instead."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        if self.callback is None:
+            with self._lock:
+                items = sorted(self._values.items())
+        else:
+            try:
+                result = self.callback()
+            except Exception:
+                return []
+            # Callbacks return a number, or {label value(s): number} for labelled metrics
+            if not isinstance(result, dict):
+                return [f"{self.name} {_format_value(result)}"]
+            items = sorted(((k if isinstance(k, tuple) else (k,)), v) for k, v in result.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Labelled set of LatencyHistograms rendered as Prometheus histograms."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._children = {}
+
+    def labels(self, **labels) -> LatencyHistogram:
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = LatencyHistogram(self.buckets)
+            return self._children[key]
+
+    def observe(self, seconds: float, **labels):
+        self.labels(**labels).observe(seconds)
+
+    def render(self) -> list:
+        with self._lock:
+            children = sorted(self._children.items())
+        lines = []
+        for key, hist in children:
+            snap = hist.snapshot()
+            for bound, count in snap["buckets"]:
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {snap['sum']!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {snap['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # modules may be re-imported (e.g. by Streamlit reruns)
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Request-level metrics, recorded by the middleware in main.py and by routes.py
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route, method and status.",
+                                 ("route", "method", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                  ("route", "method"))
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being served, by route.", ("route",))
+QUERY_LATENCY = registry.histogram("query_duration_seconds", "Time to answer a /query/ question, by query type.",
+                                   ("type",))
@@ -0,0 +1,261 @@
+import re
+import pandas as pd
+from .numeric_parsing import derived_columns
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+CONTRACTION_RE = re.compile(r"n['\u2019]t\b")
+
+# Words that carry no filtering meaning in count questions
+STOPWORDS = {
+    "how", "many", "much", "count", "counts", "number", "of", "total", "vendors", "vendor", "suppliers",
+    "supplier", "companies", "company", "third", "parties", "party", "records", "record", "rows", "row",
+    "are", "is", "was", "were", "be", "been", "the", "a", "an", "have", "has", "had", "having", "with",
+    "in", "for", "do", "does", "did", "that", "which", "who", "whose", "what", "there", "their", "they",
+    "and", "or", "by", "from", "at", "on", "to", "show", "me", "list", "find", "give", "get", "all",
+    "any", "currently", "our", "its", "it", "set", "up", "place", "where", "whom", "s", "rated",
+    "classified", "as", "value", "equal", "equals", "use",
+}
+NEGATIONS = {"no", "not", "without", "missing", "lack", "lacks", "lacking", "none", "don", "doesn", "didn",
+             "isn", "aren", "t", "never", "absent"}
+# A negation never reaches across these to the next condition
+CONJUNCTIONS = {"and", "or", "but"}
+# Column-name words too generic to identify a column on their own
+GENERIC_COLUMN_WORDS = {"plan", "policy", "conducted", "strategy", "provided", "available", "mechanisms",
+                        "frequency", "last", "years", "months", "level", "data", "security", "risk", "name",
+                        "uses", "use"}
+COMPARATORS = [
+    (r"more than|greater than|over|above|exceeding", ">"),
+    (r"at least|no less than|minimum of", ">="),
+    (r"fewer than|less than|under|below", "<"),
+    (r"at most|no more than|maximum of|up to", "<="),
+    (r"exactly|equal to", "=="),
+]
+COMPARATOR_RE = re.compile(
+    r"\b(" + "|".join(p for p, _ in COMPARATORS) + r")\s+(\d[\d,]*(?:\.\d+)?)\b"
+)
+# Nearby tokens examined for negation around a yes/no column mention, stopping early at
+# a conjunction or another mention
+NEGATION_WINDOW = 3
+
+
+def _stem(token: str) -> str:
+    """Fold plurals/third person ("vendors", "uses") so they match singular names."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token[0].isdigit():
+        return token[:-1]
+    return token
+
+
+def _tokenize(text: str) -> list:
+    return [_stem(t) for t in TOKEN_RE.findall(str(text).lower())]
+
+
+# Compare against the same stemmed forms the tokenizer produces
+STOPWORDS = {_stem(w) for w in STOPWORDS}
+NEGATIONS = {_stem(w) for w in NEGATIONS}
+GENERIC_COLUMN_WORDS = {_stem(w) for w in GENERIC_COLUMN_WORDS}
+
+
+def _quote(value) -> str:
+    if isinstance(value, bool):
+        return str(value)
+    return repr(str(value))
+
+
+class NLFilterParser:
+    """
+    Resolves common count questions to a `df.query()` string without an LLM.
+
+    Column mentions are matched against column names (any run of two or more name
+    words, a distinctive single word, or initials such as "bcp"), and value mentions
+    against the distinct values of low-cardinality columns. Yes/No columns take their
+    polarity from nearby negations ("no", "without", "missing"), numeric columns from
+    comparisons ("more than 500"). `parse` returns None unless every meaningful word
+    in the question, negations included, is accounted for, so anything unusual
+    ("not in Retail") still goes to the LLM.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_categories: int = 50):
+        # Parsed numeric copies ("RTO (seconds)") would steal mentions of their source column
+        derived = derived_columns(df)
+        self.columns = [col for col in df.columns if col not in derived]
+        self._phrases = {}          # token tuple -> list of ("column", col) / ("value", col, value)
+        self._yes_no = {}           # column -> (yes literal, no literal)
+        self._numeric = set()
+        self._column_words = {col: set(_tokenize(col)) for col in self.columns}
+        self._max_phrase_len = 1
+
+        word_owners = {}
+        for col, words in self._column_words.items():
+            for word in words:
+                word_owners.setdefault(word, set()).add(col)
+
+        for col in self.columns:
+            series = df[col]
+            words = _tokenize(col)
+            for size in range(2, len(words) + 1):
+                for start in range(len(words) - size + 1):
+                    phrase = tuple(words[start:start + size])
+                    # "number of", "last 2 years" etc. don't identify a column
+                    if any(w not in STOPWORDS and w not in GENERIC_COLUMN_WORDS and not w.isdigit() for w in phrase):
+                        self._add_phrase(phrase, ("column", col))
+            for word in words:
+                if len(word) >= 3 and word not in GENERIC_COLUMN_WORDS and word_owners[word] == {col}:
+                    self._add_phrase((word,), ("column", col))
+            if len(words) >= 3:
+                self._add_phrase(("".join(w[0] for w in words),), ("column", col))
+
+            if pd.api.types.is_bool_dtype(series):
+                self._yes_no[col] = (True, False)
+                continue
+            if pd.api.types.is_numeric_dtype(series):
+                self._numeric.add(col)
+                continue
+            uniques = series.dropna().unique()
+            if len(uniques) > max_categories:
+                continue
+            lowered = {str(v).strip().lower(): v for v in uniques}
+            if lowered and set(lowered) <= {"yes", "no"}:
+                self._yes_no[col] = (lowered.get("yes", "Yes"), lowered.get("no", "No"))
+                continue
+            for value in uniques:
+                tokens = tuple(_tokenize(value))
+                if tokens:
+                    self._add_phrase(tokens, ("value", col, value))
+
+    def _add_phrase(self, tokens: tuple, target: tuple):
+        targets = self._phrases.setdefault(tokens, [])
+        if target not in targets:
+            targets.append(target)
+        self._max_phrase_len = max(self._max_phrase_len, len(tokens))
+
+    def _find_spans(self, tokens: list) -> list:
+        """Greedy longest-match scan; returns (start, end, targets) spans."""
+        spans = []
+        i = 0
+        while i < len(tokens):
+            for size in range(min(self._max_phrase_len, len(tokens) - i), 0, -1):
+                targets = self._phrases.get(tuple(tokens[i:i + size]))
+                if targets:
+                    spans.append((i, i + size, targets))
+                    i += size
+                    break
+            else:
+                i += 1
+        return spans
+
+    @staticmethod
+    def _negations(tokens: list, start: int, end: int, stops: set) -> list:
+        """Positions of negations within NEGATION_WINDOW tokens of the span [start, end)."""
+        found = []
+        for edge, step in ((start - 1, -1), (end, 1)):
+            i = edge
+            while 0 <= i < len(tokens) and abs(i - edge) < NEGATION_WINDOW:
+                if i in stops or tokens[i] in CONJUNCTIONS:
+                    break
+                if tokens[i] in NEGATIONS:
+                    found.append(i)
+                i += step
+        return found
+
+    def parse(self, query: str):
+        """Return a df.query() string, or None when the question isn't confidently understood."""
+        text = CONTRACTION_RE.sub(" not", query.lower())  # "don't" -> "do not"
+        tokens = _tokenize(text)
+        offsets = [match.start() for match in TOKEN_RE.finditer(text)]
+        comparisons = []
+        compared = set()  # token positions inside "more than 500" style comparisons
+        for match in COMPARATOR_RE.finditer(text):
+            op = next(sym for pattern, sym in COMPARATORS if re.fullmatch(pattern, match.group(1)))
+            number = match.group(2).replace(",", "")
+            comparisons.append((op, float(number) if "." in number else int(number)))
+            compared.update(i for i, offset in enumerate(offsets) if match.start() <= offset < match.end())
+        # Comparator words also introduce values like "< $1M"; "no" of "no more than" is not one of them
+        comparator_words = {w for pattern, _ in COMPARATORS for w in re.findall(r"[a-z]+", pattern)} - NEGATIONS
+
+        spans = self._find_spans(tokens)
+        # Values made only of filler words ("Not conducted", "None") count only next to their column
+        mentioned = {t[1] for _, _, ts in spans for t in ts if t[0] == "column"}
+        weak_words = STOPWORDS | NEGATIONS | GENERIC_COLUMN_WORDS
+        spans = [
+            (start, end, [t for t in targets if t[0] == "column" or t[1] in mentioned
+                          or any(w not in weak_words for w in tokens[start:end])])
+            for start, end, targets in spans
+        ]
+        spans = [span for span in spans if span[2]]
+        covered = set()
+        for start, end, _ in spans:
+            covered.update(range(start, end))
+
+        conditions = {}  # column -> list of values, or [(op, number)] for numeric
+        used_columns = set()
+        column_spans = []
+        for start, end, targets in spans:
+            values = [t for t in targets if t[0] == "value"]
+            columns = [t[1] for t in targets if t[0] == "column"]
+            if values:
+                column_mentions = {c for _, _, ts in spans for c in (t[1] for t in ts if t[0] == "column")}
+                if len(values) > 1:
+                    values = [v for v in values if v[1] in column_mentions]
+                if len(values) != 1:
+                    return None
+                _, col, value = values[0]
+                conditions.setdefault(col, [])
+                if value not in conditions[col]:
+                    conditions[col].append(value)
+                used_columns.add(col)
+            else:
+                column_spans.append((start, end, columns))
+
+        stops = covered | compared
+        claimed = set()  # negations already given to a yes/no column
+        previous = None  # (end, negated) of the last yes/no column mention
+        pending_comparisons = list(comparisons)
+        for start, end, columns in column_spans:
+            if len(columns) > 1:
+                if not any(c in used_columns for c in columns):
+                    return None
+                continue
+            col = columns[0]
+            if col in used_columns:
+                continue
+            if col in self._yes_no:
+                found = self._negations(tokens, start, end, stops)
+                if claimed.intersection(found):
+                    return None  # one negation between two columns; can't tell which it belongs to
+                claimed.update(found)
+                negated = bool(found)
+                if not found and previous is not None and previous[0] == start - 1 and tokens[start - 1] == "and":
+                    negated = previous[1]  # "missing BCP and cyber insurance"
+                previous = (end, negated)
+                yes, no = self._yes_no[col]
+                conditions[col] = [no if negated else yes]
+            elif col in self._numeric and pending_comparisons:
+                conditions[col] = [pending_comparisons.pop(0)]
+            else:
+                return None
+            used_columns.add(col)
+
+        if not conditions or pending_comparisons:
+            return None
+        if "or" in tokens and len(conditions) > 1:
+            return None
+
+        # Negations no yes/no column took ("not in Retail", "not more than 1000") are leftovers
+        known = STOPWORDS | comparator_words
+        for col in used_columns:
+            known |= self._column_words[col]
+        accounted = stops | claimed
+        leftovers = [t for i, t in enumerate(tokens) if i not in accounted and t not in known]
+        if leftovers:
+            return None
+
+        clauses = []
+        for col, values in conditions.items():
+            if col in self._numeric:
+                op, number = values[0]
+                clauses.append(f"`{col}` {op} {number}")
+            elif len(values) == 1:
+                clauses.append(f"`{col}` == {_quote(values[0])}")
+            else:
+                clauses.append(f"`{col}` in [{', '.join(_quote(v) for v in values)}]")
+        return " and ".join(clauses)
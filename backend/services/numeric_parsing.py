@@ -0,0 +1,157 @@
+"""
+Ingest-time parsing of numbers held as text. Durations ("4 hours", "30 minutes")
+gain a "<col> (seconds)" column and money ranges ("$10M - $50M", "< $1M",
+"> $100M") gain "<col> Min (USD)" / "<col> Max (USD)" bound columns, so charts
+and filters can aggregate and compare them as numbers.
+
+Each distinct value is parsed once with vectorized regex extraction and the
+results are expanded to rows through factorized codes. The added columns are
+listed in `df.attrs["derived_columns"]` (name -> {"source", "unit"}), which
+consumers use to tell them apart from the workbook's own columns.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Set to 0 to skip adding parsed numeric columns
+NUMERIC_PARSE = os.getenv("NUMERIC_PARSE", "1") == "1"
+
+DERIVED_COLUMNS_ATTR = "derived_columns"
+PRECHECK_VALUES = 16
+
+_NUMBER = r"(\d+(?:,\d{3})*(?:\.\d+)?)"
+_DURATION = re.compile(rf"^\s*{_NUMBER}\s*(seconds?|secs?|s|minutes?|mins?|m|hours?|hrs?|h|days?|d|weeks?|w)\s*$",
+                       re.IGNORECASE)
+_MONEY = rf"\$\s*{_NUMBER}\s*([KMBT]?)"
+_MONEY_RANGE = re.compile(rf"^\s*{_MONEY}\s*(?:-|–|to)\s*{_MONEY}\s*$", re.IGNORECASE)
+_MONEY_BELOW = re.compile(rf"^\s*(?:<=?|under|below|less than|up to)\s*{_MONEY}\s*$", re.IGNORECASE)
+_MONEY_ABOVE = re.compile(rf"^\s*(?:>=?|over|above|more than)\s*{_MONEY}\s*$|^\s*{_MONEY}\s*\+\s*$", re.IGNORECASE)
+
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+SCALE = {"": 1, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+
+def _numbers(text: pd.Series) -> pd.Series:
+    return pd.to_numeric(text.str.replace(",", "", regex=False), errors="coerce")
+
+
+def _amounts(parts: pd.DataFrame, number: int, scale: int) -> pd.Series:
+    return _numbers(parts[number]) * parts[scale].str.upper().map(SCALE).astype(float)
+
+
+def _parse_durations(values: pd.Series):
+    """Seconds per value, or None unless every value is a duration."""
+    parts = values.str.extract(_DURATION)
+    if parts[0].isna().any():
+        return None
+    unit = parts[1].str.lower().str[0].map(UNIT_SECONDS)
+    # "m"/"min" is minutes; a bare "m" never means months in these fields
+    return {"(seconds)": _numbers(parts[0]) * unit}
+
+
+def _parse_money_ranges(values: pd.Series):
+    """(lower, upper) USD bounds per value, or None unless every value is a money range."""
+    between = values.str.extract(_MONEY_RANGE)
+    below = values.str.extract(_MONEY_BELOW)
+    above = values.str.extract(_MONEY_ABOVE)
+    if not (between[0].notna() | below[0].notna() | above[0].notna() | above[2].notna()).all():
+        return None
+    lower = pd.Series(np.nan, index=values.index)
+    upper = pd.Series(np.nan, index=values.index)
+    matched = between[0].notna()
+    lower[matched] = _amounts(between[matched], 0, 1)
+    upper[matched] = _amounts(between[matched], 2, 3)
+    hit = below[0].notna() & ~matched
+    lower[hit] = 0.0
+    upper[hit] = _amounts(below[hit], 0, 1)
+    matched |= hit
+    # Either the "> $100M" or the "$100M+" alternative matched
+    above_number, above_scale = above[0].fillna(above[2]), above[1].fillna(above[3])
+    hit = above_number.notna() & ~matched
+    lower[hit] = _amounts(pd.DataFrame({0: above_number[hit], 1: above_scale[hit]}), 0, 1)
+    return {"Min (USD)": lower, "Max (USD)": upper}
+
+
+# (unit, patterns every value must match one of, parser)
+PARSERS = (
+    ("seconds", (_DURATION,), _parse_durations),
+    ("USD", (_MONEY_RANGE, _MONEY_BELOW, _MONEY_ABOVE), _parse_money_ranges),
+)
+
+
+def _parse_column(series: pd.Series) -> dict:
+    """{name suffix: float values per row} for a text column of durations or money ranges, else {}."""
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+            or isinstance(series.dtype, pd.CategoricalDtype)):
+        return {}
+    # Free-text columns fail on their first few values, before any pass over the column
+    sample = [v for v in series.iloc[:PRECHECK_VALUES].tolist() if isinstance(v, str)]
+    candidates = [(unit, parser) for unit, patterns, parser in PARSERS
+                  if sample and all(any(p.match(v) for p in patterns) for v in sample)]
+    if not candidates:
+        return {}
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = pd.Series(np.asarray(uniques, dtype=object))
+    if pd.api.types.infer_dtype(values, skipna=True) != "string":
+        return {}
+    for unit, parser in candidates:
+        parsed = parser(values)
+        if parsed is not None:
+            return {
+                suffix: (unit, np.where(codes >= 0, per_value.to_numpy(dtype=float)[codes], np.nan))
+                for suffix, per_value in parsed.items()
+            }
+    return {}
+
+
+def add_parsed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` plus numeric columns parsed from its duration and money-range text columns,
+    described in `attrs["derived_columns"]`. Returns `df` itself when nothing parses.
+    """
+    if not NUMERIC_PARSE:
+        return df
+    new_columns = {}
+    derived = dict(df.attrs.get(DERIVED_COLUMNS_ATTR, {}))
+    for col in df.columns:
+        if col in derived:
+            continue
+        for suffix, (unit, values) in _parse_column(df[col]).items():
+            name = f"{col} {suffix}"
+            if name not in df.columns:
+                new_columns[name] = values
+                derived[name] = {"source": col, "unit": unit}
+    if not new_columns:
+        return df
+    parsed = df.copy(deep=False)
+    for name, values in new_columns.items():
+        parsed[name] = values
+    parsed.attrs[DERIVED_COLUMNS_ATTR] = derived
+    return parsed
+
+
+def add_parsed_columns_like(df: pd.DataFrame, reference: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` (new rows for `reference`'s columns) plus the derived columns `reference` has,
+    parsed the same way. A source column with a value that doesn't parse gets NaN.
+    """
+    derived = derived_columns(reference)
+    if not derived:
+        return df
+    parsed = df.copy(deep=False)
+    by_source = {}
+    for name, info in derived.items():
+        by_source.setdefault(info["source"], []).append(name)
+    for source, names in by_source.items():
+        values = {f"{source} {suffix}": column for suffix, (_, column) in _parse_column(df[source]).items()}
+        for name in names:
+            parsed[name] = values.get(name, np.full(len(df), np.nan))
+    parsed.attrs[DERIVED_COLUMNS_ATTR] = dict(derived)
+    return parsed
+
+
+def derived_columns(df: pd.DataFrame) -> dict:
+    """Columns added by add_parsed_columns(), as name -> {"source", "unit"}."""
+    return df.attrs.get(DERIVED_COLUMNS_ATTR, {})
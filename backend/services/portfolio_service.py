@@ -0,0 +1,297 @@
+"""
+Portfolio datasets: several uploaded workbooks (e.g. one per business unit) queried
+as one. A portfolio only references its workbooks. Each stays an ordinary cached
+dataset with its own frame, bitmap index, aggregate cube and filter results, so
+adding a workbook to a portfolio loads that one and reuses the rest.
+
+Filters and aggregations run per workbook in parallel and are merged: counts add
+up, group aggregates combine mergeable parts (sizes, sums, counts, min/max) and
+cross-tabs add cell by cell. Rows are only concatenated when an answer needs
+every row of a column at once (medians, map-reduce answers), and then only the
+columns it uses.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from .excel_service import (
+    load_dataframe, dataset_fingerprint, filter_count, filtered_frame, count_answer, chart_payload,
+    get_dataset_artifact, parse_count_filter
+)
+from .tracing import span
+
+# Registry of portfolio name -> uploaded workbook filenames
+PORTFOLIO_FILE = os.getenv("PORTFOLIO_FILE", os.path.join("uploads", "portfolios.json"))
+# Workbooks processed concurrently per portfolio query
+PORTFOLIO_WORKERS = int(os.getenv("PORTFOLIO_WORKERS", "4"))
+# Column naming each row's workbook wherever portfolio rows are shown together
+SOURCE_COLUMN = "Source Workbook"
+
+NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+_registry_lock = threading.Lock()
+
+
+class PortfolioError(ValueError):
+    pass
+
+
+# ---------- Registry ----------
+
+def _read_registry() -> dict:
+    if not os.path.exists(PORTFOLIO_FILE):
+        return {}
+    with open(PORTFOLIO_FILE) as f:
+        return json.load(f)
+
+
+def _write_registry(registry: dict):
+    os.makedirs(os.path.dirname(PORTFOLIO_FILE) or ".", exist_ok=True)
+    tmp_path = f"{PORTFOLIO_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp_path, PORTFOLIO_FILE)
+
+
+def list_portfolios() -> dict:
+    with _registry_lock:
+        return _read_registry()
+
+
+def get_portfolio_filenames(name: str):
+    """Workbook filenames of portfolio `name`, or None if there is no such portfolio."""
+    return list_portfolios().get(name)
+
+
+def save_portfolio(name: str, filenames: list):
+    if not NAME_RE.match(name):
+        raise PortfolioError("Portfolio names may only use letters, digits, '.', '_' and '-'")
+    if not filenames:
+        raise PortfolioError("A portfolio needs at least one workbook")
+    if len(set(filenames)) != len(filenames):
+        raise PortfolioError("A workbook can only appear once in a portfolio")
+    with _registry_lock:
+        registry = _read_registry()
+        registry[name] = list(filenames)
+        _write_registry(registry)
+
+
+def delete_portfolio(name: str) -> bool:
+    with _registry_lock:
+        registry = _read_registry()
+        if registry.pop(name, None) is None:
+            return False
+        _write_registry(registry)
+        return True
+
+
+# ---------- Merging ----------
+
+def _merge_partials(parts: list, x_col, y_col, aggregation: str) -> pd.DataFrame:
+    """One [x_col, "count" | y_col] table from per-workbook AggregateCube.partials() tables."""
+    grouped = pd.concat(parts, ignore_index=True).groupby(x_col, observed=True, sort=True)
+    if aggregation == "count":
+        return grouped["size"].sum().reset_index(name="count")
+    if aggregation == "mean":
+        values = grouped["sum"].sum() / grouped["count"].sum()
+    elif aggregation == "sum":
+        values = grouped["sum"].sum()
+    elif aggregation == "min":
+        values = grouped["min"].min()
+    elif aggregation == "max":
+        values = grouped["max"].max()
+    else:
+        raise ValueError(f"Aggregation '{aggregation}' can't be merged across workbooks")
+    return values.reset_index(name=y_col)
+
+
+def _merge_crosstabs(tables: list) -> pd.DataFrame:
+    # fill_value only covers cells one side has; cells missing from both stay NaN
+    merged = reduce(lambda a, b: a.add(b, fill_value=0), tables).fillna(0)
+    merged = merged.loc[merged.any(axis=1), merged.any(axis=0)]
+    return merged.astype("int64")
+
+
+# Aggregations answered by merging per-workbook parts; others concatenate the columns
+MERGEABLE_AGGREGATIONS = {"count", "sum", "mean", "min", "max"}
+
+
+class Portfolio:
+    """
+    Workbooks at `file_paths` queried as one dataset. Every method fans out to the
+    workbooks' cached datasets and artifacts and merges the results.
+    """
+
+    def __init__(self, name: str, file_paths: list, max_workers: int = PORTFOLIO_WORKERS):
+        self.name = name
+        self.file_paths = list(file_paths)
+        self.max_workers = max_workers
+
+    def _map(self, fn) -> list:
+        """`fn(file_path)` for every workbook, concurrently, in portfolio order."""
+        if len(self.file_paths) == 1:
+            return [fn(self.file_paths[0])]
+        # Copied here, not in the workers, so their spans land in this request's trace
+        contexts = [contextvars.copy_context() for _ in self.file_paths]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(self.file_paths)))) as pool:
+            return list(pool.map(lambda context, file_path: context.run(fn, file_path), contexts, self.file_paths))
+
+    def frames(self) -> list:
+        return self._map(load_dataframe)
+
+    @property
+    def columns(self) -> list:
+        """Columns every workbook has, in the first workbook's order."""
+        frames = self.frames()
+        shared = set(frames[0].columns).intersection(*(df.columns for df in frames[1:]))
+        return [col for col in frames[0].columns if col in shared]
+
+    def check_schema(self):
+        """Raise PortfolioError unless every workbook has the same columns, since filters run on each."""
+        frames = self.frames()
+        expected = set(frames[0].columns)
+        for file_path, df in zip(self.file_paths[1:], frames[1:]):
+            missing, extra = expected - set(df.columns), set(df.columns) - expected
+            if missing or extra:
+                details = [f"{label} {', '.join(sorted(map(str, cols)))}"
+                           for label, cols in (("lacks", missing), ("adds", extra)) if cols]
+                raise PortfolioError(f"{os.path.basename(file_path)} doesn't match the columns of "
+                                     f"{os.path.basename(self.file_paths[0])}: it {' and '.join(details)}")
+
+    @property
+    def n_rows(self) -> int:
+        return sum(len(df) for df in self.frames())
+
+    @property
+    def fingerprint(self) -> str:
+        """Changes whenever any workbook (or the portfolio's membership) changes."""
+        parts = ",".join(self._map(dataset_fingerprint))
+        return hashlib.sha1(f"{self.name}:{parts}".encode()).hexdigest()[:16]
+
+    def summary(self) -> dict:
+        from .excel_service import load_excel_and_get_summary
+        summaries = self._map(load_excel_and_get_summary)
+        return {
+            "workbooks": [
+                {"filename": os.path.basename(path), "rows_count": summary["rows_count"]}
+                for path, summary in zip(self.file_paths, summaries)
+            ],
+            "rows_count": sum(summary["rows_count"] for summary in summaries),
+            "columns": self.columns,
+        }
+
+    def concat(self, columns: list = None, row_filter=None) -> pd.DataFrame:
+        """
+        The workbooks' rows (only `columns`, and only rows matching `row_filter` when
+        given) in one frame, with SOURCE_COLUMN naming each row's workbook.
+        """
+        def rows(file_path):
+            frame = filtered_frame(file_path, row_filter)
+            frame = load_dataframe(file_path) if frame is None else frame
+            frame = frame.reindex(columns=columns) if columns is not None else frame
+            return frame.assign(**{SOURCE_COLUMN: os.path.basename(file_path)})
+        return pd.concat(self._map(rows), ignore_index=True)
+
+    # ---------- Counts ----------
+
+    def count(self, filter_string: str) -> int:
+        return sum(self._map(lambda file_path: filter_count(file_path, filter_string)))
+
+    def count_answer(self, filter_string: str) -> str:
+        return count_answer(filter_string, self.count, self.n_rows)
+
+    def parse_count_filter(self, query: str):
+        """Local fast path for count phrasings, using the first workbook's values."""
+        return parse_count_filter(self.file_paths[0], query)
+
+    # ---------- Charts ----------
+
+    def aggregate(self, x_col, y_col, aggregation: str, row_filter=None) -> pd.DataFrame:
+        """Same result as AggregateCube.aggregate() on all workbooks' rows together."""
+        from .aggregate_cube import AggregateCube, group_aggregate
+        if aggregation not in MERGEABLE_AGGREGATIONS:
+            return group_aggregate(self.concat([x_col, y_col], row_filter), x_col, y_col, aggregation)
+
+        measure = None if aggregation == "count" else y_col
+
+        def partials(file_path):
+            cube = get_dataset_artifact(file_path, "aggregate_cube", AggregateCube)
+            return cube.partials(x_col, measure, frame=filtered_frame(file_path, row_filter), frame_key=row_filter)
+        return _merge_partials(self._map(partials), x_col, y_col, aggregation)
+
+    def crosstab(self, row_col, col_col, row_filter=None) -> pd.DataFrame:
+        """Same result as AggregateCube.crosstab() on all workbooks' rows together."""
+        from .aggregate_cube import AggregateCube
+
+        def table(file_path):
+            cube = get_dataset_artifact(file_path, "aggregate_cube", AggregateCube)
+            return cube.crosstab(row_col, col_col, frame=filtered_frame(file_path, row_filter), frame_key=row_filter)
+        return _merge_crosstabs(self._map(table))
+
+    def graph_data(self, configs) -> dict:
+        return chart_payload(configs, self.columns, self.aggregate, self.crosstab)
+
+    # ---------- Generative context ----------
+
+    def build_context(self, query: str, token_budget: int = 2000, k: int = 200) -> tuple:
+        """
+        Rows most relevant to `query` across workbooks, fitted to `token_budget`. BM25
+        scores aren't comparable between workbooks, so each workbook's ranking is
+        interleaved rank by rank. Returns (text, number of rows).
+        """
+        from .retrieval_service import RowRetrievalIndex, fit_rows
+
+        def ranked(file_path):
+            index = get_dataset_artifact(file_path, "retrieval_index", RowRetrievalIndex)
+            positions = index.search(query, k=k)
+            return index.df, positions if len(positions) else np.arange(min(k, len(index.df)))
+        rankings = self._map(ranked)
+        rows = pd.concat([
+            df.iloc[positions].assign(**{SOURCE_COLUMN: os.path.basename(file_path)})
+            for file_path, (df, positions) in zip(self.file_paths, rankings)
+        ], ignore_index=True)
+        rank = np.concatenate([np.arange(len(positions)) for _, positions in rankings])
+        workbook = np.concatenate([np.full(len(positions), i) for i, (_, positions) in enumerate(rankings)])
+        # Best row of each workbook, then the second best of each, ...
+        return fit_rows(rows.iloc[np.lexsort((workbook, rank))[:k]], token_budget)
+
+    def dataset_context(self, token_budget: int = 800) -> str:
+        """Each workbook's digest under a heading, sharing `token_budget` between them."""
+        from .context_service import get_dataset_context
+        budget = max(token_budget // len(self.file_paths), 100)
+
+        def digest(file_path):
+            df = load_dataframe(file_path)
+            text = get_dataset_context(dataset_fingerprint(file_path), df, token_budget=budget)
+            return f"Workbook {os.path.basename(file_path)} ({len(df)} rows):\n{text}"
+        return "\n\n".join(self._map(digest))
+
+
+def run_portfolio_count_query(portfolio: Portfolio, query: str) -> str:
+    from .llm_service import generate_pandas_filter
+    with span("nl_filter"):
+        filter_string = portfolio.parse_count_filter(query)
+    if filter_string is None:
+        with span("llm_filter"):
+            filter_string = generate_pandas_filter(query, portfolio.columns)
+    with span("portfolio_count"):
+        return portfolio.count_answer(filter_string)
+
+
+def run_portfolio_graph_query(portfolio: Portfolio, query: str) -> dict:
+    from .llm_service import generate_graph_config
+    try:
+        with span("llm_graph_config"):
+            configs = generate_graph_config(query, portfolio.columns)
+    except Exception as e:
+        return {"error": f"Error generating graph: {str(e)}"}
+    with span("aggregate"):
+        return portfolio.graph_data(configs)
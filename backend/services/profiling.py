@@ -0,0 +1,222 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Where profile artifacts are written; only the newest PROFILE_MAX_FILES are kept
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+# Fraction of requests to profiled endpoints that are profiled without being asked (0 = off)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# "cprofile" (deterministic, .pstats) or "sampling" (stack samples, flamegraph-ready .collapsed)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")
+# Honour the X-Profile request header ("1", or a mode name) to profile a single request
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "0") == "1"
+# Shared secret for PUT /profiling/config and, when set, for X-Profile (sent as X-Profile-Token).
+# Unset, profiling can only be configured through the environment.
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+PROFILE_HEADER = "x-profile"
+PROFILE_TOKEN_HEADER = "x-profile-token"
+PROFILE_MODES = {"cprofile": ".pstats", "sampling": ".collapsed"}
+_OFF_VALUES = {"", "0", "false", "off", "no"}
+_ARTIFACT_NAME = re.compile(r"^[\w.-]+\.(pstats|collapsed)$")
+
+_profile_request = ContextVar("profile_request", default=None)
+
+
+class Profiler:
+    """Decides which requests are profiled and manages the bounded artifact directory."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, mode: str = PROFILE_MODE,
+                 allow_header: bool = PROFILE_ALLOW_HEADER, admin_token: str = PROFILE_ADMIN_TOKEN):
+        self.directory = directory
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self.mode = mode if mode in PROFILE_MODES else "cprofile"
+        self.allow_header = allow_header
+        self.admin_token = admin_token
+        self._lock = threading.Lock()
+
+    def authorized(self, token: str = None) -> bool:
+        """Whether `token` matches the admin token; always False when none is configured."""
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def configure(self, sample_rate: float = None, mode: str = None, allow_header: bool = None):
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {sorted(PROFILE_MODES)}")
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if mode is not None:
+                self.mode = mode
+            if allow_header is not None:
+                self.allow_header = allow_header
+
+    def settings(self) -> dict:
+        return {"sample_rate": self.sample_rate, "mode": self.mode, "allow_header": self.allow_header,
+                "directory": self.directory, "max_files": self.max_files}
+
+    def choose_mode(self, header_value: str = None, token: str = None):
+        """
+        Profiling mode for a request, or None (the common case) to leave it alone. The
+        X-Profile header counts only when allowed, and with the admin token if one is set.
+        """
+        if header_value is not None and self.allow_header and (not self.admin_token or self.authorized(token)):
+            value = header_value.strip().lower()
+            if value not in _OFF_VALUES:
+                return value if value in PROFILE_MODES else self.mode
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.mode
+        return None
+
+    def save(self, label: str, extension: str, write) -> str:
+        """Write one artifact via `write(path)` and prune the oldest beyond `max_files`."""
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^\w-]+", "_", label).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:8]}{extension}"
+        write(os.path.join(self.directory, name))
+        with self._lock:
+            for stale in self.list()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, stale["name"]))
+                except OSError:
+                    pass
+        return name
+
+    def list(self) -> list:
+        """Stored artifacts, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not _ARTIFACT_NAME.match(name):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            profiles.append({"name": name, "bytes": stat.st_size, "created_at": stat.st_mtime})
+        return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+    def path(self, name: str):
+        """Filesystem path of a stored artifact, or None; never resolves outside `directory`."""
+        if not _ARTIFACT_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+profiler = Profiler()
+
+
+class _StackSampler:
+    """Samples one thread's Python stack on a timer and counts identical stacks."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profile-sampler")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        # Brendan Gregg's collapsed format: "frame;frame;frame count", one stack per line
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_request(header_value: str, label: str, token: str = None):
+    """
+    Mark the current request for profiling when the header or sampling asks for it.
+    Yields the session dict (its "artifact" is set once saved) or None.
+    """
+    mode = profiler.choose_mode(header_value, token)
+    if mode is None:
+        yield None
+        return
+    session = {"mode": mode, "label": label, "started": False, "artifact": None}
+    token = _profile_request.set(session)
+    try:
+        yield session
+    finally:
+        _profile_request.reset(token)
+
+
+@contextmanager
+def _profiling(session: dict):
+    session["started"] = True  # nested profiled calls run unprofiled
+    extension = PROFILE_MODES[session["mode"]]
+    if session["mode"] == "sampling":
+        sampler = _StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            session["artifact"] = profiler.save(session["label"], extension, sampler.write)
+    else:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            session["artifact"] = profiler.save(session["label"], extension, profile.dump_stats)
+
+
+def profiled(fn):
+    """
+    Profile calls to endpoint `fn` made from requests marked by profile_request(). Runs in
+    the thread doing the work (FastAPI's threadpool for plain `def` endpoints), which is
+    what cProfile needs. Unmarked requests pay a single context-variable lookup.
+    """
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            session = _profile_request.get()
+            if session is None or session["started"]:
+                return await fn(*args, **kwargs)
+            with _profiling(session):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _profile_request.get()
+        if session is None or session["started"]:
+            return fn(*args, **kwargs)
+        with _profiling(session):
+            return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be scheduled within the allowed wait."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            f"Gemini API rate limit exceeded. Please try again in about {max(1, round(retry_after))}s."
+        )
+
+
+class RequestCancelled(Exception):
+    """Raised when a caller abandons a request (e.g. the losing side of a hedged call)."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`. Not thread-safe on its own."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (amount may exceed capacity for estimates)."""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float, now: float):
+        """Take `amount` tokens; a negative amount (a refund) never fills past `capacity`."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class PriorityScheduler:
+    """
+    Shared admission gate enforcing requests-per-minute and tokens-per-minute budgets.
+    Waiting callers are served strictly by (priority, arrival order); callers whose
+    estimated wait exceeds `max_wait`, or who arrive when the queue is full, are
+    rejected immediately with RateLimitExceeded carrying the estimated wait.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_queue: int = 32, max_wait: float = 60.0):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq, tokens)
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+    def _estimate(self, tokens: int, priority: int, now: float) -> float:
+        ahead = [e for e in self._queue if e[0] <= priority]
+        needed_requests = len(ahead) + 1
+        needed_tokens = sum(e[2] for e in ahead) + min(tokens, self._tokens.capacity)
+        return max(
+            self._blocked_until - now,
+            self._requests.time_until(needed_requests, now),
+            self._tokens.time_until(needed_tokens, now),
+            0.0,
+        )
+
+    def estimate_wait(self, tokens: int, priority: int = PRIORITY_INTERACTIVE) -> float:
+        with self._cond:
+            return self._estimate(tokens, priority, time.monotonic())
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE, cancel_event=None):
+        """Block until a request of `tokens` estimated tokens may be sent."""
+        tokens = min(tokens, self._tokens.capacity)
+        with self._cond:
+            wait = self._estimate(tokens, priority, time.monotonic())
+            if len(self._queue) >= self.max_queue or wait > self.max_wait:
+                raise RateLimitExceeded(wait)
+
+            entry = (priority, next(self._seq), tokens)
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RequestCancelled("Request cancelled while queued")
+                    delay = None
+                    if self._queue[0] is entry:
+                        now = time.monotonic()
+                        delay = max(
+                            self._blocked_until - now,
+                            self._requests.time_until(1, now),
+                            self._tokens.time_until(tokens, now),
+                        )
+                        if delay <= 0:
+                            heapq.heappop(self._queue)
+                            self._requests.consume(1, now)
+                            self._tokens.consume(tokens, now)
+                            self._cond.notify_all()
+                            return
+                    if cancel_event is not None:
+                        delay = 0.25 if delay is None else min(delay, 0.25)
+                    self._cond.wait(delay)
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token budget once the API reports real usage."""
+        with self._cond:
+            now = time.monotonic()
+            self._tokens.consume(actual_tokens - min(estimated_tokens, self._tokens.capacity), now)
+            # A refund may let the head of the queue go now
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float):
+        """Hold every queued request after the API answers 429, instead of sleeping per thread."""
+        with self._cond:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._requests.drain(now)
+            self._cond.notify_all()
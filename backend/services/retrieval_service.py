@@ -0,0 +1,185 @@
+import re
+import numpy as np
+import pandas as pd
+from .llm_service import estimate_tokens
+from .numeric_parsing import derived_columns
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Column-scoped ("column:value") matches count more than bare word matches
+FIELD_TOKEN_BOOST = 2.0
+# Bare words present in more than this share of rows ("yes", "no", ...) are not indexed
+MAX_WORD_DOC_FREQ = 0.5
+
+
+def _tokenize(text: str) -> list:
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _column_key(column: str) -> str:
+    return "_".join(_tokenize(column))
+
+
+def _column_aliases(column: str) -> set:
+    """Ways a question can refer to a column: its full name, or initials like 'bcp'."""
+    words = _tokenize(column)
+    aliases = {" ".join(words)}
+    if len(words) >= 3:
+        aliases.add("".join(w[0] for w in words))
+    return aliases
+
+
+def encode_rows_compact(df: pd.DataFrame) -> str:
+    """
+    Encode rows for a prompt: values shared by every row are stated once, the
+    remaining columns are written as a pipe-separated table without an index.
+    """
+    if df.empty:
+        return ""
+    # Parsed numeric columns repeat their source column's text; leave them out of prompts
+    derived = derived_columns(df)
+    common = []
+    varying = []
+    for col in df.columns:
+        if col in derived:
+            continue
+        values = df[col]
+        if len(df) > 1 and values.nunique(dropna=False) == 1:
+            common.append(f"{col}={values.iloc[0]}")
+        else:
+            varying.append(col)
+    lines = []
+    if common:
+        lines.append("All rows: " + "; ".join(common))
+    lines.append(" | ".join(varying))
+    for row in df[varying].itertuples(index=False):
+        lines.append(" | ".join("" if pd.isna(v) else str(v) for v in row))
+    return "\n".join(lines)
+
+
+def fit_rows(rows: pd.DataFrame, token_budget: int) -> tuple:
+    """Compact encoding of the leading `rows` that fits `token_budget`, as (text, number of rows)."""
+    # Grow the selection geometrically, then trim to the budget
+    n = min(len(rows), 8)
+    text = encode_rows_compact(rows.iloc[:n])
+    while n < len(rows) and estimate_tokens(text) < token_budget:
+        n = min(len(rows), n * 2)
+        text = encode_rows_compact(rows.iloc[:n])
+    while n > 1 and estimate_tokens(text) > token_budget:
+        n = max(1, int(n * token_budget / estimate_tokens(text)))
+        text = encode_rows_compact(rows.iloc[:n])
+    return text, n
+
+
+class RowRetrievalIndex:
+    """
+    BM25 index over the text of each row, built once per dataset.
+
+    Every cell contributes its words twice: as bare words ("healthcare") and as
+    column-scoped tokens ("primary_industry:healthcare"). Values are tokenized once
+    per distinct value and expanded to rows through factorized codes, so building
+    the index is a handful of vectorized passes per column.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n_rows = len(df)
+        self._columns = []      # (column name, row -> value code, rows grouped by code, group offsets)
+        self._postings = {}     # token -> list of (column idx, value code)
+        self._doc_freq = {}     # token -> approximate number of rows containing it
+        self._column_aliases = {col: _column_aliases(col) for col in df.columns}
+        doc_len = np.zeros(self.n_rows, dtype=np.float64)
+
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_float_dtype(series):
+                continue
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            order = np.argsort(codes, kind="stable")
+            offsets = np.concatenate(([0], np.cumsum(counts))) + int((codes < 0).sum())
+            self._columns.append((col, codes, order, offsets))
+
+            col_key = _column_key(col)
+            value_lengths = np.zeros(len(uniques), dtype=np.float64)
+            for code, value in enumerate(uniques):
+                words = set(_tokenize(value))
+                value_lengths[code] = len(words)
+                for word in words:
+                    for token in (word, f"{col_key}:{word}"):
+                        self._postings.setdefault(token, []).append((len(self._columns) - 1, code))
+                        self._doc_freq[token] = self._doc_freq.get(token, 0) + int(counts[code])
+            valid = codes >= 0
+            doc_len[valid] += value_lengths[codes[valid]]
+
+        for token in [t for t in self._postings if ":" not in t]:
+            if self._doc_freq[token] > MAX_WORD_DOC_FREQ * self.n_rows:
+                del self._postings[token]
+                del self._doc_freq[token]
+
+        self._doc_len = doc_len
+        self._avg_doc_len = float(doc_len.mean()) if self.n_rows else 0.0
+
+    def _token_rows(self, token: str) -> np.ndarray:
+        parts = []
+        for col_slot, code in self._postings.get(token, ()):
+            _, _, order, offsets = self._columns[col_slot]
+            parts.append(order[offsets[code]:offsets[code + 1]])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _query_tokens(self, query: str) -> dict:
+        """Weighted query tokens: bare words plus column-scoped words for columns the query names."""
+        words = _tokenize(query)
+        text = " ".join(words)
+        tokens = {w: 1.0 for w in words}
+        for col, aliases in self._column_aliases.items():
+            if any(re.search(rf"\b{re.escape(alias)}\b", text) for alias in aliases):
+                col_key = _column_key(col)
+                for word in words:
+                    tokens[f"{col_key}:{word}"] = FIELD_TOKEN_BOOST
+        return tokens
+
+    def search(self, query: str, k: int = 50, restrict_to=None) -> np.ndarray:
+        """Positions of the top-k rows by BM25 score (only rows with a positive score).
+
+        `restrict_to` optionally limits results to the given index labels, e.g. the
+        rows that survive the dashboard's sidebar filters.
+        """
+        if self.n_rows == 0:
+            return np.empty(0, dtype=np.int64)
+        scores = np.zeros(self.n_rows, dtype=np.float64)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len / max(self._avg_doc_len, 1e-9))
+        for token, weight in self._query_tokens(query).items():
+            if token not in self._postings:
+                continue
+            df_t = min(self._doc_freq[token], self.n_rows)
+            idf = np.log(1 + (self.n_rows - df_t + 0.5) / (df_t + 0.5))
+            tf = np.bincount(self._token_rows(token), minlength=self.n_rows)
+            hit = tf > 0
+            scores[hit] += weight * idf * tf[hit] * (BM25_K1 + 1) / (tf[hit] + norm[hit])
+
+        if restrict_to is not None:
+            allowed = np.zeros(self.n_rows, dtype=bool)
+            positions = self.df.index.get_indexer(restrict_to)
+            allowed[positions[positions >= 0]] = True
+            scores[~allowed] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def build_context(self, query: str, token_budget: int = 2000, k: int = 200, restrict_to=None) -> tuple:
+        """
+        Compactly encoded rows most relevant to `query`, fitted to `token_budget`.
+        Falls back to leading rows when nothing matches. Returns (text, number of rows).
+        """
+        positions = self.search(query, k=k, restrict_to=restrict_to)
+        if len(positions) == 0:
+            pool = self.df.index if restrict_to is None else restrict_to
+            positions = self.df.index.get_indexer(pool[:k])
+
+        return fit_rows(self.df.iloc[positions], token_budget)
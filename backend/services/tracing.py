@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Also write each request's stage breakdown as one JSON log line (logger "backend.trace")
+TRACE_LOG_JSON = os.getenv("TRACE_LOG_JSON", "0") == "1"
+
+logger = logging.getLogger("backend.trace")
+
+_current_trace = ContextVar("request_trace", default=None)
+
+
+class Trace:
+    """
+    Stage timings and cache outcomes collected while serving one request. Repeated
+    stages accumulate; stages may nest (e.g. "llm_ollama" inside "llm_filter").
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.stages = {}  # stage -> [seconds, calls], in first-seen order
+        self.cache = {}   # cache name -> {"hit": n, "miss": n}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def record_cache(self, cache: str, hit: bool):
+        with self._lock:
+            outcomes = self.cache.setdefault(cache, {"hit": 0, "miss": 0})
+            outcomes["hit" if hit else "miss"] += 1
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.start) * 1000, 2)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "timings_ms": {stage: round(seconds * 1000, 2) for stage, (seconds, _) in self.stages.items()},
+                "cache": {name: dict(outcomes) for name, outcomes in self.cache.items()},
+                "total_ms": self.elapsed_ms(),
+            }
+
+    def server_timing(self) -> str:
+        """Value for the `Server-Timing` response header."""
+        with self._lock:
+            parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, (seconds, _) in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def trace_request(name: str):
+    """Collect spans recorded anywhere in this request's context into a new Trace."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time the block as `stage` of the current request; a no-op outside a traced request."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record_cache(cache, hit)
+
+
+def log_trace(trace: Trace, **fields):
+    if TRACE_LOG_JSON:
+        logger.info(json.dumps({"trace": trace.name, **fields, **trace.to_dict()}))
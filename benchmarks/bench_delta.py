@@ -0,0 +1,202 @@
+"""
+Full versus incremental refresh after a delta workbook, at dataset scale.
+
+Usage:
+    python benchmarks/bench_delta.py [--rows 1000000] [--delta-rows 1000] [--insert-share 0.2]
+        [--repeat 3] [--no-classify] [--output results.json]
+
+A full refresh re-runs ingest over the merged rows (dtype compaction, numeric
+parsing, risk classification) and rebuilds the bitmap index, the aggregate-cube
+cells and the cached filter results. An incremental refresh upserts the delta
+(classifying only its rows) and patches those structures for the changed rows.
+Both start from frames already in memory: reading a 1M-row workbook costs the
+same either way, so it is left out. Results use bench_suite.py's JSON format,
+so benchmarks/compare.py can diff two runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import warnings
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from backend.services.aggregate_cube import AggregateCube  # noqa: E402
+from backend.services.bitmap_index import BitmapIndex  # noqa: E402
+from backend.services.dashboard_service import apply_risk_classification  # noqa: E402
+from backend.services.delta_service import upsert, migrate_filter_results  # noqa: E402
+from backend.services.dtype_optimizer import optimize_dtypes  # noqa: E402
+from backend.services.filter_cache import filter_result_cache  # noqa: E402
+from backend.services.filter_engine import FilterContext  # noqa: E402
+from backend.services.numeric_parsing import add_parsed_columns  # noqa: E402
+from bench_suite import RESULTS_DIR, _git_commit  # noqa: E402
+from risk_assessment_generator import generate_chunks  # noqa: E402
+
+DATASET_SEED = 7
+DELTA_SEED = 11
+
+# Whole-dataset charts warmed in the cube before the delta arrives
+CUBE_CELLS = [
+    ("Primary Industry", None, "count"),
+    ("Revenue Range", "Number of Employees", "mean"),
+    ("Primary Industry", "Years in Operation", "max"),
+    ("Risk Level", "Number of Employees", "sum"),
+]
+CUBE_CROSSTABS = [("Revenue Range", "Primary Industry"), ("Risk Level", "Cyber Insurance")]
+# Filters already answered (and cached) before the delta arrives
+FILTERS = [
+    "`Cyber Insurance` == 'No'",
+    "`Business Continuity Plan` == 'No' and `Cyber Insurance` == 'No'",
+    "`Risk Level` == 'High' or `Primary Industry` == 'FinTech'",
+    "`Number of Employees` > 1000",
+    "`Legal Name`.str.contains('Tech')",
+]
+
+
+def _summary(samples: list) -> dict:
+    return {
+        "repeat": len(samples),
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+def build_delta(raw: pd.DataFrame, n_rows: int, insert_share: float) -> pd.DataFrame:
+    """Delta workbook rows: changed copies of existing vendors plus brand-new ones."""
+    rng = np.random.default_rng(DELTA_SEED)
+    n_insert = int(n_rows * insert_share)
+    changed = raw.iloc[rng.choice(len(raw), n_rows - n_insert, replace=False)].copy()
+    flip = rng.random(len(changed)) < 0.5
+    changed["Cyber Insurance"] = np.where(flip, np.where(changed["Cyber Insurance"] == "Yes", "No", "Yes"),
+                                          changed["Cyber Insurance"])
+    changed["Number of Employees"] = changed["Number of Employees"] + rng.integers(1, 500, len(changed))
+    changed["Formal InfoSec Policy"] = np.where(rng.random(len(changed)) < 0.1, "No", changed["Formal InfoSec Policy"])
+    inserted = next(generate_chunks(n_insert, seed=DELTA_SEED, chunk_size=max(n_insert, 1))) if n_insert else None
+    return pd.concat([changed, inserted], ignore_index=True)
+
+
+def _stages(timings: dict, stage: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def _warm(df: pd.DataFrame, dataset_key: str) -> tuple:
+    """Bitmap index, aggregate cube and filter results as a dataset has them after some use."""
+    bitmaps = BitmapIndex(df)
+    cube = AggregateCube(df)
+    for x_col, y_col, aggregation in CUBE_CELLS:
+        cube.aggregate(x_col, y_col, aggregation)
+    for row_col, col_col in CUBE_CROSSTABS:
+        cube.crosstab(row_col, col_col)
+    context = FilterContext(df, bitmap_index=bitmaps, dataset_key=dataset_key)
+    counts = [context.count(expression) for expression in FILTERS]
+    return bitmaps, cube, counts
+
+
+def full_refresh(raw: pd.DataFrame, classify: bool, timings: dict) -> tuple:
+    df, _ = _stages(timings, "full:optimize_dtypes", lambda: optimize_dtypes(raw))
+    df = _stages(timings, "full:numeric_parse", lambda: add_parsed_columns(df))
+    if classify:
+        df = _stages(timings, "full:classify", lambda: apply_risk_classification(df))
+    filter_result_cache.clear()
+    _, _, counts = _stages(timings, "full:artifacts", lambda: _warm(df, "full"))
+    return df, counts
+
+
+def incremental_refresh(base: pd.DataFrame, bitmaps, cube, delta: pd.DataFrame, classify: bool,
+                        timings: dict) -> tuple:
+    enrich = apply_risk_classification if classify else None
+    df, changes = _stages(timings, "incremental:upsert", lambda: upsert(base, delta, enrich=enrich))
+    new_bitmaps = _stages(timings, "incremental:bitmap_index",
+                          lambda: bitmaps.updated(df, changes["changed"]))
+    _stages(timings, "incremental:aggregate_cube", lambda: cube.updated(df, changes["changed"]))
+    _stages(timings, "incremental:filter_cache",
+            lambda: migrate_filter_results("base", "incremental", df, changes))
+    context = FilterContext(df, bitmap_index=new_bitmaps, dataset_key="incremental")
+    return df, changes, [context.count(expression) for expression in FILTERS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="base dataset size")
+    parser.add_argument("--delta-rows", type=int, default=1000, help="rows in the delta workbook")
+    parser.add_argument("--insert-share", type=float, default=0.2, help="share of delta rows that are new vendors")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each refresh")
+    parser.add_argument("--no-classify", action="store_true", help="leave risk classification out of both paths")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/delta-<timestamp>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", UserWarning)
+    classify = not args.no_classify
+
+    print(f"Generating {args.rows:,} rows and a {args.delta_rows:,}-row delta...")
+    raw = pd.concat(generate_chunks(args.rows, seed=DATASET_SEED), ignore_index=True)
+    delta = build_delta(raw, args.delta_rows, args.insert_share)
+    merged_raw, _ = upsert(raw, delta)
+
+    base, _ = optimize_dtypes(raw)
+    base = add_parsed_columns(base)
+    if classify:
+        base = apply_risk_classification(base)
+
+    timings = {}
+    for run in range(args.repeat):
+        print(f"Run {run + 1}/{args.repeat}: full refresh...")
+        start = time.perf_counter()
+        full_df, full_counts = full_refresh(merged_raw, classify, timings)
+        timings.setdefault("full:total", []).append((time.perf_counter() - start) * 1000)
+
+        # Incremental starts from the base version's warmed structures and cached filters
+        filter_result_cache.clear()
+        bitmaps, cube, _ = _warm(base, "base")
+        print(f"Run {run + 1}/{args.repeat}: incremental refresh...")
+        start = time.perf_counter()
+        inc_df, changes, inc_counts = incremental_refresh(base, bitmaps, cube, delta, classify, timings)
+        timings.setdefault("incremental:total", []).append((time.perf_counter() - start) * 1000)
+
+    if len(inc_df) != len(full_df) or inc_counts != full_counts:
+        raise SystemExit(f"Incremental result differs from full refresh: {len(inc_df)} vs {len(full_df)} rows, "
+                         f"filter counts {inc_counts} vs {full_counts}")
+
+    results = {f"{stage}@{args.rows}": _summary(samples) for stage, samples in timings.items()}
+    print(f"\nDelta: {len(changes['updated']):,} updated, {len(changes['inserted']):,} inserted, "
+          f"{changes['unchanged']:,} unchanged; filter counts match the full refresh")
+    for key, stats in results.items():
+        print(f"  {key:40} median {stats['median_ms']:12.1f} ms  (min {stats['min_ms']:.1f})")
+    full_ms, inc_ms = results[f"full:total@{args.rows}"]["median_ms"], results[f"incremental:total@{args.rows}"]["median_ms"]
+    print(f"Incremental refresh is {full_ms / inc_ms:.1f}x faster than a full refresh")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "rows": [args.rows],
+            "delta_rows": args.delta_rows,
+            "insert_share": args.insert_share,
+            "classify": classify,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"delta-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} results to {output}")
+
+
+if __name__ == "__main__":
+    main()
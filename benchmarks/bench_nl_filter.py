@@ -0,0 +1,79 @@
+"""
+Fast-path coverage and latency of the local NL-to-filter parser.
+
+Usage:
+    python benchmarks/bench_nl_filter.py [workbook.xlsx] [--repeat N]
+
+Each corpus entry has the filter the fast path should produce, or null when the
+question should be left to the LLM. Filters are compared by the rows they select.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+from backend.services.excel_service import load_dataframe  # noqa: E402
+from backend.services.nl_filter import NLFilterParser  # noqa: E402
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), "nl_filter_corpus.json")
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workbook", nargs="?", default=os.path.join(ROOT_PATH, "sample_tprm_assessments_v2.xlsx"))
+    parser.add_argument("--repeat", type=int, default=200, help="timed parses per query")
+    args = parser.parse_args()
+
+    with open(CORPUS_FILE) as f:
+        corpus = json.load(f)
+    df = load_dataframe(args.workbook)
+
+    start = time.perf_counter()
+    nl_parser = NLFilterParser(df)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    latencies_us = []
+    resolved = correct = false_positives = 0
+    for item in corpus:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = nl_parser.parse(item["query"])
+        latencies_us.append((time.perf_counter() - start) / args.repeat * 1e6)
+
+        expected = item["expected"]
+        if result is None:
+            status = "LLM" if expected is None else "MISS"
+        else:
+            resolved += 1
+            if expected is None:
+                false_positives += 1
+                status = "FALSE+"
+            elif len(df.query(result)) == len(df.query(expected)) and df.query(result).index.equals(df.query(expected).index):
+                correct += 1
+                status = "OK"
+            else:
+                status = "WRONG"
+        print(f"{status:6} {item['query']!r:75} -> {result}")
+
+    answerable = sum(1 for item in corpus if item["expected"] is not None)
+    print()
+    print(f"Parser build time:      {build_ms:.1f} ms ({len(df)} rows)")
+    print(f"Fast-path coverage:     {resolved}/{len(corpus)} queries ({resolved / len(corpus):.0%})")
+    print(f"Correct resolutions:    {correct}/{answerable} answerable ({correct / max(answerable, 1):.0%})")
+    print(f"False positives:        {false_positives}")
+    print(f"Parse latency:          p50 {_percentile(latencies_us, 0.5):.0f} us, "
+          f"p95 {_percentile(latencies_us, 0.95):.0f} us, max {max(latencies_us):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Timings for the data paths behind the API and dashboard, at several dataset sizes.
+
+Usage:
+    python benchmarks/bench_suite.py [--rows 2000,20000] [--repeat 5] [--output results.json]
+    python benchmarks/compare.py baseline.json results.json
+
+Datasets come from risk_assessment_generator.py (seeded, cached under
+benchmarks/data/). Runs fully offline: the LLM is replaced by a stub that
+returns a fixed chart config, so graph timings measure only our code.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from backend.services import excel_service, llm_service  # noqa: E402
+from backend.services.aggregate_cube import AggregateCube  # noqa: E402
+from backend.services.bitmap_index import BitmapIndex  # noqa: E402
+from backend.services.dashboard_service import (  # noqa: E402
+    apply_risk_classification, apply_sidebar_filters, kpi_bitmaps, generate_custom_chart_figure
+)
+from risk_assessment_generator import write_dataset  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_ROWS = "2000,20000"
+DATASET_SEED = 7
+
+# Representative sidebar selections: (search, risk levels, frameworks)
+SIDEBAR_CASES = {
+    "all": ("", ("High", "Medium", "Low"), ()),
+    "high_medium": ("", ("High", "Medium"), ()),
+    "search_and_frameworks": ("tech", ("High", "Medium", "Low"), ("GDPR", "HIPAA")),
+}
+
+# Chart configs as the LLM would return them
+GRAPH_CASES = {
+    "count_bar": {"x_col": "Primary Industry", "y_col": None, "aggregation": "count", "graph_type": "bar"},
+    "mean_bar": {"x_col": "Revenue Range", "y_col": "Number of Employees", "aggregation": "mean", "graph_type": "bar"},
+    "filtered_pie": {"x_col": "Primary Industry", "y_col": None, "aggregation": "count", "graph_type": "pie",
+                     "filter": "`Cyber Insurance` == 'No'"},
+    "heatmap": {"x_col": "Primary Industry", "y_col": None, "aggregation": "count", "graph_type": "heatmap",
+                "group_col": "Revenue Range"},
+}
+CUSTOM_CHART_CASES = {
+    **GRAPH_CASES,
+    "risk_pie": {"x_col": "Risk Level", "y_col": None, "aggregation": "count", "graph_type": "pie"},
+    "date_trend": {"x_col": "Assessment Date", "y_col": None, "aggregation": "count", "graph_type": "line"},
+}
+
+
+def _stub_llm(config: dict):
+    """Offline stand-in for llm_service._call_llm that always answers with `config`."""
+    def call(prompt, **kwargs):
+        return json.dumps([config])
+    return call
+
+
+def _measure(fn, repeat: int, setup=None) -> dict:
+    """Run `fn` (`fn(setup())` when a per-run setup is given) and summarise its wall time."""
+    samples = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+def dataset_path(rows: int) -> str:
+    path = os.path.join(DATA_DIR, f"tprm_{rows}_seed{DATASET_SEED}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Generating {rows:,}-row dataset -> {path}")
+        write_dataset(path, rows, seed=DATASET_SEED)
+    return path
+
+
+def bench_scale(path: str, repeat: int, load_repeat: int) -> dict:
+    results = {}
+
+    def load():
+        excel_service.clear_dataset_cache()
+        excel_service.load_dataframe(path)
+    results["load_dataframe"] = _measure(load, load_repeat)
+    df = excel_service.load_dataframe(path)
+
+    results["apply_risk_classification"] = _measure(apply_risk_classification, repeat, setup=df.copy)
+    classified = apply_risk_classification(df.copy())
+
+    for name, (search, risks, frameworks) in SIDEBAR_CASES.items():
+        results[f"sidebar_filter[{name}]"] = _measure(
+            lambda: apply_sidebar_filters(classified, search, risks, frameworks), repeat
+        )
+
+    results["bitmap_index_build"] = _measure(lambda: BitmapIndex(classified), repeat)
+    bitmaps = BitmapIndex(classified)
+    filtered = apply_sidebar_filters(classified, *SIDEBAR_CASES["high_medium"])
+
+    def kpis():
+        breaches, missing = kpi_bitmaps(bitmaps, filtered.index)
+        return len(filtered), breaches.count(), {name: bitmap.count() for name, bitmap in missing.items()}
+    results["kpis"] = _measure(kpis, repeat)
+
+    original_call_llm = llm_service._call_llm
+    try:
+        for name, config in GRAPH_CASES.items():
+            llm_service._call_llm = _stub_llm(config)
+            # First query after a reload builds the per-dataset cube; later ones hit its cache
+            excel_service.clear_dataset_cache()
+            excel_service.load_dataframe(path)
+            results[f"run_graph_query[{name}]:cold"] = _measure(
+                lambda: excel_service.run_graph_query(path, f"chart {name}"), 1
+            )
+            results[f"run_graph_query[{name}]:warm"] = _measure(
+                lambda: excel_service.run_graph_query(path, f"chart {name}"), repeat
+            )
+    finally:
+        llm_service._call_llm = original_call_llm
+
+    cube = AggregateCube(classified)
+    for name, config in CUSTOM_CHART_CASES.items():
+        results[f"custom_chart[{name}]:pandas"] = _measure(
+            lambda: generate_custom_chart_figure(filtered, dict(config)), repeat
+        )
+        results[f"custom_chart[{name}]:cube"] = _measure(
+            lambda: generate_custom_chart_figure(filtered, dict(config), cube, "bench"), repeat
+        )
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_PATH, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default=DEFAULT_ROWS, help="comma-separated dataset sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--load-repeat", type=int, default=2, help="timed runs of the (slow) workbook parse")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/bench-<timestamp>.json)")
+    args = parser.parse_args()
+    # pandas warns on every free-text date parse in the custom charts; it's noise here
+    warnings.simplefilter("ignore", UserWarning)
+
+    scales = [int(r) for r in args.rows.split(",") if r.strip()]
+    results = {}
+    for rows in scales:
+        path = dataset_path(rows)
+        print(f"Benchmarking {rows:,} rows...")
+        for name, stats in bench_scale(path, args.repeat, args.load_repeat).items():
+            key = f"{name}@{rows}"
+            results[key] = stats
+            print(f"  {key:55} median {stats['median_ms']:10.3f} ms  (min {stats['min_ms']:.3f})")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "rows": scales,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} results to {output}")
+
+
+if __name__ == "__main__":
+    main()
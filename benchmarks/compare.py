@@ -0,0 +1,64 @@
+"""
+Compare two bench_suite.py result files and flag regressions.
+
+Usage:
+    python benchmarks/compare.py baseline.json current.json [--threshold 0.10] [--min-ms 0.05]
+
+A benchmark regresses when its median grows by more than --threshold (relative)
+and by more than --min-ms (absolute, to ignore noise on sub-millisecond timings).
+Exits with status 1 when any benchmark regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_ms: float) -> list:
+    """(name, baseline ms, current ms, relative change, status) for benchmarks present in both runs."""
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name]["median_ms"], current[name]["median_ms"]
+        change = (after - before) / before if before else 0.0
+        if change > threshold and after - before > min_ms:
+            status = "REGRESSION"
+        elif change < -threshold and before - after > min_ms:
+            status = "faster"
+        else:
+            status = ""
+        rows.append((name, before, after, change, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore absolute changes smaller than this")
+    args = parser.parse_args()
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    rows = compare(baseline, current, args.threshold, args.min_ms)
+    print(f"{'benchmark':60} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name, before, after, change, status in rows:
+        print(f"{name:60} {before:12.3f} {after:12.3f} {change:+8.1%}  {status}")
+
+    only_baseline = sorted(set(baseline) - set(current))
+    only_current = sorted(set(current) - set(baseline))
+    if only_baseline:
+        print(f"\nMissing from current run: {', '.join(only_baseline)}")
+    if only_current:
+        print(f"\nNew in current run: {', '.join(only_current)}")
+
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%} across {len(rows)} shared benchmarks")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Stand-in for Ollama and the Gemini API, for load tests that must not touch real models.
+
+Usage:
+    python benchmarks/fake_llm_server.py [--port 11435] [--ollama-latency lognormal:0.8,0.5]
+        [--gemini-latency uniform:0.3,1.2] [--gemini-429-rate 0.1] [--gemini-rpm 0]
+        [--ollama-error-rate 0] [--responses canned.json] [--no-ollama]
+
+Point the backend at it with
+    OLLAMA_BASE_URL=http://localhost:11435 GEMINI_BASE_URL=http://localhost:11435/v1beta/models
+
+Implements GET /api/tags, POST /api/generate (plain and streamed) and
+POST /v1beta/models/<model>:generateContent. Replies are canned but shaped like
+the real ones: the prompt is recognised as a count-filter, chart-config or
+free-text request (single or batched) and answered in the format the backend
+parses, using column names found in the prompt. GET /_stats returns request
+counts and injected latency per endpoint.
+
+Latency specs: fixed:S, uniform:LO,HI, normal:MEAN,STD, lognormal:MEDIAN,SIGMA, exp:MEAN (seconds).
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 11435
+MODEL_NAME = "mistral"
+
+# Replies used unless --responses overrides them; "{column}" is filled from the prompt
+DEFAULT_RESPONSES = {
+    "filter": ["`Cyber Insurance` == 'No'", "`Data Breach in Last 3 Years` == 'Yes'", "None"],
+    "graph_columns": ["Primary Industry", "Revenue Range", "Risk Level", "Headquarters Location"],
+    "generative": [
+        "Based on the data provided, most vendors are in the Medium risk band. "
+        "The largest gaps are missing cyber insurance and incomplete incident response plans.",
+        "Across the rows shown, roughly a third of vendors report a breach in the last three years; "
+        "FinTech and Healthcare vendors are over-represented among them.",
+    ],
+}
+
+_COLUMN_LIST = re.compile(r"dataframe columns: (\[.*?\])\n")
+_GRAPH_COLUMN = re.compile(r'^\s+- "([^"]+)"', re.MULTILINE)
+_BATCH_FILTER = re.compile(r"And these (\d+) separate user queries")
+_BATCH_GRAPH = re.compile(r"There are (\d+) separate user requests")
+
+
+def parse_latency(spec: str):
+    """A zero-argument sampler (seconds) from a spec like "lognormal:0.8,0.5"."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    samplers = {
+        "fixed": lambda v: lambda: v[0],
+        "uniform": lambda v: lambda: random.uniform(v[0], v[1]),
+        "normal": lambda v: lambda: max(0.0, random.gauss(v[0], v[1])),
+        "lognormal": lambda v: lambda: random.lognormvariate(math.log(v[0]), v[1]),
+        "exp": lambda v: lambda: random.expovariate(1 / v[0]),
+    }
+    arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+    if kind not in samplers or len(values) != arity[kind]:
+        raise argparse.ArgumentTypeError(f"bad latency spec '{spec}' (see --help)")
+    return samplers[kind](values)
+
+
+class CannedResponder:
+    """Builds a plausible model reply for each of the backend's prompt shapes."""
+
+    def __init__(self, responses: dict, seed: int = None):
+        self.responses = {**DEFAULT_RESPONSES, **responses}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _choice(self, options):
+        with self._lock:
+            return self._random.choice(options)
+
+    def _chart(self, columns: list) -> dict:
+        preferred = [c for c in self.responses["graph_columns"] if c in columns]
+        x_col = self._choice(preferred or columns or ["Primary Industry"])
+        return {"x_col": x_col, "y_col": None, "aggregation": "count", "graph_type": "bar",
+                "group_col": None, "filter": None, "title": f"Vendors by {x_col}",
+                "description": f"Distribution of vendors across {x_col}."}
+
+    def _filter(self, columns: list) -> str:
+        usable = [f for f in self.responses["filter"]
+                  if f == "None" or not columns or all(c in columns for c in re.findall(r"`([^`]+)`", f))]
+        return self._choice(usable or ["None"])
+
+    def reply(self, prompt: str) -> str:
+        if "df.query()" in prompt:
+            match = _COLUMN_LIST.search(prompt)
+            try:
+                columns = json.loads(match.group(1).replace("'", '"')) if match else []
+            except ValueError:
+                columns = []
+            batch = _BATCH_FILTER.search(prompt)
+            if batch:
+                return json.dumps({str(i + 1): (None if (f := self._filter(columns)) == "None" else f)
+                                   for i in range(int(batch.group(1)))})
+            return self._filter(columns)
+        if "data visualization assistant" in prompt:
+            columns = _GRAPH_COLUMN.findall(prompt)
+            batch = _BATCH_GRAPH.search(prompt)
+            if batch:
+                return json.dumps({str(i + 1): [self._chart(columns)] for i in range(int(batch.group(1)))})
+            return json.dumps([self._chart(columns)])
+        return self._choice(self.responses["generative"])
+
+
+class FakeLLM:
+    """Shared state: fault/latency settings, the Gemini RPM window and per-endpoint stats."""
+
+    def __init__(self, ollama_latency, gemini_latency, responder: CannedResponder, gemini_429_rate=0.0,
+                 gemini_rpm=0, retry_after=2.0, ollama_error_rate=0.0, ollama_enabled=True):
+        self.ollama_latency = ollama_latency
+        self.gemini_latency = gemini_latency
+        self.responder = responder
+        self.gemini_429_rate = gemini_429_rate
+        self.gemini_rpm = gemini_rpm
+        self.retry_after = retry_after
+        self.ollama_error_rate = ollama_error_rate
+        self.ollama_enabled = ollama_enabled
+        self._gemini_calls = deque()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, status: int, latency: float = 0.0):
+        with self._lock:
+            entry = self._stats.setdefault(endpoint, {"requests": 0, "status": {}, "latency_s": 0.0})
+            entry["requests"] += 1
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+            entry["latency_s"] += latency
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {endpoint: {**entry, "status": dict(entry["status"]),
+                               "mean_latency_s": round(entry["latency_s"] / entry["requests"], 4)}
+                    for endpoint, entry in self._stats.items()}
+
+    def gemini_throttled(self) -> bool:
+        """Random 429 injection plus, with --gemini-rpm, a sliding one-minute quota."""
+        if self.gemini_429_rate and random.random() < self.gemini_429_rate:
+            return True
+        if not self.gemini_rpm:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._gemini_calls and now - self._gemini_calls[0] > 60:
+                self._gemini_calls.popleft()
+            if len(self._gemini_calls) >= self.gemini_rpm:
+                return True
+            self._gemini_calls.append(now)
+        return False
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "FakeLLM/1.0"
+    fake: FakeLLM = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/api/tags" and self.fake.ollama_enabled:
+            self.fake.record("ollama_tags", 200)
+            self._send_json(200, {"models": [{"name": f"{MODEL_NAME}:latest", "model": f"{MODEL_NAME}:latest"}]})
+        elif path == "/_stats":
+            self._send_json(200, self.fake.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/api/generate" and self.fake.ollama_enabled:
+            self._ollama_generate(self._read_json())
+        elif path.startswith("/v1beta/models/") and path.endswith(":generateContent"):
+            self._gemini_generate(self._read_json())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _ollama_generate(self, payload: dict):
+        latency = self.fake.ollama_latency()
+        if self.fake.ollama_error_rate and random.random() < self.fake.ollama_error_rate:
+            time.sleep(latency)
+            self.fake.record("ollama_generate", 500, latency)
+            self._send_json(500, {"error": "injected failure"})
+            return
+        text = self.fake.responder.reply(payload.get("prompt", ""))
+        if not payload.get("stream", True):
+            time.sleep(latency)
+            self.fake.record("ollama_generate", 200, latency)
+            self._send_json(200, {"model": payload.get("model", MODEL_NAME), "response": text, "done": True})
+            return
+
+        # Streamed: NDJSON chunks spread over the sampled latency, as Ollama emits tokens
+        words = re.findall(r"\S+\s*", text) or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for word in words:
+                time.sleep(latency / len(words))
+                chunk = {"model": payload.get("model", MODEL_NAME), "response": word, "done": False}
+                self.wfile.write((json.dumps(chunk) + "\n").encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps({"model": MODEL_NAME, "response": "", "done": True}) + "\n").encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client cancelled mid-generation
+        self.fake.record("ollama_generate", 200, latency)
+
+    def _gemini_generate(self, payload: dict):
+        if self.fake.gemini_throttled():
+            self.fake.record("gemini_generate", 429)
+            self._send_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                            "message": "Quota exceeded (injected)."}},
+                            headers={"Retry-After": str(self.fake.retry_after)})
+            return
+        latency = self.fake.gemini_latency()
+        time.sleep(latency)
+        prompt = "".join(part.get("text", "") for content in payload.get("contents", [])
+                         for part in content.get("parts", []))
+        text = self.fake.responder.reply(prompt)
+        prompt_tokens, output_tokens = max(1, len(prompt) // 4), max(1, len(text) // 4)
+        self.fake.record("gemini_generate", 200, latency)
+        self._send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens},
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ollama-latency", type=parse_latency, default="lognormal:0.8,0.5")
+    parser.add_argument("--gemini-latency", type=parse_latency, default="uniform:0.3,1.2")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="fraction of Gemini calls answered 429")
+    parser.add_argument("--gemini-rpm", type=int, default=0, help="emulate a requests-per-minute quota (0 = off)")
+    parser.add_argument("--retry-after", type=float, default=2.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0, help="fraction of Ollama calls failing 500")
+    parser.add_argument("--no-ollama", action="store_true", help="act as Gemini only (Ollama endpoints 404)")
+    parser.add_argument("--responses", help="JSON file overriding the canned filter/graph_columns/generative replies")
+    parser.add_argument("--seed", type=int, help="seed for reply selection")
+    args = parser.parse_args()
+
+    responses = {}
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    Handler.fake = FakeLLM(args.ollama_latency, args.gemini_latency, CannedResponder(responses, args.seed),
+                           gemini_429_rate=args.gemini_429_rate, gemini_rpm=args.gemini_rpm,
+                           retry_after=args.retry_after, ollama_error_rate=args.ollama_error_rate,
+                           ollama_enabled=not args.no_ollama)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Fake LLM server on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Replay a weighted query mix against the backend at a target request rate.
+
+Usage:
+    python benchmarks/load_test.py [--base-url http://localhost:8000] [--rps 5] [--duration 60]
+        [--workbook sample_tprm_assessments_v2.xlsx | --filename already_uploaded.xlsx]
+        [--mix mix.json] [--concurrency 64] [--poisson] [--output report.json]
+
+Start benchmarks/fake_llm_server.py and the backend pointed at it first (see that
+script's docstring) to load-test without a real model. Requests are scheduled
+open-loop: latency is measured from each request's scheduled start, so time
+spent waiting for a free worker counts against the backend rather than hiding it.
+
+A mix file is a JSON list of {"query": ..., "weight": 1, "mode": "retrieval", "label": ...};
+the label (default: the backend's own graph/count/generative routing) groups the report.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+from backend.services.batch_service import classify_query  # noqa: E402
+
+DEFAULT_MIX = [
+    # Count questions the local parser answers without a model
+    {"query": "how many vendors have no BCP", "weight": 3},
+    {"query": "How many vendors are without cyber insurance?", "weight": 3},
+    {"query": "how many vendors are missing BCP and cyber insurance", "weight": 2},
+    # Count questions that need an LLM-written filter
+    {"query": "how many vendors look risky for payment data", "weight": 2},
+    # Chart requests (LLM chart config, then aggregation)
+    {"query": "show a chart of vendors by industry", "weight": 2},
+    {"query": "plot breaches by industry by revenue range", "weight": 1},
+    # Free-form questions (retrieval + LLM answer)
+    {"query": "Which vendors should we review first and why?", "weight": 2},
+    {"query": "Summarise the main control gaps across our vendors", "weight": 1},
+]
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {}
+    summary = {f"p{int(q * 100)}_ms": round(_percentile(latencies, q) * 1000, 1) for q in (0.5, 0.9, 0.95, 0.99)}
+    summary["mean_ms"] = round(sum(latencies) / len(latencies) * 1000, 1)
+    summary["max_ms"] = round(max(latencies) * 1000, 1)
+    return summary
+
+
+def upload_workbook(base_url: str, path: str) -> str:
+    with open(path, "rb") as f:
+        response = requests.post(f"{base_url}/upload/", files={"file": (os.path.basename(path), f)}, timeout=300)
+    response.raise_for_status()
+    return response.json()["filename"]
+
+
+def send_query(session: requests.Session, base_url: str, filename: str, entry: dict, timeout: float) -> dict:
+    """One /query/ call; "error" is set for HTTP errors, transport failures and error-typed answers."""
+    payload = {"filename": filename, "query": entry["query"], "mode": entry.get("mode", "retrieval")}
+    try:
+        response = session.post(f"{base_url}/query/", json=payload, timeout=timeout)
+    except requests.RequestException as e:
+        return {"status": None, "error": type(e).__name__}
+    result = {"status": response.status_code, "error": None}
+    if response.status_code >= 400:
+        result["error"] = f"HTTP {response.status_code}"
+    else:
+        try:
+            body = response.json()
+            if body.get("type") == "error":
+                result["error"] = "error answer"
+            result["degraded"] = bool(body.get("degraded"))
+        except ValueError:
+            result["error"] = "invalid JSON"
+    return result
+
+
+def run_load(base_url: str, filename: str, mix: list, rps: float, duration: float, concurrency: int,
+             timeout: float, poisson: bool = False, seed: int = None) -> list:
+    """Issue requests for `duration` seconds at `rps`; returns one record per request."""
+    rng = random.Random(seed)
+    weights = [entry.get("weight", 1) for entry in mix]
+    local = threading.local()
+    records = []
+    records_lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def fire(entry, scheduled):
+        started = time.perf_counter()
+        result = send_query(session(), base_url, filename, entry, timeout)
+        finished = time.perf_counter()
+        result.update(label=entry["label"], latency=finished - scheduled, queued=started - scheduled,
+                      scheduled=scheduled)
+        with records_lock:
+            records.append(result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, rng.choices(mix, weights)[0], next_at)
+            next_at += rng.expovariate(rps) if poisson else 1 / rps
+    return records
+
+
+def build_report(records: list, wall_seconds: float, target_rps: float) -> dict:
+    latencies = [r["latency"] for r in records]
+    errors = [r for r in records if r["error"]]
+    statuses = {}
+    for r in records:
+        key = str(r["status"]) if r["status"] is not None else "transport_error"
+        statuses[key] = statuses.get(key, 0) + 1
+    by_label = {}
+    for label in sorted({r["label"] for r in records}):
+        group = [r for r in records if r["label"] == label]
+        by_label[label] = {
+            "requests": len(group),
+            "error_rate": round(sum(1 for r in group if r["error"]) / len(group), 4),
+            **_latency_summary([r["latency"] for r in group]),
+        }
+    return {
+        "target_rps": target_rps,
+        "requests": len(records),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_rps": round(len(records) / wall_seconds, 2) if wall_seconds else 0.0,
+        "ok_throughput_rps": round((len(records) - len(errors)) / wall_seconds, 2) if wall_seconds else 0.0,
+        "error_rate": round(len(errors) / len(records), 4) if records else 0.0,
+        "degraded": sum(1 for r in records if r.get("degraded")),
+        "status_codes": statuses,
+        "errors": {reason: sum(1 for r in errors if r["error"] == reason) for reason in {r["error"] for r in errors}},
+        "latency": _latency_summary(latencies),
+        "queue_wait": _latency_summary([r["queued"] for r in records]),
+        "by_label": by_label,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests in {report['wall_seconds']} s "
+          f"(target {report['target_rps']} rps, achieved {report['throughput_rps']} rps, "
+          f"{report['ok_throughput_rps']} ok rps)")
+    print(f"Error rate {report['error_rate']:.2%}  status codes {report['status_codes']}  "
+          f"degraded answers {report['degraded']}")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+    latency = report["latency"]
+    if latency:
+        print(f"Latency ms  p50 {latency['p50_ms']}  p90 {latency['p90_ms']}  p95 {latency['p95_ms']}  "
+              f"p99 {latency['p99_ms']}  max {latency['max_ms']}  (queue wait p95 {report['queue_wait']['p95_ms']})")
+    print(f"\n{'label':14} {'requests':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in report["by_label"].items():
+        print(f"{label:14} {stats['requests']:8} {stats['error_rate']:7.1%} {stats['p50_ms']:9.1f} "
+              f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--workbook", default=os.path.join(ROOT_PATH, "sample_tprm_assessments_v2.xlsx"),
+                        help="uploaded before the run")
+    parser.add_argument("--filename", help="use a workbook already uploaded to the backend instead")
+    parser.add_argument("--mix", help="JSON query mix (default: built-in count/graph/generative mix)")
+    parser.add_argument("--rps", type=float, default=5.0, help="target request rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to keep issuing requests")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=180.0, help="per-request timeout (seconds)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of even")
+    parser.add_argument("--seed", type=int, help="seed for query selection and arrivals")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    mix = [{**entry, "label": entry.get("label") or classify_query(entry["query"])} for entry in mix]
+
+    filename = args.filename or upload_workbook(args.base_url, args.workbook)
+    print(f"Load testing {args.base_url}/query/ on {filename}: {args.rps} rps for {args.duration} s "
+          f"({len(mix)} queries in the mix)")
+    start = time.perf_counter()
+    records = run_load(args.base_url, filename, mix, args.rps, args.duration, args.concurrency,
+                       args.timeout, poisson=args.poisson, seed=args.seed)
+    report = build_report(records, time.perf_counter() - start, args.rps)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
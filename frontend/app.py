@@ -12,6 +12,36 @@ API_URL = "http://localhost:8000"
 st.title("📊 Excel Q&A Assistant")
 st.markdown("Upload your Excel file and ask questions about your data!")
 
+# Each status poll blocks server-side for at most this long, so no HTTP call outlives proxy timeouts
+JOB_POLL_SECONDS = 20
+
+def run_query_job(payload):
+    """Submit the question as a background job and long-poll until it finishes. Returns (ok, data or error text)."""
+    res = requests.post(f"{API_URL}/jobs/", json=payload)
+    if res.status_code != 202:
+        return False, res.text
+    job_id = res.json()["job_id"]
+    while True:
+        res = requests.get(f"{API_URL}/jobs/{job_id}", params={"wait": JOB_POLL_SECONDS}, timeout=JOB_POLL_SECONDS + 10)
+        if res.status_code != 200:
+            return False, res.text
+        job = res.json()
+        if job["status"] == "succeeded":
+            return True, job["result"]
+        if job["status"] in ("failed", "cancelled"):
+            return False, job.get("error") or job["status"]
+
+def render_crosstab(graph_data):
+    """Heatmap / stacked bar for 2-D cross-tab payloads from /query/."""
+    table = pd.DataFrame(graph_data["z"], index=graph_data["y"], columns=graph_data["x"])
+    table.index.name, table.columns.name = graph_data["y_label"], graph_data["x_label"]
+    if graph_data.get("graph_type") == "stacked_bar":
+        long_df = table.reset_index().melt(id_vars=graph_data["y_label"], value_name=graph_data["z_label"])
+        fig = px.bar(long_df, x=graph_data["x_label"], y=graph_data["z_label"], color=graph_data["y_label"])
+    else:
+        fig = px.imshow(table, text_auto=True, aspect="auto", color_continuous_scale="Reds")
+    st.plotly_chart(fig, use_container_width=True)
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "uploaded_filename" not in st.session_state:
@@ -39,6 +69,10 @@ with st.sidebar:
                     st.error(f"Connection error: {e}. Is the backend running?")
 
 st.header("2. Ask Questions")
+full_dataset_mode = st.toggle(
+    "Analyze the full dataset (slower)",
+    help="Answers free-form questions by reading every row in parallel chunks instead of the most relevant rows."
+)
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -46,17 +80,20 @@ for message in st.session_state.messages:
         if message.get("graph_data"):
             graph_data = message["graph_data"]
             try:
-                chart_df = pd.DataFrame({
-                    graph_data["x_label"]: graph_data["x"],
-                    graph_data["y_label"]: graph_data["y"]
-                }).set_index(graph_data["x_label"])
-                if graph_data.get("graph_type") == "line":
-                    st.line_chart(chart_df)
-                elif graph_data.get("graph_type") == "pie":
-                    fig = px.pie(chart_df.reset_index(), names=graph_data["x_label"], values=graph_data["y_label"])
-                    st.plotly_chart(fig, use_container_width=True)
+                if "z" in graph_data:
+                    render_crosstab(graph_data)
                 else:
-                    st.bar_chart(chart_df)
+                    chart_df = pd.DataFrame({
+                        graph_data["x_label"]: graph_data["x"],
+                        graph_data["y_label"]: graph_data["y"]
+                    }).set_index(graph_data["x_label"])
+                    if graph_data.get("graph_type") == "line":
+                        st.line_chart(chart_df)
+                    elif graph_data.get("graph_type") == "pie":
+                        fig = px.pie(chart_df.reset_index(), names=graph_data["x_label"], values=graph_data["y_label"])
+                        st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.bar_chart(chart_df)
             except Exception:
                 pass
 
@@ -72,11 +109,11 @@ if prompt := st.chat_input("Ask a question about your data (e.g., 'How many high
                 try:
                     payload = {
                         "filename": st.session_state.uploaded_filename,
-                        "query": prompt
+                        "query": prompt,
+                        "mode": "map_reduce" if full_dataset_mode else "retrieval"
                     }
-                    res = requests.post(f"{API_URL}/query/", json=payload)
-                    if res.status_code == 200:
-                        data = res.json()
+                    ok, data = run_query_job(payload)
+                    if ok:
                         answer = data.get("answer", "No answer provided.")
                         q_type = data.get("type", "unknown")
                         
@@ -86,27 +123,32 @@ if prompt := st.chat_input("Ask a question about your data (e.g., 'How many high
                         if q_type == "graph" and "graph_data" in data:
                             graph_data = data["graph_data"]
                             try:
-                                # Prepare dataframe for streamlit plotting
-                                chart_df = pd.DataFrame({
-                                    graph_data["x_label"]: graph_data["x"],
-                                    graph_data["y_label"]: graph_data["y"]
-                                }).set_index(graph_data["x_label"])
-                                
-                                st.write(f"### {graph_data['y_label']} by {graph_data['x_label']}")
-                                
-                                if graph_data.get("graph_type") == "line":
-                                    st.line_chart(chart_df)
-                                elif graph_data.get("graph_type") == "pie":
-                                    fig = px.pie(chart_df.reset_index(), names=graph_data["x_label"], values=graph_data["y_label"])
-                                    st.plotly_chart(fig, use_container_width=True)
+                                if "z" in graph_data:
+                                    # 2-D cross-tab: counts per (y value, x value)
+                                    st.write(f"### {graph_data['x_label']} by {graph_data['y_label']}")
+                                    render_crosstab(graph_data)
                                 else:
-                                    st.bar_chart(chart_df)
+                                    # Prepare dataframe for streamlit plotting
+                                    chart_df = pd.DataFrame({
+                                        graph_data["x_label"]: graph_data["x"],
+                                        graph_data["y_label"]: graph_data["y"]
+                                    }).set_index(graph_data["x_label"])
                                     
+                                    st.write(f"### {graph_data['y_label']} by {graph_data['x_label']}")
+
+                                    if graph_data.get("graph_type") == "line":
+                                        st.line_chart(chart_df)
+                                    elif graph_data.get("graph_type") == "pie":
+                                        fig = px.pie(chart_df.reset_index(), names=graph_data["x_label"], values=graph_data["y_label"])
+                                        st.plotly_chart(fig, use_container_width=True)
+                                    else:
+                                        st.bar_chart(chart_df)
+
                             except Exception as e:
                                 st.error(f"Failed to render graph from data: {e}")
                         
                         st.session_state.messages.append({"role": "assistant", "content": response_text, "graph_data": data.get("graph_data") if q_type == "graph" else None})
                     else:
-                        st.error(f"Backend Error: {res.text}")
+                        st.error(f"Backend Error: {data}")
                 except Exception as e:
                     st.error(f"Failed to connect to backend: {e}")
@@ -3,6 +3,22 @@ import pandas as pd
 import plotly.express as px
 import json
 import os
+import sys
+import time
+import functools
+import hashlib
+from contextlib import contextmanager
+
+# Make the shared backend services importable when run via `streamlit run frontend/dashboard.py`
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+from backend.services.dashboard_service import (  # noqa: E402
+    apply_risk_classification, apply_sidebar_filters, kpi_bitmaps, generate_custom_chart_figure
+)
+from backend.services.dtype_optimizer import optimize_dtypes, plain_values  # noqa: E402
+from backend.services.numeric_parsing import add_parsed_columns  # noqa: E402
 
 # Configuration & Theming
 st.set_page_config(page_title="TPRM Risk Dashboard", page_icon="🛡️", layout="wide")
@@ -35,50 +51,210 @@ def save_custom_config(graphs):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(graphs, f)
 
+# ---------- Performance HUD ----------
+
+# Reruns kept for rolling averages and export
+PERF_HISTORY_RUNS = 50
+
+# Timings for the current rerun (the script, and so this dict, is re-executed on every rerun)
+perf_run = {"started": time.perf_counter(), "sections": {}, "cache": {}, "saved": False}
+
+def perf_enabled():
+    return st.session_state.get("perf_hud", False)
+
+def _filter_cache_counts():
+    from backend.services.filter_cache import filter_cache_stats
+    stats = filter_cache_stats()
+    return stats["hits"], stats["misses"]
+
+perf_run["filter_cache_start"] = _filter_cache_counts()
+
+def save_perf_run():
+    """Append this rerun's timings to the HUD history (once per rerun)."""
+    if perf_run["saved"] or not perf_enabled():
+        return
+    perf_run["saved"] = True
+    hits, misses = _filter_cache_counts()
+    start_hits, start_misses = perf_run["filter_cache_start"]
+    cache = {name: {"hits": c["calls"] - c["misses"], "misses": c["misses"]} for name, c in perf_run["cache"].items()}
+    # Process-wide cache, so concurrent sessions' lookups are included
+    cache["filter_results"] = {"hits": hits - start_hits, "misses": misses - start_misses}
+    st.session_state.perf_run_count = st.session_state.get("perf_run_count", 0) + 1
+    history = st.session_state.setdefault("perf_history", [])
+    history.append({
+        "run": st.session_state.perf_run_count,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total_ms": (time.perf_counter() - perf_run["started"]) * 1000,
+        "sections": dict(perf_run["sections"]),
+        "cache": cache,
+    })
+    del history[:-PERF_HISTORY_RUNS]
+
+@contextmanager
+def perf_section(name):
+    """Time a dashboard section for the performance HUD; a no-op while the HUD is off."""
+    if not perf_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        # st.rerun() / st.stop() end the script here, so record the run now
+        perf_run["sections"][name] = perf_run["sections"].get(name, 0.0) + (time.perf_counter() - start) * 1000
+        save_perf_run()
+        raise
+    perf_run["sections"][name] = perf_run["sections"].get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def track_cache(cached_fn):
+    """Count lookups of a st.cache_* function; its body calls perf_cache_miss() so hits = lookups - misses."""
+    @functools.wraps(cached_fn)
+    def wrapper(*args, **kwargs):
+        perf_run["cache"].setdefault(cached_fn.__name__, {"calls": 0, "misses": 0})["calls"] += 1
+        return cached_fn(*args, **kwargs)
+    return wrapper
+
+def perf_cache_miss(name):
+    perf_run["cache"].setdefault(name, {"calls": 0, "misses": 0})["misses"] += 1
+
+def perf_history_csv(history):
+    rows = []
+    for run in history:
+        for section, ms in run["sections"].items():
+            rows.append({"run": run["run"], "timestamp": run["timestamp"], "section": section, "ms": round(ms, 2)})
+        rows.append({"run": run["run"], "timestamp": run["timestamp"], "section": "Total rerun", "ms": round(run["total_ms"], 2)})
+    return pd.DataFrame(rows).to_csv(index=False).encode('utf-8')
+
+def render_perf_hud():
+    save_perf_run()
+    history = st.session_state.get("perf_history", [])
+    if not perf_enabled() or not history:
+        return
+    with st.sidebar.expander("⏱️ Performance HUD", expanded=True):
+        last = history[-1]
+        sections = list(dict.fromkeys(name for run in history for name in run["sections"]))
+        rows = []
+        for name in sections:
+            samples = [run["sections"][name] for run in history if name in run["sections"]]
+            rows.append({
+                "Section": name,
+                "Last (ms)": round(last["sections"].get(name, 0.0), 1) if name in last["sections"] else None,
+                "Avg (ms)": round(sum(samples) / len(samples), 1),
+                "Runs": len(samples),
+            })
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        avg_total = sum(run["total_ms"] for run in history) / len(history)
+        st.caption(f"Rerun #{last['run']}: {last['total_ms']:.0f} ms · rolling avg {avg_total:.0f} ms over {len(history)} reruns")
+
+        cache_rows = []
+        for name in dict.fromkeys(name for run in history for name in run["cache"]):
+            cache_rows.append({
+                "Cache": name,
+                "Hits (last)": last["cache"].get(name, {}).get("hits", 0),
+                "Misses (last)": last["cache"].get(name, {}).get("misses", 0),
+                "Hits (all)": sum(run["cache"].get(name, {}).get("hits", 0) for run in history),
+                "Misses (all)": sum(run["cache"].get(name, {}).get("misses", 0) for run in history),
+            })
+        if cache_rows:
+            st.dataframe(pd.DataFrame(cache_rows), hide_index=True, use_container_width=True)
+
+        st.download_button(
+            label="📥 Export Timings (CSV)",
+            data=perf_history_csv(history),
+            file_name="dashboard_timings.csv",
+            mime="text/csv"
+        )
+        if st.button("Reset Timings"):
+            st.session_state.perf_history = []
+
+def upload_key(file):
+    """
+    Key for the process-wide caches below, shared by every session: the upload's
+    content hash, since different workbooks can have the same name and size.
+    """
+    return (file.name, hashlib.sha1(file.getvalue()).hexdigest())
+
+@track_cache
 @st.cache_data
 def load_and_process_data(file):
+    perf_cache_miss("load_and_process_data")
     try:
         df = pd.read_excel(file)
     except Exception as e:
-        return None, f"Failed to read file: {e}"
+        return None, f"Failed to read file: {e}", None
         
     # Validate Columns
     missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     if missing_cols:
-        return None, f"Missing required columns: {', '.join(missing_cols)}"
-        
-    df = apply_risk_classification(df)
-    return df, None
-
-def apply_risk_classification(df):
-    def calculate_risk(row):
-        # Normalize text to lower case to make matching robust
-        breach = str(row.get('Security Breach Last 2 Years', '')).lower()
-        infosec = str(row.get('Formal InfoSec Policy', '')).lower()
-        ir_plan = str(row.get('Incident Response Plan', '')).lower()
-        bcp = str(row.get('Business Continuity Plan', '')).lower()
-        insurance = str(row.get('Cyber Insurance', '')).lower()
-
-        # HIGH RISK RULES:
-        # Security breach exists (not none/no) OR No InfoSec Policy OR No Incident Response Plan
-        has_breach = breach not in ['none', 'no', 'nan', '']
-        if has_breach or infosec == 'no' or ir_plan == 'no':
-            return "High"
-            
-        # MEDIUM RISK RULES:
-        # Missing BCP OR No Cyber Insurance
-        if bcp == 'no' or insurance == 'no':
-            return "Medium"
-            
-        # OTHERWISE
-        return "Low"
-        
-    df['Risk Level'] = df.apply(calculate_risk, axis=1)
-    
-    # Custom sort order for Risk Level
-    risk_order = ['High', 'Medium', 'Low']
-    df['Risk Level'] = pd.Categorical(df['Risk Level'], categories=risk_order, ordered=True)
-    return df
+        return None, f"Missing required columns: {', '.join(missing_cols)}", None
+
+    # Same ingest stages as the backend, so both see identical frames
+    df, memory = optimize_dtypes(df)
+    df = add_parsed_columns(df)
+    with perf_section("Classification"):
+        df = apply_risk_classification(df)
+    return df, None, memory
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def get_retrieval_index(file_key, _df):
+    """Row retrieval index for the copilot, built once per uploaded file."""
+    perf_cache_miss("get_retrieval_index")
+    from backend.services.retrieval_service import RowRetrievalIndex
+    return RowRetrievalIndex(_df)
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def get_nl_filter_parser(file_key, _df):
+    """Local question-to-filter parser for the copilot, built once per uploaded file."""
+    perf_cache_miss("get_nl_filter_parser")
+    from backend.services.nl_filter import NLFilterParser
+    return NLFilterParser(_df)
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def apply_delta_upload(file_key, _df, _delta_file):
+    """`_df` with a delta workbook upserted; only the delta's new and changed vendors are classified."""
+    perf_cache_miss("apply_delta_upload")
+    from backend.services.delta_service import upsert
+    return upsert(_df, pd.read_excel(_delta_file), enrich=apply_risk_classification)
+
+# For a file_key produced by a delta: (previous file_key, previous df, its own _previous, changes),
+# so per-file structures are patched from the previous version's instead of rebuilt
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def get_bitmap_index(file_key, _df, _previous=None):
+    """Per-value bitmaps of the categorical columns, built once per uploaded file."""
+    perf_cache_miss("get_bitmap_index")
+    if _previous is not None:
+        previous_key, previous_df, before, changes = _previous
+        return get_bitmap_index(previous_key, previous_df, before).updated(_df, changes["changed"])
+    from backend.services.bitmap_index import BitmapIndex
+    return BitmapIndex(_df)
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def get_filter_context(file_key, _df, _previous=None):
+    """Compiled-filter evaluator for the copilot, built once per uploaded file."""
+    perf_cache_miss("get_filter_context")
+    from backend.services.filter_engine import FilterContext
+    if _previous is not None:
+        from backend.services.delta_service import migrate_filter_results
+        previous_key, _, _, changes = _previous
+        migrate_filter_results(previous_key, file_key, _df, changes)
+    return FilterContext(_df, bitmap_index=get_bitmap_index(file_key, _df, _previous), dataset_key=file_key)
+
+@track_cache
+@st.cache_resource(max_entries=4)
+def get_aggregate_cube(file_key, _df, _previous=None):
+    """Group-by aggregates for custom charts, shared across sessions viewing the same file."""
+    perf_cache_miss("get_aggregate_cube")
+    if _previous is not None:
+        previous_key, previous_df, before, changes = _previous
+        return get_aggregate_cube(previous_key, previous_df, before).updated(_df, changes["changed"])
+    from backend.services.aggregate_cube import AggregateCube
+    return AggregateCube(_df)
 
 def generate_csv_download(df):
     return df.to_csv(index=False).encode('utf-8')
@@ -126,70 +302,13 @@ def handle_chart_click(base_key, df, title_func, filter_func):
             # Trigger a full top-to-bottom script execution
             st.rerun()
 
-def generate_custom_chart_figure(df, config):
-    x_col = config.get("x_col")
-    y_col = config.get("y_col") 
-    aggr = config.get("aggregation", "count")
-    graph_type = config.get("graph_type", "bar")
-    chart_name = config.get("title", "Untitled Chart")
-    
-    # If the LLM generates a literal None/null for aggregation, fallback to count
-    if not aggr or str(aggr).lower() == 'none':
-        aggr = 'count'
-    
-    # Handle x_col being None or not in columns — try fuzzy matching
-    if not x_col or x_col not in df.columns:
-        matched = [c for c in df.columns if c.lower() == str(x_col).lower()]
-        if matched:
-            x_col = matched[0]
-        else:
-            raise ValueError(f"Column '{x_col}' not found in data. Chart: '{chart_name}'")
-    
-    # Auto-detect date columns → force line chart grouped by month
-    is_date = pd.api.types.is_datetime64_any_dtype(df[x_col])
-    if not is_date:
-        try:
-            pd.to_datetime(df[x_col], errors='raise')
-            is_date = True
-        except Exception:
-            pass
-    
-    if is_date:
-        graph_type = "line"  # Never pie for dates
-        temp = df.copy()
-        temp[x_col] = pd.to_datetime(temp[x_col], errors='coerce')
-        temp['_month'] = temp[x_col].dt.to_period('M').astype(str)
-        grouped = temp.groupby('_month').size().reset_index(name='count')
-        grouped = grouped.sort_values('_month')
-        chart_title = config.get("title", f"Trend: {x_col}")
-        return px.line(grouped, x='_month', y='count', title=chart_title, markers=True)
-    
-    # Too many categories? Force bar instead of pie
-    n_unique = df[x_col].nunique()
-    if graph_type == "pie" and n_unique > 10:
-        graph_type = "bar"
-    
-    if aggr == 'count':
-        grouped = df.groupby(x_col).size().reset_index(name='count')
-        y_col_out = 'count'
-    else:
-        if not y_col or y_col not in df.columns:
-            raise ValueError(f"Valid 'y_col' required for aggregation '{aggr}'")
-        grouped = df.groupby(x_col)[y_col].agg(aggr).reset_index()
-        y_col_out = y_col
-        
-    chart_title = config.get("title", f"{y_col_out} by {x_col}")
-        
-    if graph_type == "line":
-        return px.line(grouped, x=x_col, y=y_col_out, title=chart_title, markers=True)
-    elif graph_type == "pie":
-        return px.pie(grouped, names=x_col, values=y_col_out, title=chart_title)
-    else:
-        return px.bar(grouped, x=x_col, y=y_col_out, title=chart_title)
-
 with st.sidebar:
     st.header("📂 Data Upload")
     uploaded_file = st.file_uploader("Upload TPRM Excel Data", type=["xls", "xlsx"])
+    delta_files = st.file_uploader(
+        "Apply Delta Updates", type=["xls", "xlsx"], accept_multiple_files=True,
+        help="Workbooks of new or changed vendors, matched on Business Registration Number and applied in order."
+    )
     
     st.markdown("---")
     with st.expander("⚙️ Settings", expanded=False):
@@ -203,19 +322,38 @@ with st.sidebar:
         if gemini_key != st.session_state.get("gemini_api_key", ""):
             st.session_state.gemini_api_key = gemini_key
             st.success("API key saved for this session!")
+        st.toggle("⏱️ Performance HUD", key="perf_hud", help="Time each dashboard section per rerun (developer panel).")
     
 if uploaded_file is None:
     st.info("👈 Please upload the TPRM Assessment Excel file in the sidebar to view the dashboard.")
     st.image("https://images.unsplash.com/photo-1551288049-bebda4e38f71?fm=jpg&q=80&w=2000&blend=000000&blend-mode=overlay&blend-alpha=30", use_container_width=True)
 else:
     # 1. Automatic Load & Cache
-    with st.spinner("Processing Risk Data..."):
-        df, error = load_and_process_data(uploaded_file)
+    with perf_section("Data load"), st.spinner("Processing Risk Data..."):
+        df, error, memory = load_and_process_data(uploaded_file)
         
     if error:
         st.error(error)
     else:
-        st.success("File processed successfully.")
+        st.success(f"File processed successfully ({memory['before_bytes'] / 1e6:.1f} MB as read, "
+                   f"{memory['after_bytes'] / 1e6:.1f} MB in memory).")
+        file_key = upload_key(uploaded_file)
+        previous = None
+        with perf_section("Delta updates"):
+            for delta_file in delta_files or []:
+                delta_key = file_key + (upload_key(delta_file),)
+                try:
+                    delta_df, changes = apply_delta_upload(delta_key, df, delta_file)
+                except ValueError as e:
+                    st.sidebar.error(f"Could not apply {delta_file.name}: {e}")
+                    break
+                st.sidebar.caption(f"{delta_file.name}: {len(changes['updated'])} updated, "
+                                   f"{len(changes['inserted'])} added, {changes['unchanged']} unchanged")
+                previous = (file_key, df, previous, changes)
+                df, file_key = delta_df, delta_key
+        with perf_section("Data load"):
+            bitmaps = get_bitmap_index(file_key, df, previous)
+            filter_context = get_filter_context(file_key, df, previous)
         
         # 2. Sidebar Filtering
         st.sidebar.header("🔍 Filters")
@@ -232,10 +370,11 @@ else:
         
         # Compliance Framework
         # Explode comma-separated compliance values to get a unique list for the filter
-        all_frameworks = []
-        for x in df['Regulatory Compliance'].dropna():
-            all_frameworks.extend([item.strip() for item in str(x).split(',')])
-        unique_frameworks = sorted(list(set(all_frameworks)))
+        with perf_section("Filtering"):
+            all_frameworks = []
+            for x in df['Regulatory Compliance'].dropna():
+                all_frameworks.extend([item.strip() for item in str(x).split(',')])
+            unique_frameworks = sorted(list(set(all_frameworks)))
         
         compliance_filter = st.sidebar.multiselect(
             "Filter by Compliance Framework",
@@ -243,39 +382,35 @@ else:
         )
         
         # Apply Filters to Dataframe
-        filtered_df = df.copy()
-        if search_vendor:
-            filtered_df = filtered_df[filtered_df['Legal Name'].str.contains(search_vendor, case=False, na=False)]
-        if risk_filter:
-            filtered_df = filtered_df[filtered_df['Risk Level'].isin(risk_filter)]
-        if compliance_filter:
-            # Vendor must have at least one of the selected frameworks
-            pattern = '|'.join(compliance_filter)
-            filtered_df = filtered_df[filtered_df['Regulatory Compliance'].str.contains(pattern, case=False, na=False)]
+        with perf_section("Filtering"):
+            filtered_df = apply_sidebar_filters(df, search_vendor, risk_filter, compliance_filter)
+        # Identifies this file + sidebar selection for caches of per-filter results
+        filter_state = file_key + (search_vendor, tuple(risk_filter), tuple(compliance_filter))
 
         # 3. KPI Metrics Section
         st.markdown("---")
         st.subheader("📊 Top-Level KPIs")
         
-        total_vendors = len(filtered_df)
+        with perf_section("KPIs"):
+            total_vendors = len(filtered_df)
         
-        breach_condition = ~filtered_df['Security Breach Last 2 Years'].astype(str).str.lower().isin(['none', 'nan', 'no', ''])
-        vendors_w_breaches = filtered_df[breach_condition].shape[0]
-        
-        no_infosec = filtered_df[filtered_df['Formal InfoSec Policy'].astype(str).str.lower() == 'no'].shape[0]
-        no_bcp = filtered_df[filtered_df['Business Continuity Plan'].astype(str).str.lower() == 'no'].shape[0]
-        no_ir = filtered_df[filtered_df['Incident Response Plan'].astype(str).str.lower() == 'no'].shape[0]
-        no_insurance = filtered_df[filtered_df['Cyber Insurance'].astype(str).str.lower() == 'no'].shape[0]
-
-        m1, m2, m3 = st.columns(3)
-        m1.metric("Total Vendors", total_vendors)
-        m2.metric("Vendors with Security Breaches", vendors_w_breaches, delta_color="inverse", help="Breaches in last 2 years")
-        m3.metric("Vendors Missing InfoSec Policy", no_infosec, delta_color="inverse")
+            # Counts are bitmap ANDs + popcounts over the rows selected by the sidebar filters
+            breach_bitmap, missing_bitmaps = kpi_bitmaps(bitmaps, filtered_df.index)
+            vendors_w_breaches = breach_bitmap.count()
+            no_infosec = missing_bitmaps["InfoSec Policy"].count()
+            no_bcp = missing_bitmaps["BCP"].count()
+            no_ir = missing_bitmaps["Incident Response"].count()
+            no_insurance = missing_bitmaps["Cyber Insurance"].count()
+
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Total Vendors", total_vendors)
+            m2.metric("Vendors with Security Breaches", vendors_w_breaches, delta_color="inverse", help="Breaches in last 2 years")
+            m3.metric("Vendors Missing InfoSec Policy", no_infosec, delta_color="inverse")
         
-        m4, m5, m6 = st.columns(3)
-        m4.metric("Vendors Missing Incident Response", no_ir, delta_color="inverse")
-        m5.metric("Vendors Missing BCP", no_bcp, delta_color="inverse")
-        m6.metric("Vendors Missing Cyber Insurance", no_insurance, delta_color="inverse")
+            m4, m5, m6 = st.columns(3)
+            m4.metric("Vendors Missing Incident Response", no_ir, delta_color="inverse")
+            m5.metric("Vendors Missing BCP", no_bcp, delta_color="inverse")
+            m6.metric("Vendors Missing Cyber Insurance", no_insurance, delta_color="inverse")
 
         # 4. Visualizations
         st.markdown("---")
@@ -284,7 +419,7 @@ else:
         if len(filtered_df) > 0:
             c1, c2 = st.columns(2)
             
-            with c1:
+            with c1, perf_section("Chart: Risk Level Distribution"):
                 risk_counts = filtered_df['Risk Level'].value_counts().reset_index()
                 risk_counts.columns = ['Risk Level', 'Count']
                 fig_risk = px.bar(
@@ -299,10 +434,10 @@ else:
                 handle_chart_click(
                     "risk_chart", filtered_df, 
                     lambda val: f"Vendors with Risk Level: {val}", 
-                    lambda df, val: df[df['Risk Level'] == val]
+                    lambda df, val: filter_context.apply(f"`Risk Level` == {str(val)!r}", df)
                 )
                 
-            with c2:
+            with c2, perf_section("Chart: Top Compliance Frameworks"):
                 comp_counts = pd.Series(all_frameworks).value_counts().reset_index()
                 comp_counts.columns = ['Framework', 'Count']
                 fig_comp = px.bar(
@@ -321,57 +456,56 @@ else:
                     lambda df, val: df[df['Regulatory Compliance'].str.contains(str(val), case=False, na=False)]
                 )
             
-            st.markdown("### Missing Critical Controls")
-            missing_controls_data = {
-                'Control': ['InfoSec Policy', 'BCP', 'Incident Response', 'Cyber Insurance'],
-                'Vendors Missing': [no_infosec, no_bcp, no_ir, no_insurance]
-            }
-            fig_missing = px.bar(
-                missing_controls_data,
-                x='Control',
-                y='Vendors Missing',
-                title="Vendors Missing Key Controls",
-                color='Control',
-                text='Vendors Missing'
-            )
-            st.plotly_chart(fig_missing, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key("missing_chart"))
+            with perf_section("Chart: Missing Key Controls"):
+                st.markdown("### Missing Critical Controls")
+                missing_controls_data = {
+                    'Control': ['InfoSec Policy', 'BCP', 'Incident Response', 'Cyber Insurance'],
+                    'Vendors Missing': [no_infosec, no_bcp, no_ir, no_insurance]
+                }
+                fig_missing = px.bar(
+                    missing_controls_data,
+                    x='Control',
+                    y='Vendors Missing',
+                    title="Vendors Missing Key Controls",
+                    color='Control',
+                    text='Vendors Missing'
+                )
+                st.plotly_chart(fig_missing, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key("missing_chart"))
             
-            def filter_missing(df, val):
-                if val == "InfoSec Policy": return df[df['Formal InfoSec Policy'].astype(str).str.lower() == 'no']
-                if val == "BCP": return df[df['Business Continuity Plan'].astype(str).str.lower() == 'no']
-                if val == "Incident Response": return df[df['Incident Response Plan'].astype(str).str.lower() == 'no']
-                if val == "Cyber Insurance": return df[df['Cyber Insurance'].astype(str).str.lower() == 'no']
-                return df
+                def filter_missing(df, val):
+                    if val in missing_bitmaps: return bitmaps.take(df, missing_bitmaps[val])
+                    return df
                 
-            handle_chart_click(
-                "missing_chart", filtered_df, 
-                lambda val: f"Vendors Missing: {val}", 
-                filter_missing
-            )
+                handle_chart_click(
+                    "missing_chart", filtered_df, 
+                    lambda val: f"Vendors Missing: {val}", 
+                    filter_missing
+                )
 
             if 'Assessment Date' in filtered_df.columns:
-                st.markdown("### Assessments Over Time (Trend)")
-                trend_df = filtered_df.copy()
-                trend_df['Assessment Date'] = pd.to_datetime(trend_df['Assessment Date'], errors='coerce')
-                trend_df['Month'] = trend_df['Assessment Date'].dt.to_period('M').astype(str)
-                trend_df = trend_df[trend_df['Month'] != 'NaT']
+                with perf_section("Chart: Assessment Trend"):
+                    st.markdown("### Assessments Over Time (Trend)")
+                    trend_df = filtered_df.copy()
+                    trend_df['Assessment Date'] = pd.to_datetime(trend_df['Assessment Date'], errors='coerce')
+                    trend_df['Month'] = trend_df['Assessment Date'].dt.to_period('M').astype(str)
+                    trend_df = trend_df[trend_df['Month'] != 'NaT']
                 
-                monthly_counts = trend_df.groupby('Month').size().reset_index(name='Assessment Count')
-                monthly_counts = monthly_counts.sort_values('Month')
+                    monthly_counts = trend_df.groupby('Month').size().reset_index(name='Assessment Count')
+                    monthly_counts = monthly_counts.sort_values('Month')
                 
-                fig_trend = px.line(
-                    monthly_counts,
-                    x='Month',
-                    y='Assessment Count',
-                    title="Assessment Volume Trend Over Time",
-                    markers=True
-                )
-                st.plotly_chart(fig_trend, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key("trend_chart"))
-                handle_chart_click(
-                    "trend_chart", trend_df, 
-                    lambda val: f"Assessments in {str(val)[:7]}", 
-                    lambda df, val: df[df['Month'].str.startswith(str(val)[:7])]
-                )
+                    fig_trend = px.line(
+                        monthly_counts,
+                        x='Month',
+                        y='Assessment Count',
+                        title="Assessment Volume Trend Over Time",
+                        markers=True
+                    )
+                    st.plotly_chart(fig_trend, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key("trend_chart"))
+                    handle_chart_click(
+                        "trend_chart", trend_df, 
+                        lambda val: f"Assessments in {str(val)[:7]}", 
+                        lambda df, val: df[df['Month'].str.startswith(str(val)[:7])]
+                    )
 
             # 5. Dynamic AI Content Render
             st.markdown("---")
@@ -400,63 +534,66 @@ else:
                             save_custom_config(st.session_state.custom_graphs)
                             st.rerun()
                             
-                    try:
-                        config = graph_item['config']
-                        desc = config.get('description', '')
-                        if config.get('graph_type') == 'metric':
-                            # Render as KPI metric widgets
-                            x_col = config.get('x_col')
-                            if x_col and x_col in filtered_df.columns:
-                                title = config.get('title', x_col)
-                                st.markdown(f"**{title}**")
-                                counts = filtered_df[x_col].value_counts()
-                                metric_cols = st.columns(min(len(counts), 6))
-                                for j, (val, count) in enumerate(counts.items()):
-                                    if j < 6:
-                                        metric_cols[j].metric(label=str(val), value=count)
+                    with perf_section(f"Custom chart {i + 1}: {graph_item['query']}"):
+                        try:
+                            config = graph_item['config']
+                            desc = config.get('description', '')
+                            if config.get('graph_type') == 'metric':
+                                # Render as KPI metric widgets
+                                x_col = config.get('x_col')
+                                if x_col and x_col in filtered_df.columns:
+                                    title = config.get('title', x_col)
+                                    st.markdown(f"**{title}**")
+                                    counts = plain_values(filtered_df[x_col]).value_counts()
+                                    metric_cols = st.columns(min(len(counts), 6))
+                                    for j, (val, count) in enumerate(counts.items()):
+                                        if j < 6:
+                                            metric_cols[j].metric(label=str(val), value=count)
+                                    if desc:
+                                        st.caption(f"💡 {desc}")
+                                else:
+                                    chart_name = graph_item.get('query', config.get('title', 'Unknown'))
+                                    st.warning(f"⚠️ **{chart_name}**: Column '{x_col}' not found.")
+                            else:
+                                fig_custom = generate_custom_chart_figure(filtered_df, config, get_aggregate_cube(file_key, df, previous), filter_state, filter_context)
+                                base_key = f"custom_chart_{i}"
+                                st.plotly_chart(fig_custom, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key(base_key))
                                 if desc:
                                     st.caption(f"💡 {desc}")
-                            else:
-                                chart_name = graph_item.get('query', config.get('title', 'Unknown'))
-                                st.warning(f"⚠️ **{chart_name}**: Column '{x_col}' not found.")
-                        else:
-                            fig_custom = generate_custom_chart_figure(filtered_df, config)
-                            base_key = f"custom_chart_{i}"
-                            st.plotly_chart(fig_custom, use_container_width=True, on_select="rerun", selection_mode="points", key=get_chart_key(base_key))
-                            if desc:
-                                st.caption(f"💡 {desc}")
                             
-                            x_col = config.get('x_col')
-                            handle_chart_click(
-                                base_key, filtered_df, 
-                                lambda val, xc=x_col: f"Drill-down: {xc} = {val}", 
-                                lambda df, val, xc=x_col: df[df[xc].astype(str) == str(val)]
-                            )
-                    except Exception as e:
-                        chart_name = graph_item.get('query', graph_item['config'].get('title', 'Unknown'))
-                        st.warning(f"⚠️ **{chart_name}**: Could not render — {e}")
+                                x_col = config.get('x_col')
+                                handle_chart_click(
+                                    base_key, filtered_df, 
+                                    lambda val, xc=x_col: f"Drill-down: {xc} = {val}", 
+                                    lambda df, val, xc=x_col: bitmaps.take(df, bitmaps.where(xc, lambda v: str(v) == str(val)))
+                                )
+                        except Exception as e:
+                            chart_name = graph_item.get('query', graph_item['config'].get('title', 'Unknown'))
+                            st.warning(f"⚠️ **{chart_name}**: Could not render — {e}")
             
             # 6. Drill-Down Section
             st.markdown("---")
             st.subheader("🔍 High Risk Vendors Drill-Down")
             
-            high_risk_df = filtered_df[filtered_df['Risk Level'] == 'High']
-            if not high_risk_df.empty:
-                st.dataframe(high_risk_df[['Legal Name', 'Primary Industry', 'Security Breach Last 2 Years', 'Formal InfoSec Policy', 'Incident Response Plan']], use_container_width=True)
-            else:
-                st.success("No High Risk vendors match the current filters! 🎉")
+            with perf_section("Drill-down"):
+                high_risk_df = filter_context.apply("`Risk Level` == 'High'", filtered_df)
+                if not high_risk_df.empty:
+                    st.dataframe(high_risk_df[['Legal Name', 'Primary Industry', 'Security Breach Last 2 Years', 'Formal InfoSec Policy', 'Incident Response Plan']], use_container_width=True)
+                else:
+                    st.success("No High Risk vendors match the current filters! 🎉")
             
             st.markdown("### Raw Dataset Preview")
             with st.expander("Expand to view filtered dataset"):
                 st.dataframe(filtered_df, use_container_width=True)
                 
-            csv_data = generate_csv_download(filtered_df)
-            st.download_button(
-                label="📥 Download Filtered Data as CSV",
-                data=csv_data,
-                file_name="tprm_dashboard_export.csv",
-                mime="text/csv"
-            )
+            with perf_section("Export"):
+                csv_data = generate_csv_download(filtered_df)
+                st.download_button(
+                    label="📥 Download Filtered Data as CSV",
+                    data=csv_data,
+                    file_name="tprm_dashboard_export.csv",
+                    mime="text/csv"
+                )
             
             st.markdown("<br><br><br><br>", unsafe_allow_html=True) # padding for chat input
         else:
@@ -474,6 +611,10 @@ if uploaded_file is not None and not error:
                 with st.chat_message(msg["role"]):
                     st.markdown(msg["content"])
     
+    full_dataset_mode = st.toggle(
+        "🌐 Answer from the full filtered dataset (slower)",
+        help="Reads every filtered row in parallel chunks (map-reduce) instead of only the most relevant rows."
+    )
     prompt = st.chat_input("💬 Ask a question or type 'plot [graph type]...' to generate a chart")
     if prompt:
         st.session_state.copilot_history.append({"role": "user", "content": prompt})
@@ -483,17 +624,12 @@ if uploaded_file is not None and not error:
             'metric', 'compare', 'generate', 'widget', 'display', 'overview'
         ])
         
-        with st.spinner("Copilot is analyzing..."):
-            import sys
-            root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-            if root_path not in sys.path:
-                sys.path.append(root_path)
-            
+        with perf_section("Copilot"), st.spinner("Copilot is analyzing..."):
             _api_key = st.session_state.get("gemini_api_key", "")
             
             if is_graph_req:
-                from backend.services.llm_service import generate_graph_config
-                configs = generate_graph_config(prompt, list(filtered_df.columns), api_key=_api_key, df=filtered_df)
+                from backend.services.llm_service import generate_graph_config, PRIORITY_INTERACTIVE
+                configs = generate_graph_config(prompt, list(filtered_df.columns), api_key=_api_key, df=filtered_df, priority=PRIORITY_INTERACTIVE)
                 if configs and len(configs) > 0:
                     for cfg in configs:
                         title = cfg.get("title", prompt)
@@ -512,23 +648,38 @@ if uploaded_file is not None and not error:
             else:
                 from backend.services.llm_service import generate_pandas_filter, call_generative
                     
-                filter_query = generate_pandas_filter(prompt, list(filtered_df.columns), api_key=_api_key)
+                filter_query = get_nl_filter_parser(file_key, df).parse(prompt)
+                if filter_query is None:
+                    filter_query = generate_pandas_filter(prompt, list(filtered_df.columns), api_key=_api_key)
                 use_generative = True
                 ans_text = ""
                 
                 if filter_query and filter_query.lower() != "none":
                     try:
-                        ans_df = filtered_df.query(filter_query)
+                        ans_df = filter_context.apply(filter_query, filtered_df)
                         count = len(ans_df)
                         ans_text = f"Found **{count}** records matching your query."
                         use_generative = False
                     except Exception:
                         use_generative = True
                 
-                if use_generative:
-                    sample_csv = filtered_df.head(20).to_csv(index=False)
-                    summary_stats = f"Total vendors: {len(filtered_df)}, High Risk: {len(filtered_df[filtered_df['Risk Level']=='High'])}, Medium Risk: {len(filtered_df[filtered_df['Risk Level']=='Medium'])}, Low Risk: {len(filtered_df[filtered_df['Risk Level']=='Low'])}"
-                    gen_prompt = f"You are a data analyst. Here are some stats about the dataset:\n{summary_stats}\n\nHere is a sample of the data:\n{sample_csv}\n\nUser question: {prompt}\n\nProvide a clear, concise answer."
+                if use_generative and full_dataset_mode:
+                    from backend.services.llm_service import answer_map_reduce
+                    progress = st.progress(0.0, text="Reading the full dataset...")
+                    try:
+                        ans_text = answer_map_reduce(
+                            filtered_df, prompt, api_key=_api_key,
+                            progress_callback=lambda done, total: progress.progress(done / total, text=f"Analyzed {done}/{total} parts")
+                        )
+                    except Exception as e:
+                        ans_text = f"Error: {str(e)}"
+                    progress.empty()
+                elif use_generative:
+                    retrieval_index = get_retrieval_index(file_key, df)
+                    relevant_rows, n_rows = retrieval_index.build_context(prompt, token_budget=2000, restrict_to=filtered_df.index)
+                    from backend.services.context_service import get_dataset_context
+                    summary_stats = get_dataset_context(filter_state, filtered_df, token_budget=800)
+                    gen_prompt = f"You are a data analyst. Here are summary statistics over all {len(filtered_df)} filtered vendors:\n{summary_stats}\n\nHere are the {n_rows} rows most relevant to the question (pipe-separated):\n{relevant_rows}\n\nUser question: {prompt}\n\nProvide a clear, concise answer."
                     ans_text = call_generative(gen_prompt, api_key=_api_key, timeout=60)
                 
                 st.session_state.copilot_history.append({"role": "assistant", "content": ans_text})
@@ -537,3 +688,5 @@ if uploaded_file is not None and not error:
 if "drilldown_pending" in st.session_state:
     dd = st.session_state.pop("drilldown_pending")
     show_drilldown(dd["title"], dd["subset"])
+
+render_perf_hud()
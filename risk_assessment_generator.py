@@ -1,109 +1,305 @@
-import pandas as pd
-import random
-import uuid
-from faker import Faker
+"""
+Synthetic TPRM assessment generator (same column schema the dashboard expects).
+
+Usage:
+    python risk_assessment_generator.py [--rows N] [--output FILE] [--format xlsx|csv|parquet]
+                                        [--seed S] [--chunk-size N] [--breach-rate P]
+                                        [--major-breach-share P] [--control-gap-rate P]
+                                        [--industry-skew A] [--as-of YYYY-MM-DD]
 
-fake = Faker()
+Rows are drawn with NumPy from fixed value pools, one chunk at a time, so
+memory stays bounded by --chunk-size and a 1M-row CSV takes well under a minute
+(most of it in the CSV writer). The same arguments always produce the same file.
+"""
+import argparse
+import itertools
+import os
+import numpy as np
+import pandas as pd
 
 # -------- CONFIG --------
-NUM_VENDORS = 2000 
+NUM_VENDORS = 2000
 OUTPUT_FILE = "sample_tprm_assessments_v2.xlsx"
+DEFAULT_SEED = 42
+CHUNK_SIZE = 100_000
+# Dates are spread over the two years before this day (fixed so output is reproducible)
+DEFAULT_AS_OF = "2025-12-31"
+# Excel's sheet limit, minus the header row
+XLSX_MAX_ROWS = 1_048_575
 # ------------------------
 
-def random_yes_no():
-    return random.choice(["Yes", "No"])
-
-def random_compliance():
-    frameworks = ["GDPR", "HIPAA", "PCI-DSS", "CCPA", "ISO 27001", "SOC 2", "NIST"]
-    return ", ".join(random.sample(frameworks, random.randint(1, 4)))
-
-def random_rto():
-    return f"{random.choice([2,4,8,12,24,48])} hours"
-
-def random_rpo():
-    return f"{random.choice([15,30,60,120,240])} minutes"
-
-def random_revenue():
-    return random.choice([
-        "< $1M",
-        "$1M - $10M",
-        "$10M - $50M",
-        "$50M - $100M",
-        "> $100M"
-    ])
-
-vendors = []
-
-for _ in range(NUM_VENDORS):
-    vendor = {
-        # General Company Information
-        "Legal Name": fake.company(),
-        "Assessment Date": fake.date_between(start_date='-2y', end_date='today'),
-        "Trade Name": fake.company_suffix(),
-        "Business Registration Number": str(uuid.uuid4())[:12],
-        "Country of Incorporation": fake.country(),
-        "Headquarters Address": fake.address(),
-        "Website": fake.url(),
-        "Number of Employees": random.randint(20, 5000),
-        "Years in Operation": random.randint(1, 30),
-        "Primary Industry": random.choice(["IT Services", "FinTech", "Healthcare", "Manufacturing", "Retail"]),
-        "Revenue Range": random_revenue(),
-
-        # Information Security
-        "Formal InfoSec Policy": random_yes_no(),
-        "Certified Standards": random_compliance(),
-        "Security Risk Assessment (12 months)": random_yes_no(),
-        "Data Encryption": random.choice(["AES-256 at rest, TLS 1.2 in transit", "TLS only", "Encryption at rest only"]),
-        "Penetration Testing": random.choice(["Annually", "Bi-annually", "Quarterly", "Not conducted"]),
-        "DLP Strategy": random_yes_no(),
-        "Security Breach Last 2 Years": random.choice(["None", "Minor incident resolved", "Major breach reported"]),
-
-        # Compliance
-        "Regulatory Compliance": random_compliance(),
-        "External Audit Conducted": random_yes_no(),
-        "Data Processing Agreement": random_yes_no(),
-        "Internal Audit Frequency": random.choice(["Quarterly", "Annually", "Bi-annually"]),
-
-        # Business Continuity
-        "Business Continuity Plan": random_yes_no(),
-        "DRP Testing Frequency": random.choice(["Quarterly", "Annually", "Bi-annually"]),
-        "RTO": random_rto(),
-        "RPO": random_rpo(),
-        "Major Outage Last 2 Years": random.choice(["None", "1 outage", "Multiple outages"]),
-
-        # Vendor Risk Management
-        "Uses Subcontractors": random_yes_no(),
-        "Subcontractor Monitoring": random.choice(["Annual audits", "Continuous monitoring", "Self-assessment only"]),
-        "Subcontractor Access to Sensitive Data": random_yes_no(),
-
-        # Incident Response
-        "Incident Response Plan": random_yes_no(),
-        "Incident Simulation Conducted": random_yes_no(),
-        "Significant Breach Last 12 Months": random.choice(["None", "Yes - resolved", "Yes - ongoing investigation"]),
-
-        # Financial
-        "Financial Statements Provided": random_yes_no(),
-        "Cyber Insurance": random_yes_no(),
-        "Customer Compensation Policy": random.choice(["Defined in SLA", "Case-by-case basis", "Not defined"]),
-
-        # Physical Security
-        "24/7 Infrastructure Monitoring": random_yes_no(),
-        "Access Control Mechanisms": random.choice(["Biometric + Badge", "Badge only", "Manual log entry"]),
-
-        # HR & Training
-        "Background Checks Conducted": random_yes_no(),
-        "Cybersecurity Training Frequency": random.choice(["Quarterly", "Annually", "Upon hiring only"]),
-        "Remote Work Security Guidelines": random_yes_no(),
-
-        # Legal
-        "Standard SLA Available": random_yes_no(),
-        "Contract Termination & Data Destruction Policy": random_yes_no(),
-        "Legal Dispute Resolution Mechanism": random.choice(["Arbitration", "Court litigation", "Mediation"])
+# ---------- Value pools ----------
+
+NAME_PREFIXES = np.array([
+    "Blue", "North", "Silver", "Summit", "Apex", "Harbor", "Granite", "Vertex", "Pioneer", "Cedar",
+    "Atlas", "Beacon", "Crescent", "Evergreen", "Falcon", "Horizon", "Keystone", "Liberty", "Meridian", "Nova",
+    "Orion", "Pinnacle", "Quantum", "Redwood", "Sterling", "Titan", "Union", "Vanguard", "Western", "Zenith",
+], dtype=object)
+NAME_CORES = np.array([
+    "Systems", "Data", "Networks", "Solutions", "Analytics", "Logistics", "Health", "Capital", "Labs", "Dynamics",
+    "Software", "Partners", "Technologies", "Security", "Cloud", "Digital", "Services", "Holdings", "Works", "Industries",
+], dtype=object)
+COMPANY_SUFFIXES = np.array(["Inc", "LLC", "Ltd", "Group", "PLC", "and Sons", "Corp", "GmbH"], dtype=object)
+COUNTRIES = np.array([
+    "United States", "United Kingdom", "Canada", "Germany", "France", "India", "Ireland", "Netherlands", "Singapore",
+    "Australia", "Japan", "Brazil", "Mexico", "Spain", "Italy", "Sweden", "Switzerland", "Israel", "Poland", "South Africa",
+], dtype=object)
+STREETS = np.array([
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park",
+    "River", "Sunset", "Market", "Church", "Mill", "Spring", "Highland", "Forest", "Bridge", "King",
+], dtype=object)
+STREET_TYPES = np.array(["Street", "Avenue", "Road", "Boulevard", "Lane", "Drive", "Way", "Court"], dtype=object)
+CITIES = np.array([
+    "Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Clinton", "Fairview", "Salem", "Madison",
+    "Georgetown", "Arlington", "Ashland", "Dover", "Oxford", "Milton", "Newport", "Kingston", "Burlington",
+], dtype=object)
+INDUSTRIES = np.array(["IT Services", "FinTech", "Healthcare", "Manufacturing", "Retail"], dtype=object)
+REVENUE_RANGES = np.array(["< $1M", "$1M - $10M", "$10M - $50M", "$50M - $100M", "> $100M"], dtype=object)
+FRAMEWORKS = ["GDPR", "HIPAA", "PCI-DSS", "CCPA", "ISO 27001", "SOC 2", "NIST"]
+RTO_HOURS = np.array([2, 4, 8, 12, 24, 48])
+RPO_MINUTES = np.array([15, 30, 60, 120, 240])
+
+_HEX4 = np.array([f"{i:04x}" for i in range(16 ** 4)], dtype=object)
+_HEX3 = np.array([f"{i:03x}" for i in range(16 ** 3)], dtype=object)
+# Registration numbers are 44-bit ids ("xxxxxxxx-xxx"), a bijective scramble of a row counter
+_ID_BITS = 44
+_ID_MASK = (1 << _ID_BITS) - 1
+_ID_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # odd, so multiplying is a bijection mod 2**44
+_YES_NO = np.array(["Yes", "No"], dtype=object)
+# "Prefix Core" company brands with matching domain names, and "Street Type, City" addresses
+_BRANDS = np.array([f"{p} {c}" for p in NAME_PREFIXES for c in NAME_CORES], dtype=object)
+_DOMAINS = np.array([f"{p}{c}".lower() for p in NAME_PREFIXES for c in NAME_CORES], dtype=object)
+_STREET_ADDRESSES = np.array(
+    [f"{s} {t}, {c}" for s in STREETS for t in STREET_TYPES for c in CITIES], dtype=object
+)
+_HOUSE_NUMBERS = np.array([str(i) for i in range(1, 10000)], dtype=object)
+
+# Every ordered selection of 1-4 frameworks, grouped by size, so a row's list is one index lookup
+_FRAMEWORK_LISTS = [
+    np.array([", ".join(p) for p in itertools.permutations(FRAMEWORKS, k)], dtype=object) for k in range(1, 5)
+]
+
+YES_NO_COLUMNS = [
+    "Formal InfoSec Policy", "Security Risk Assessment (12 months)", "DLP Strategy", "External Audit Conducted",
+    "Data Processing Agreement", "Business Continuity Plan", "Uses Subcontractors",
+    "Subcontractor Access to Sensitive Data", "Incident Response Plan", "Incident Simulation Conducted",
+    "Financial Statements Provided", "Cyber Insurance", "24/7 Infrastructure Monitoring",
+    "Background Checks Conducted", "Remote Work Security Guidelines", "Standard SLA Available",
+    "Contract Termination & Data Destruction Policy",
+]
+# Columns whose "Yes" is a risk factor rather than a control, so --control-gap-rate doesn't apply
+RISK_YES_NO_COLUMNS = {"Uses Subcontractors", "Subcontractor Access to Sensitive Data"}
+
+CHOICE_COLUMNS = {
+    "Data Encryption": ["AES-256 at rest, TLS 1.2 in transit", "TLS only", "Encryption at rest only"],
+    "Penetration Testing": ["Annually", "Bi-annually", "Quarterly", "Not conducted"],
+    "Internal Audit Frequency": ["Quarterly", "Annually", "Bi-annually"],
+    "DRP Testing Frequency": ["Quarterly", "Annually", "Bi-annually"],
+    "Major Outage Last 2 Years": ["None", "1 outage", "Multiple outages"],
+    "Subcontractor Monitoring": ["Annual audits", "Continuous monitoring", "Self-assessment only"],
+    "Significant Breach Last 12 Months": ["None", "Yes - resolved", "Yes - ongoing investigation"],
+    "Customer Compensation Policy": ["Defined in SLA", "Case-by-case basis", "Not defined"],
+    "Access Control Mechanisms": ["Biometric + Badge", "Badge only", "Manual log entry"],
+    "Cybersecurity Training Frequency": ["Quarterly", "Annually", "Upon hiring only"],
+    "Legal Dispute Resolution Mechanism": ["Arbitration", "Court litigation", "Mediation"],
+}
+
+COLUMNS = [
+    # General Company Information
+    "Legal Name", "Assessment Date", "Trade Name", "Business Registration Number", "Country of Incorporation",
+    "Headquarters Address", "Website", "Number of Employees", "Years in Operation", "Primary Industry",
+    "Revenue Range",
+    # Information Security
+    "Formal InfoSec Policy", "Certified Standards", "Security Risk Assessment (12 months)", "Data Encryption",
+    "Penetration Testing", "DLP Strategy", "Security Breach Last 2 Years",
+    # Compliance
+    "Regulatory Compliance", "External Audit Conducted", "Data Processing Agreement", "Internal Audit Frequency",
+    # Business Continuity
+    "Business Continuity Plan", "DRP Testing Frequency", "RTO", "RPO", "Major Outage Last 2 Years",
+    # Vendor Risk Management
+    "Uses Subcontractors", "Subcontractor Monitoring", "Subcontractor Access to Sensitive Data",
+    # Incident Response
+    "Incident Response Plan", "Incident Simulation Conducted", "Significant Breach Last 12 Months",
+    # Financial
+    "Financial Statements Provided", "Cyber Insurance", "Customer Compensation Policy",
+    # Physical Security
+    "24/7 Infrastructure Monitoring", "Access Control Mechanisms",
+    # HR & Training
+    "Background Checks Conducted", "Cybersecurity Training Frequency", "Remote Work Security Guidelines",
+    # Legal
+    "Standard SLA Available", "Contract Termination & Data Destruction Policy", "Legal Dispute Resolution Mechanism",
+]
+
+
+def _registration_numbers(first_id: int, n: int) -> np.ndarray:
+    """
+    Registration numbers for row ids `first_id`..`first_id + n - 1` (mod 2**44). Distinct
+    ids always give distinct numbers, so a dataset's numbers are unique by construction.
+    """
+    ids = (np.uint64(first_id) + np.arange(n, dtype=np.uint64)) & np.uint64(_ID_MASK)
+    with np.errstate(over="ignore"):
+        ids = (ids * _ID_MULTIPLIER) & np.uint64(_ID_MASK)
+    ids = (ids ^ (ids >> np.uint64(_ID_BITS // 2))).astype(np.int64)
+    return _HEX4[ids >> 28] + _HEX4[(ids >> 12) & 0xFFFF] + "-" + _HEX3[ids & 0xFFF]
+
+
+def _first_id(seed: int) -> int:
+    """Start of a seed's row-id range; ranges of different seeds are far apart with near certainty."""
+    return int(np.random.SeedSequence(seed).generate_state(1, dtype=np.uint64)[0]) & _ID_MASK
+
+
+def _pick(rng, pool, n, p=None):
+    pool = np.asarray(pool, dtype=object)
+    return pool[rng.choice(len(pool), size=n, p=p)]
+
+
+def _yes_no(rng, n, no_rate):
+    return _YES_NO[(rng.random(n) < no_rate).view(np.int8)]
+
+
+def _framework_lists(rng, n):
+    sizes = rng.integers(0, len(_FRAMEWORK_LISTS), size=n)
+    out = np.empty(n, dtype=object)
+    for k, pool in enumerate(_FRAMEWORK_LISTS):
+        rows = np.flatnonzero(sizes == k)
+        out[rows] = pool[rng.integers(0, len(pool), size=len(rows))]
+    return out
+
+
+def _industry_weights(skew: float):
+    # Zipf-like: 0 = uniform, larger = more vendors in the first industries
+    weights = 1.0 / np.arange(1, len(INDUSTRIES) + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_chunk(rng, n: int, as_of, breach_rate: float = 2 / 3, major_breach_share: float = 0.5,
+                   control_gap_rate: float = 0.5, industry_skew: float = 0.0, first_id: int = 0) -> pd.DataFrame:
+    """
+    `n` synthetic vendors. Defaults reproduce the original generator's distributions;
+    registration numbers come from row ids `first_id` onwards.
+    """
+    brand = rng.integers(0, len(_BRANDS), size=n)
+    names = _BRANDS[brand] + " " + _pick(rng, COMPANY_SUFFIXES, n)
+    websites = "https://www." + _DOMAINS[brand] + _pick(rng, [".com", ".net", ".io", ".biz", ".org"], n) + "/"
+
+    addresses = _HOUSE_NUMBERS[rng.integers(0, len(_HOUSE_NUMBERS), size=n)] + " " + _pick(rng, _STREET_ADDRESSES, n)
+    registration = _registration_numbers(first_id, n)
+    dates = pd.to_datetime(as_of) - pd.to_timedelta(rng.integers(0, 730, size=n), unit="D")
+
+    has_breach = rng.random(n) < breach_rate
+    major = rng.random(n) < major_breach_share
+    breaches = np.where(has_breach, np.where(major, "Major breach reported", "Minor incident resolved"), "None")
+
+    data = {
+        "Legal Name": names,
+        "Assessment Date": dates,
+        "Trade Name": _pick(rng, COMPANY_SUFFIXES, n),
+        "Business Registration Number": registration,
+        "Country of Incorporation": _pick(rng, COUNTRIES, n),
+        "Headquarters Address": addresses,
+        "Website": websites,
+        "Number of Employees": rng.integers(20, 5001, size=n),
+        "Years in Operation": rng.integers(1, 31, size=n),
+        "Primary Industry": _pick(rng, INDUSTRIES, n, p=_industry_weights(industry_skew)),
+        "Revenue Range": _pick(rng, REVENUE_RANGES, n),
+        "Certified Standards": _framework_lists(rng, n),
+        "Security Breach Last 2 Years": breaches.astype(object),
+        "Regulatory Compliance": _framework_lists(rng, n),
+        "RTO": (_pick(rng, RTO_HOURS, n).astype(str) + " hours"),
+        "RPO": (_pick(rng, RPO_MINUTES, n).astype(str) + " minutes"),
     }
+    for col in YES_NO_COLUMNS:
+        data[col] = _yes_no(rng, n, 0.5 if col in RISK_YES_NO_COLUMNS else control_gap_rate)
+    for col, choices in CHOICE_COLUMNS.items():
+        data[col] = _pick(rng, choices, n)
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def generate_chunks(rows: int, seed: int = DEFAULT_SEED, chunk_size: int = CHUNK_SIZE, as_of: str = DEFAULT_AS_OF,
+                    **skews):
+    """
+    Yield DataFrames totalling `rows` rows. Each chunk has its own seed, derived from `seed`.
+    Registration numbers are unique across all chunks.
+    """
+    children = np.random.SeedSequence(seed).spawn((rows + chunk_size - 1) // chunk_size)
+    first_id = _first_id(seed)
+    for i, child in enumerate(children):
+        n = min(chunk_size, rows - i * chunk_size)
+        yield generate_chunk(np.random.default_rng(child), n, as_of, first_id=first_id + i * chunk_size, **skews)
+
+
+# ---------- Writers ----------
+
+def _write_csv(path, chunks):
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False, date_format="%Y-%m-%d")
+
+
+def _write_parquet(path, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(path, chunks):
+    from openpyxl import Workbook
+    # Write-only mode streams rows to disk instead of holding the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for chunk in chunks:
+        chunk = chunk.astype({"Assessment Date": object})
+        chunk["Assessment Date"] = [d.date() for d in chunk["Assessment Date"]]
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+
+
+WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "parquet": _write_parquet}
+
+
+def write_dataset(path: str, rows: int, fmt: str = None, **options):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in WRITERS:
+        raise SystemExit(f"Unsupported format '{fmt}' (choose from {', '.join(WRITERS)})")
+    if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+        raise SystemExit(f"xlsx holds at most {XLSX_MAX_ROWS:,} rows; use csv or parquet for larger datasets")
+    WRITERS[fmt](path, generate_chunks(rows, **options))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=NUM_VENDORS)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--format", choices=sorted(WRITERS), help="default: from the output file extension")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows generated and written at a time")
+    parser.add_argument("--breach-rate", type=float, default=2 / 3, help="share of vendors with a breach in 2 years")
+    parser.add_argument("--major-breach-share", type=float, default=0.5, help="share of breaches that are major")
+    parser.add_argument("--control-gap-rate", type=float, default=0.5, help="chance each control is answered 'No'")
+    parser.add_argument("--industry-skew", type=float, default=0.0, help="0 = uniform industries, 1+ = Zipf-like")
+    parser.add_argument("--as-of", default=DEFAULT_AS_OF, help="latest assessment date")
+    args = parser.parse_args()
 
-    vendors.append(vendor)
+    write_dataset(
+        args.output, args.rows, args.format, seed=args.seed, chunk_size=args.chunk_size, as_of=args.as_of,
+        breach_rate=args.breach_rate, major_breach_share=args.major_breach_share,
+        control_gap_rate=args.control_gap_rate, industry_skew=args.industry_skew,
+    )
+    print(f"Sample TPRM assessments generated successfully: {args.output} ({args.rows:,} rows)")
 
-df = pd.DataFrame(vendors)
-df.to_excel(OUTPUT_FILE, index=False)
 
-print(f"Sample TPRM assessments generated successfully: {OUTPUT_FILE}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+import pytest
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLE_WORKBOOK = os.path.join(ROOT_PATH, "sample_tprm_assessments_v2.xlsx")
+
+
+@pytest.fixture(scope="session")
+def sample_df() -> pd.DataFrame:
+    """The 2,000-row sample workbook, as read (no ingest-time processing)."""
+    return pd.read_excel(SAMPLE_WORKBOOK)
+
+
+@pytest.fixture(autouse=True)
+def _clear_filter_cache():
+    from backend.services.filter_cache import filter_result_cache
+    filter_result_cache.clear()
+    yield
+    filter_result_cache.clear()
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from backend.services.admission import AdmissionController, Overloaded
+from backend.services.rate_limiter import RequestCancelled
+
+
+def _controller(concurrency=1, max_queue=1, max_wait=0.2, shed_mode="auto"):
+    return AdmissionController({"count": (concurrency, max_queue, 2.0)}, max_wait=max_wait, shed_mode=shed_mode)
+
+
+def _hold(controller, started, release):
+    def run():
+        with controller.admit("count"):
+            started.set()
+            release.wait(5)
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+    return thread
+
+
+def test_admits_up_to_concurrency_then_times_out():
+    controller = _controller(max_wait=0.05)
+    started, release = threading.Event(), threading.Event()
+    holder = _hold(controller, started, release)
+    with pytest.raises(Overloaded) as excinfo:
+        with controller.admit("count"):
+            pass
+    assert excinfo.value.retry_after >= 1
+    release.set()
+    holder.join()
+    with controller.admit("count"):
+        assert controller.stats()["count"]["active"] == 1
+    stats = controller.stats()["count"]
+    assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["active"] == 0
+
+
+def test_full_queue_rejects_at_once_and_triggers_shedding():
+    controller = _controller(max_queue=0)
+    assert not controller.should_shed("count")
+    started, release = threading.Event(), threading.Event()
+    holder = _hold(controller, started, release)
+    assert controller.should_shed("count")
+    with pytest.raises(Overloaded):
+        with controller.admit("count"):
+            pass
+    release.set()
+    holder.join()
+    assert not controller.should_shed("count")
+
+
+def test_shed_modes():
+    assert _controller(shed_mode="on").should_shed("count")
+    off = _controller(max_queue=0, shed_mode="off")
+    started, release = threading.Event(), threading.Event()
+    holder = _hold(off, started, release)
+    assert not off.should_shed("count")
+    release.set()
+    holder.join()
+
+
+def test_waiter_gets_the_slot_when_it_frees():
+    controller = _controller(max_wait=5)
+    started, release = threading.Event(), threading.Event()
+    holder = _hold(controller, started, release)
+    threading.Timer(0.05, release.set).start()
+    assert controller.run_when_admitted("count", lambda: "ran") == "ran"
+    holder.join()
+
+
+def test_background_wait_can_be_cancelled():
+    controller = _controller(max_queue=0)
+    started, release = threading.Event(), threading.Event()
+    holder = _hold(controller, started, release)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(RequestCancelled):
+        controller.run_when_admitted("count", lambda: "never", cancel_event=cancel)
+    release.set()
+    holder.join()
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.aggregate_cube import AggregateCube, group_aggregate, group_crosstab
+from backend.services.dtype_optimizer import optimize_dtypes
+
+CHARTS = [
+    ("Primary Industry", None, "count"),
+    ("Revenue Range", "Number of Employees", "mean"),
+    ("Revenue Range", "Number of Employees", "sum"),
+    ("Cyber Insurance", "Years in Operation", "min"),
+    ("Primary Industry", "Years in Operation", "max"),
+    ("Primary Industry", "Number of Employees", "median"),  # not a cube aggregation
+    ("Legal Name", None, "count"),                          # too many groups for the cube
+]
+
+
+@pytest.fixture(scope="module")
+def ingested(sample_df):
+    df, _ = optimize_dtypes(sample_df)
+    return df
+
+
+def _subsets(df):
+    return {
+        "all": None,
+        "fintech": df[df["Primary Industry"] == "FinTech"],  # leaves most categories without rows
+        "three": df.iloc[:3],
+        "none": df.iloc[:0],
+    }
+
+
+def _reference(frame, x_col, y_col, aggregation):
+    """Straight pandas on plain object keys, so there are no categories to leave unused."""
+    keys = frame[x_col].astype(object)
+    grouped = frame.groupby(keys, sort=True)
+    if aggregation == "count":
+        return grouped.size().reset_index(name="count")
+    return grouped[y_col].agg(aggregation).reset_index()
+
+
+def _assert_same(result, expected):
+    result = result.astype({result.columns[0]: object})
+    expected = expected.astype({expected.columns[0]: object})
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize("x_col, y_col, aggregation", CHARTS)
+def test_aggregate_matches_pandas(ingested, x_col, y_col, aggregation):
+    cube = AggregateCube(ingested)
+    for name, frame in _subsets(ingested).items():
+        source = ingested if frame is None else frame
+        expected = _reference(source, x_col, y_col, aggregation)
+        _assert_same(cube.aggregate(x_col, y_col, aggregation, frame=frame, frame_key=name), expected)
+        _assert_same(group_aggregate(source, x_col, y_col, aggregation), expected)
+        # Cached lookups give the same answer
+        _assert_same(cube.aggregate(x_col, y_col, aggregation, frame=frame, frame_key=name), expected)
+
+
+@pytest.mark.parametrize("x_col, y_col, aggregation", CHARTS[:5])
+def test_cube_and_fallback_keep_the_same_groups(ingested, x_col, y_col, aggregation):
+    cube, fallback = AggregateCube(ingested), AggregateCube(ingested, max_cardinality=0)
+    for name, frame in _subsets(ingested).items():
+        _assert_same(cube.aggregate(x_col, y_col, aggregation, frame=frame),
+                     fallback.aggregate(x_col, y_col, aggregation, frame=frame))
+
+
+@pytest.mark.parametrize("aggregation", ["min", "max"])
+def test_integer_extremes_keep_their_dtype_under_filters(ingested, aggregation):
+    cube = AggregateCube(ingested)
+    assert pd.api.types.is_integer_dtype(ingested["Years in Operation"])
+    for name, frame in _subsets(ingested).items():
+        if frame is not None and frame.empty:
+            continue
+        result = cube.aggregate("Primary Industry", "Years in Operation", aggregation, frame=frame, frame_key=name)
+        partials = cube.partials("Primary Industry", "Years in Operation", frame=frame, frame_key=name)
+        assert result["Years in Operation"].dtype == np.int64, name
+        assert partials[aggregation].dtype == np.int64, name
+
+
+def test_unused_categories_are_dropped():
+    df = pd.DataFrame({
+        "Tier": pd.Categorical(["a", "a", "b"], categories=["a", "b", "c"]),
+        "Spend": [1.0, 2.0, 5.0],
+    })
+    for result in (AggregateCube(df).aggregate("Tier", "Spend", "sum"), group_aggregate(df, "Tier", "Spend", "sum")):
+        assert list(result["Tier"].astype(str)) == ["a", "b"]
+        assert list(result["Spend"]) == [3.0, 5.0]
+    table = group_crosstab(df, "Tier", "Tier")
+    assert list(table.index.astype(str)) == ["a", "b"]
+
+
+def test_crosstab_matches_pandas(ingested):
+    cube = AggregateCube(ingested)
+    for name, frame in _subsets(ingested).items():
+        source = ingested if frame is None else frame
+        if source.empty:
+            continue
+        expected = pd.crosstab(source["Revenue Range"].astype(object), source["Primary Industry"].astype(object))
+        for table in (cube.crosstab("Revenue Range", "Primary Industry", frame=frame, frame_key=name),
+                      group_crosstab(source, "Revenue Range", "Primary Industry")):
+            assert table.values.tolist() == expected.values.tolist()
+            assert list(table.index.astype(str)) == list(expected.index)
+            assert list(table.columns.astype(str)) == list(expected.columns)
+
+
+def test_partials_merge_to_whole_dataset(ingested):
+    cube = AggregateCube(ingested)
+    halves = [ingested.iloc[:900], ingested.iloc[900:]]
+    parts = pd.concat([cube.partials("Revenue Range", "Number of Employees", frame=h) for h in halves])
+    merged = parts.groupby("Revenue Range", observed=True)[["size", "count", "sum"]].sum()
+    whole = cube.partials("Revenue Range", "Number of Employees").set_index("Revenue Range")
+    assert merged["size"].tolist() == whole["size"].tolist()
+    assert merged["sum"].tolist() == whole["sum"].tolist()
+
+
+def test_updated_cube_matches_rebuilt(ingested):
+    cube = AggregateCube(ingested)
+    cells = [chart for chart in CHARTS if chart[2] in ("count", "mean", "sum", "min", "max")]
+    for x_col, y_col, aggregation in cells:
+        cube.aggregate(x_col, y_col, aggregation)
+    cube.crosstab("Revenue Range", "Primary Industry")
+
+    df = ingested.copy()
+    changed = np.array([2, 40, 41, 1500])
+    df.loc[changed, "Number of Employees"] = np.array([1, 2, 30_000, 7], dtype=df["Number of Employees"].dtype)
+    df["Primary Industry"] = df["Primary Industry"].cat.add_categories(["Aerospace"])
+    df.loc[changed[:2], "Primary Industry"] = "Aerospace"
+    df = pd.concat([df, df.iloc[[5, 6]]], ignore_index=True)
+    changed = np.concatenate([changed, [len(ingested), len(ingested) + 1]])
+
+    updated, rebuilt = cube.updated(df, changed), AggregateCube(df)
+    for x_col, y_col, aggregation in cells:
+        _assert_same(updated.aggregate(x_col, y_col, aggregation), rebuilt.aggregate(x_col, y_col, aggregation))
+    pd.testing.assert_frame_equal(updated.crosstab("Revenue Range", "Primary Industry"),
+                                  rebuilt.crosstab("Revenue Range", "Primary Industry"), check_dtype=False)
+    assert updated.stats()["hits"] > 0
+
+
+def test_dashboard_chart_rows_do_not_depend_on_the_cube(ingested):
+    from backend.services.dashboard_service import generate_custom_chart_figure
+    frame = ingested[ingested["Primary Industry"] == "FinTech"]
+    for config in ({"x_col": "Revenue Range", "aggregation": "count", "graph_type": "bar"},
+                   {"x_col": "Primary Industry", "y_col": "Number of Employees", "aggregation": "mean",
+                    "graph_type": "bar"},
+                   {"x_col": "Revenue Range", "group_col": "Cyber Insurance", "graph_type": "heatmap"}):
+        with_cube = generate_custom_chart_figure(frame, config, AggregateCube(ingested), frame_key="fintech")
+        without = generate_custom_chart_figure(frame, config)
+        for a, b in zip(with_cube.data, without.data):
+            assert list(map(str, a.x)) == list(map(str, b.x))
+            values = "z" if a.type == "heatmap" else "y"
+            assert np.allclose(np.asarray(a[values], dtype=float), np.asarray(b[values], dtype=float))
@@ -0,0 +1,76 @@
+import json
+import threading
+
+import pytest
+
+from backend.services import batch_service, llm_service
+from backend.services.admission import AdmissionController
+from tests.conftest import SAMPLE_WORKBOOK
+
+RAW_FILTERS = [
+    "`Cyber Insurance` == 'No'",
+    "```\n`Cyber Insurance` == 'No'\n```",
+    "`" + "`Cyber Insurance` == 'No'".replace("`", "") + "`",
+    "\"`Cyber Insurance` == 'No'\"",
+]
+
+
+@pytest.mark.parametrize("raw", RAW_FILTERS)
+def test_single_and_batch_filters_are_normalised_alike(monkeypatch, raw):
+    monkeypatch.setattr(llm_service, "_call_llm", lambda prompt, **kw: raw)
+    single = llm_service.generate_pandas_filter("q", ["Cyber Insurance"])
+    monkeypatch.setattr(llm_service, "_call_llm", lambda prompt, **kw: json.dumps({"1": raw, "2": None}))
+    batch = llm_service.generate_pandas_filters(["q", "r"], ["Cyber Insurance"])
+    assert batch == [single, "None"]
+    assert "```" not in single and not single.startswith('"')
+
+
+def test_backticked_column_at_both_ends_is_kept(monkeypatch):
+    raw = "`Cyber Insurance` == 'No' and not `Cyber Insurance`"
+    monkeypatch.setattr(llm_service, "_call_llm", lambda prompt, **kw: raw)
+    assert llm_service.generate_pandas_filter("q", ["Cyber Insurance"]) == raw
+
+
+def test_batch_survives_fast_path_failure(monkeypatch, sample_df):
+    def parse(file_path, query):
+        if "explode" in query:
+            raise RuntimeError("parser bug")
+        return None
+    expected = int((sample_df["Cyber Insurance"] == "No").sum())
+    monkeypatch.setattr(batch_service, "parse_count_filter", parse)
+    monkeypatch.setattr(llm_service, "_call_llm",
+                        lambda prompt, **kw: json.dumps({"1": "`Cyber Insurance` == 'No'",
+                                                         "2": "`Cyber Insurance` == 'No'"}))
+    result = batch_service.run_batch(SAMPLE_WORKBOOK, ["how many have no cyber insurance",
+                                                       "how many explode without cyber insurance"])
+    answers = [r["answer"] for r in result["results"]]
+    assert all(r["type"] == "count" for r in result["results"])
+    assert all(answer.endswith(f": {expected}") for answer in answers)
+
+
+def test_batch_queries_wait_for_their_admission_lane(monkeypatch):
+    controller = AdmissionController({"count": (8, 8, 0.5), "graph": (4, 4, 5.0), "generative": (1, 1, 1.0)},
+                                     max_wait=0.05)
+    monkeypatch.setattr(batch_service, "admission", controller)
+    monkeypatch.setattr(batch_service, "answer_generative_query", lambda *args, **kw: "answer")
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with controller.admit("generative"):
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(5)
+    done = []
+    batch = threading.Thread(target=lambda: done.append(batch_service.run_batch(
+        SAMPLE_WORKBOOK, ["summarise the riskiest vendors", "what stands out about healthcare vendors"])))
+    batch.start()
+    batch.join(0.5)
+    assert not done  # both questions are held back by the busy generative lane
+    release.set()
+    holder.join()
+    batch.join(10)
+    assert [r["answer"] for r in done[0]["results"]] == ["answer", "answer"]
+    assert controller.stats()["generative"]["admitted"] == 3
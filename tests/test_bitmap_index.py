@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.bitmap_index import Bitmap, BitmapIndex
+
+
+@pytest.fixture
+def masks():
+    rng = np.random.default_rng(0)
+    n_rows = 1003  # not a multiple of 8, to exercise the padding bits
+    return rng.random(n_rows) < 0.5, rng.random(n_rows) < 0.01
+
+
+def test_set_operations_match_boolean_masks(masks):
+    dense, sparse = masks
+    a, b = Bitmap.from_mask(dense).compact(), Bitmap.from_mask(sparse).compact()
+    assert b._positions is not None and a._bits is not None
+    assert np.array_equal((a & b).to_mask(), dense & sparse)
+    assert np.array_equal((b & b).to_mask(), sparse)
+    assert np.array_equal((a | b).to_mask(), dense | sparse)
+    assert np.array_equal((~a).to_mask(), ~dense)
+    assert (~a).count() == (~dense).sum()
+    assert (~b).count() == (~sparse).sum()
+
+
+def test_patched_matches_rebuilt(masks):
+    dense, sparse = masks
+    cleared = np.array([1, 2, 500, 1000])
+    added = np.array([3, 7, 1001, 1010])
+    for mask in (dense, sparse):
+        expected = np.zeros(1012, dtype=bool)
+        expected[:len(mask)] = mask
+        expected[cleared] = False
+        expected[added] = True
+        patched = Bitmap.from_mask(mask).compact().patched(1012, cleared, added)
+        assert np.array_equal(patched.to_mask(), expected)
+
+
+def test_index_counts_match_value_counts(sample_df):
+    index = BitmapIndex(sample_df)
+    for col in ("Primary Industry", "Cyber Insurance", "Revenue Range"):
+        assert index.has(col)
+        for value, count in sample_df[col].value_counts().items():
+            assert index.get(col, value).count() == count
+        assert index.null(col).count() == sample_df[col].isna().sum()
+    assert not index.has("Legal Name")
+    assert index.get("Cyber Insurance", "no such value").count() == 0
+
+
+def test_updated_index_matches_rebuilt(sample_df):
+    index = BitmapIndex(sample_df)
+    df = sample_df.copy()
+    changed = np.array([0, 5, 17, 999])
+    df.loc[changed, "Cyber Insurance"] = ["No", "Yes", None, "No"]
+    df.loc[changed, "Primary Industry"] = "Aerospace"
+    extra = df.iloc[:3].assign(**{"Primary Industry": "Retail"})
+    df = pd.concat([df, extra], ignore_index=True)
+    changed = np.concatenate([changed, np.arange(len(sample_df), len(df))])
+
+    updated, rebuilt = index.updated(df, changed), BitmapIndex(df)
+    for col in ("Cyber Insurance", "Primary Industry"):
+        assert sorted(map(str, updated.values(col))) == sorted(map(str, rebuilt.values(col)))
+        for value in rebuilt.values(col):
+            assert np.array_equal(updated.get(col, value).to_mask(), rebuilt.get(col, value).to_mask())
+        assert np.array_equal(updated.null(col).to_mask(), rebuilt.null(col).to_mask())
+
+
+def test_queries_leave_index_size_unchanged(sample_df):
+    from backend.services.dashboard_service import is_no, kpi_bitmaps
+    from backend.services.filter_engine import FilterContext
+
+    index = BitmapIndex(sample_df)
+    before = index.nbytes()
+    context = FilterContext(sample_df, bitmap_index=index)
+    for expression in ("`Primary Industry` == 'Retail' | `Primary Industry` == 'Healthcare'",
+                       "`Cyber Insurance` == 'No' & `Revenue Range` == '> $100M'",
+                       "not (`Business Continuity Plan` == 'No')"):
+        context.count(expression)
+    kpi_bitmaps(index, sample_df.index)
+    sparse = [b for values in index._bitmaps.values() for b in values.values() if b._bits is None]
+    assert sparse  # the sample has sparse values for the queries to touch
+    for bitmap in sparse:
+        (bitmap | index.where("Cyber Insurance", is_no)).count()
+        (~bitmap).count()
+    assert index.nbytes() == before
+    assert all(b._bits is None for b in sparse)
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from backend.services.context_service import build_dataset_digest, get_dataset_context
+
+
+def _text(lines):
+    return "\n".join(line for _, line in lines)
+
+
+def test_digest_summarises_sample(sample_df):
+    text = _text(build_dataset_digest(sample_df))
+    assert f"Rows: {len(sample_df)}" in text
+    assert "Primary Industry:" in text
+
+
+def test_date_range_and_all_missing_dates():
+    df = pd.DataFrame({
+        "Assessment Date": pd.to_datetime(["2024-01-05", None, "2024-03-01"]),
+        "Next Review": pd.Series([pd.NaT] * 3, dtype="datetime64[ns]"),
+    })
+    text = _text(build_dataset_digest(df))
+    assert "Assessment Date: 2024-01-05 to 2024-03-01" in text
+    assert "Next Review: no dates" in text
+
+
+def test_context_respects_token_budget(sample_df):
+    short = get_dataset_context(("test", "short"), sample_df, token_budget=50)
+    full = get_dataset_context(("test", "short"), sample_df, token_budget=2000)
+    assert len(short) < len(full)
+    assert short.startswith("Rows:")
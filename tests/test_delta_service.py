@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.bitmap_index import BitmapIndex
+from backend.services.delta_service import KEY_COLUMN, DeltaError, migrate_filter_results, upsert
+from backend.services.dtype_optimizer import optimize_dtypes
+from backend.services.filter_engine import FilterContext
+from backend.services.numeric_parsing import add_parsed_columns
+
+FILTERS = [
+    "`Cyber Insurance` == 'No'",
+    "`Primary Industry` == 'Aerospace' | `Number of Employees` > 4000",
+    "`Revenue Range Max (USD)` <= 1000000",
+]
+
+
+def _ingest(raw):
+    df, _ = optimize_dtypes(raw)
+    return add_parsed_columns(df)
+
+
+@pytest.fixture(scope="module")
+def base(sample_df):
+    return _ingest(sample_df)
+
+
+@pytest.fixture(scope="module")
+def delta(sample_df):
+    updated = sample_df.iloc[[3, 10, 11, 1999]].copy()
+    updated["Cyber Insurance"] = np.where(updated["Cyber Insurance"] == "Yes", "No", "Yes")
+    updated["Primary Industry"] = "Aerospace"  # a category the base doesn't have
+    updated["Revenue Range"] = "$1M - $10M"
+    unchanged = sample_df.iloc[[20]]
+    inserted = sample_df.iloc[[30, 31]].copy()
+    inserted[KEY_COLUMN] = ["NEW-0001", "NEW-0002"]
+    return pd.concat([updated, unchanged, inserted], ignore_index=True)
+
+
+def _reference(raw, delta):
+    """The merged workbook as plain pandas would build it: replace by key, append the rest."""
+    merged = raw.set_index(KEY_COLUMN)
+    rows = delta.set_index(KEY_COLUMN)
+    existing = rows.index.isin(merged.index)
+    merged.loc[rows.index[existing]] = rows[existing]
+    return pd.concat([merged, rows[~existing]]).reset_index()[raw.columns]
+
+
+def test_upsert_matches_full_rebuild(sample_df, base, delta):
+    merged, changes = upsert(base, delta)
+    rebuilt = _ingest(_reference(sample_df, delta))
+    assert len(merged) == len(rebuilt) == len(sample_df) + 2
+    assert list(merged.columns) == list(rebuilt.columns)
+    for col in merged.columns:
+        left = merged[col].astype(object).where(merged[col].notna(), None).tolist()
+        right = rebuilt[col].astype(object).where(rebuilt[col].notna(), None).tolist()
+        assert left == right, col
+    assert changes["updated"].tolist() == [3, 10, 11, 1999]
+    assert changes["inserted"].tolist() == [len(sample_df), len(sample_df) + 1]
+    assert changes["unchanged"] == 1
+    assert merged.dtypes["Number of Employees"] == base.dtypes["Number of Employees"]
+
+
+def test_patched_structures_match_rebuilt(base, delta):
+    index = BitmapIndex(base)
+    context = FilterContext(base, bitmap_index=index, dataset_key="v1")
+    for expression in FILTERS:
+        context.count(expression)
+
+    merged, changes = upsert(base, delta)
+    migrate_filter_results("v1", "v2", merged, changes)
+    migrated = FilterContext(merged, bitmap_index=index.updated(merged, changes["changed"]), dataset_key="v2")
+    fresh = FilterContext(merged)
+    for expression in FILTERS:
+        assert migrated.count(expression) == fresh.count(expression), expression
+
+
+def test_partial_columns_keep_current_values(base, sample_df):
+    delta = sample_df.iloc[[5]][[KEY_COLUMN, "Cyber Insurance"]].copy()
+    delta["Cyber Insurance"] = "No" if sample_df["Cyber Insurance"].iloc[5] == "Yes" else "Yes"
+    merged, changes = upsert(base, delta)
+    assert changes["updated"].tolist() == [5]
+    assert merged["Cyber Insurance"].iloc[5] == delta["Cyber Insurance"].iloc[0]
+    assert merged["Legal Name"].iloc[5] == base["Legal Name"].iloc[5]
+
+
+def test_duplicate_delta_keys_keep_the_last(base, sample_df):
+    rows = sample_df.iloc[[7, 7]].copy()
+    rows["Number of Employees"] = [111, 222]
+    merged, _ = upsert(base, rows)
+    assert merged["Number of Employees"].iloc[7] == 222
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda b, d: (b, d.drop(columns=[KEY_COLUMN])), "Delta workbook has no"),
+    (lambda b, d: (b.drop(columns=[KEY_COLUMN]), d), "Dataset has no"),
+    (lambda b, d: (b, d.assign(Extra=1)), "columns the dataset doesn't"),
+    (lambda b, d: (b, d.assign(**{KEY_COLUMN: None})), "rows without"),
+    (lambda b, d: (pd.concat([b, b.iloc[:1]], ignore_index=True), d), "not unique"),
+])
+def test_rejects_unusable_deltas(base, delta, change, message):
+    with pytest.raises(DeltaError, match=message):
+        upsert(*change(base, delta))
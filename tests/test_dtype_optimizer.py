@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from backend.services.dtype_optimizer import optimize_dtypes, plain_values
+from backend.services.filter_engine import FilterContext
+
+FILTERS = [
+    "`Cyber Insurance` == 'Yes'",
+    "`Primary Industry` in ['FinTech', 'Retail'] & `Number of Employees` > 2500",
+    "`Legal Name`.str.contains('Tech')",
+    "`Revenue Range` != '< $1M' | `Years in Operation` < 5",
+]
+
+
+@pytest.fixture(scope="module")
+def compacted(sample_df):
+    return optimize_dtypes(sample_df)
+
+
+def test_frame_is_smaller_and_values_unchanged(sample_df, compacted):
+    df, report = compacted
+    assert report["after_bytes"] < report["before_bytes"]
+    assert report["after_bytes"] == int(df.memory_usage(deep=True).sum())
+    assert list(df.columns) == list(sample_df.columns)
+    for col in sample_df.columns:
+        assert df[col].astype(object).where(df[col].notna(), None).tolist() == \
+            sample_df[col].astype(object).where(sample_df[col].notna(), None).tolist(), col
+
+
+def test_conversion_kinds(compacted):
+    df, report = compacted
+    converted = report["converted"]
+    assert "Cyber Insurance" in converted["yes_no"]
+    assert "Primary Industry" in converted["category"]
+    assert "Legal Name" not in sum(converted.values(), [])
+    assert isinstance(df["Cyber Insurance"].dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.parametrize("expression", FILTERS)
+def test_filters_count_the_same(sample_df, compacted, expression):
+    df, _ = compacted
+    assert FilterContext(df).count(expression) == len(sample_df.query(expression, engine="python"))
+
+
+def test_value_counts_match_after_plain_values(sample_df, compacted):
+    df, _ = compacted
+    for col in ("Primary Industry", "Cyber Insurance"):
+        assert plain_values(df[col]).value_counts().to_dict() == sample_df[col].value_counts().to_dict()
+
+
+def test_text_dates_and_small_integers():
+    df = pd.DataFrame({
+        "Assessment Date": ["2024-01-05", "2024-02-10", None, "2024-03-01"],
+        "Notes Date": ["soon", "2024-02-10", "later", "2024-03-01"],  # not all dates: left alone
+        "Employees": pd.Series([10, 20, 30, 40], dtype="int64"),
+    })
+    optimized, report = optimize_dtypes(df)
+    assert pd.api.types.is_datetime64_any_dtype(optimized["Assessment Date"])
+    assert optimized["Assessment Date"].isna().sum() == 1
+    assert optimized["Notes Date"].dtype == df["Notes Date"].dtype
+    assert optimized["Employees"].dtype == "int8"
+    assert report["converted"]["integer"] == ["Employees"]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from backend.services.bitmap_index import Bitmap
+from backend.services.filter_cache import ENTRY_OVERHEAD_BYTES, FilterResultCache
+
+
+def _sparse(n_rows=80_000, n_set=100):
+    return Bitmap.from_positions(np.arange(0, n_set * 7, 7), n_rows).compact()
+
+
+def test_get_put_and_lru_eviction():
+    bitmap = _sparse()
+    size = bitmap.nbytes() + ENTRY_OVERHEAD_BYTES
+    cache = FilterResultCache(max_bytes=2 * size)
+    cache.put(("a", 1), bitmap)
+    cache.put(("a", 2), bitmap)
+    assert cache.get(("a", 1)).count() == bitmap.count()  # now most recent
+    cache.put(("a", 3), bitmap)
+    assert cache.get(("a", 2)) is None
+    assert cache.get(("a", 1)) is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["bytes"] == 2 * size
+
+
+def test_materialising_bits_does_not_grow_entries():
+    cache = FilterResultCache()
+    bitmap = _sparse()
+    cache.put(("d", "plan"), bitmap)
+    before = cache.stats()["bytes"]
+    hit = cache.get(("d", "plan"))
+    hit.bits  # packs the positions into bits on the returned handle
+    (hit & _sparse()).count()
+    bitmap.bits  # and on the caller's own handle
+    assert cache.stats()["bytes"] == before
+    stored = cache._entries[("d", "plan")][0]
+    held = sum(a.nbytes for a in (stored._bits, stored._positions) if a is not None)
+    assert held + ENTRY_OVERHEAD_BYTES == before
+
+
+def test_oversized_result_is_not_cached():
+    cache = FilterResultCache(max_bytes=10)
+    cache.put(("d", "plan"), _sparse())
+    assert cache.get(("d", "plan")) is None
+
+
+def test_invalidate_and_migrate():
+    cache = FilterResultCache()
+    cache.put(("old", "p1"), _sparse())
+    cache.put(("old", "p2"), _sparse())
+    cache.put(("other", "p1"), _sparse())
+    cache.migrate("old", "new", lambda plan, bitmap: Bitmap.empty(bitmap.n_rows))
+    assert cache.get(("old", "p1")) is None
+    assert cache.get(("new", "p2")).count() == 0
+    cache.invalidate("other")
+    assert cache.get(("other", "p1")) is None
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,80 @@
+import pytest
+
+from backend.services.bitmap_index import BitmapIndex
+from backend.services.filter_engine import FilterContext, FilterError, canonicalize, compile_filter
+
+# Each is answered by df.query; the compiled engine must agree row for row
+EQUIVALENT_FILTERS = [
+    "`Cyber Insurance` == 'Yes'",
+    "`Cyber Insurance` == 'Yes' & `Formal InfoSec Policy` == 'No'",
+    "`Cyber Insurance` == 'Yes' | `Formal InfoSec Policy` == 'No'",
+    "(`Cyber Insurance` == 'Yes') & (`Formal InfoSec Policy` == 'No')",
+    "`Cyber Insurance` == 'No' & `Business Continuity Plan` == 'No' | `Primary Industry` == 'FinTech'",
+    "(`Cyber Insurance` == 'No' | `Business Continuity Plan` == 'No') & `Primary Industry` == 'FinTech'",
+    "~(`Cyber Insurance` == 'Yes')",
+    "~(`Cyber Insurance` == 'Yes' & `Formal InfoSec Policy` == 'No')",
+    "`Cyber Insurance` == 'Yes' and not `Formal InfoSec Policy` == 'No'",
+    "`Number of Employees` > 1000 & `Years in Operation` <= 10",
+    "1000 < `Number of Employees` < 5000",
+    "`Primary Industry` in ['FinTech', 'Healthcare'] | `Revenue Range` not in ['< $1M']",
+    "`Primary Industry` == ['FinTech', 'Retail']",
+    "`Legal Name`.str.contains('Tech')",
+    "`Legal Name`.str.contains('tech', case=False) & `Cyber Insurance` == 'No'",
+    "`Legal Name`.str.startswith('A') | `Legal Name`.str.endswith('Ltd')",
+    "`Trade Name`.isna() | `Trade Name` == 'LLC'",
+]
+
+
+def _query_count(df, expression):
+    return len(df.query(expression, engine="python"))
+
+
+@pytest.mark.parametrize("expression", EQUIVALENT_FILTERS)
+def test_counts_match_df_query(sample_df, expression):
+    context = FilterContext(sample_df)
+    assert context.count(expression) == _query_count(sample_df, expression)
+
+
+@pytest.mark.parametrize("expression", EQUIVALENT_FILTERS)
+def test_rows_match_df_query(sample_df, expression):
+    expected = sample_df.query(expression, engine="python").index
+    assert list(FilterContext(sample_df).apply(expression).index) == list(expected)
+
+
+@pytest.mark.parametrize("expression", EQUIVALENT_FILTERS)
+def test_bitmap_index_and_cache_agree(sample_df, expression):
+    context = FilterContext(sample_df, bitmap_index=BitmapIndex(sample_df), dataset_key="sample")
+    expected = _query_count(sample_df, expression)
+    assert context.count(expression) == expected
+    # Second call is a cache hit
+    assert context.count(expression) == expected
+
+
+def test_unparenthesized_ampersand_binds_looser_than_comparison(sample_df):
+    expression = "`Cyber Insurance` == 'Yes' & `Formal InfoSec Policy` == 'No'"
+    plan = compile_filter(expression, tuple(sample_df.columns))
+    assert plan[0] == "and"
+
+
+def test_operators_inside_string_literals_are_kept(sample_df):
+    df = sample_df.assign(**{"Notes": ["R&D | Ops" if i % 2 else "Sales" for i in range(len(sample_df))]})
+    assert FilterContext(df).count("`Notes` == 'R&D | Ops'") == len(df) // 2
+
+
+def test_canonical_form_ignores_operand_order(sample_df):
+    columns = tuple(sample_df.columns)
+    a = compile_filter("`Cyber Insurance` == 'No' & `Primary Industry` == 'Retail'", columns)
+    b = compile_filter("`Primary Industry` == 'Retail' and `Cyber Insurance` == 'No'", columns)
+    assert canonicalize(a) == canonicalize(b)
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "`Legal Name`.apply(print)",
+    "`Number of Employees` > `Years in Operation`",
+    "`No Such Column` == 1",
+    "`Cyber Insurance` ==",
+])
+def test_rejects_unsupported_or_invalid(sample_df, expression):
+    with pytest.raises(FilterError):
+        compile_filter(expression, tuple(sample_df.columns))
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from backend.services.job_queue import CANCELLED, FAILED, QUEUED, SUCCEEDED, JobQueue, JobQueueFull
+from backend.services.rate_limiter import RequestCancelled
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=1, max_pending=2)
+
+
+def test_job_runs_and_result_is_persisted(jobs, tmp_path):
+    job_id = jobs.submit("query", lambda cancel: {"answer": 42}, params={"q": "x"})
+    job = jobs.get(job_id, wait=5)
+    assert job["status"] == SUCCEEDED and job["result"] == {"answer": 42}
+    # A new queue on the same file (e.g. after a restart) still knows the job
+    reopened = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"))
+    assert reopened.get(job_id)["result"] == {"answer": 42}
+
+
+def test_jobs_interrupted_by_a_restart_report_failed(jobs, tmp_path):
+    release = threading.Event()
+    started = threading.Event()
+
+    def block(cancel):
+        started.set()
+        release.wait(5)
+
+    running = jobs.submit("query", block)
+    started.wait(5)
+    waiting = jobs.submit("query", lambda cancel: "never")
+    restarted = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"))
+    for job_id in (running, waiting):
+        job = restarted.get(job_id)
+        assert job["status"] == FAILED and job["error"] == "Server restarted before the job finished"
+    release.set()
+
+
+def test_failures_and_cancellation_are_reported(jobs):
+    def fail(cancel):
+        raise ValueError("boom")
+
+    def cancelled(cancel):
+        raise RequestCancelled("stop")
+
+    failed = jobs.get(jobs.submit("query", fail), wait=5)
+    assert failed["status"] == FAILED and failed["error"] == "boom"
+    assert jobs.get(jobs.submit("query", cancelled), wait=5)["status"] == CANCELLED
+
+
+def test_queued_job_cancels_at_once_and_queue_is_bounded(jobs):
+    release = threading.Event()
+    started = threading.Event()
+
+    def block(cancel):
+        started.set()
+        release.wait(5)
+        return "done"
+
+    running = jobs.submit("query", block)
+    started.wait(5)
+    waiting = jobs.submit("query", lambda cancel: "never")
+    assert jobs.get(waiting)["status"] == QUEUED
+    jobs.submit("query", lambda cancel: "later")
+    with pytest.raises(JobQueueFull):
+        jobs.submit("query", lambda cancel: "too many")
+    assert jobs.cancel(waiting)["status"] == CANCELLED
+    release.set()
+    assert jobs.get(running, wait=5)["status"] == SUCCEEDED
+    assert jobs.get(waiting)["status"] == CANCELLED
+
+
+def test_running_job_sees_cancel_event(jobs):
+    started = threading.Event()
+
+    def cooperative(cancel):
+        started.set()
+        cancel.wait(5)
+        return "partial"
+
+    job_id = jobs.submit("query", cooperative)
+    started.wait(5)
+    jobs.cancel(job_id)
+    assert jobs.get(job_id, wait=5)["status"] == CANCELLED
+
+
+def test_unknown_job(jobs):
+    assert jobs.get("nope") is None
+    assert jobs.cancel("nope") is None
@@ -0,0 +1,136 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services import llm_service
+
+
+def _no_llm(prompt, **kwargs):
+    raise AssertionError("unexpected LLM call")
+
+
+def test_map_reduce_on_empty_frame_skips_the_model(monkeypatch, sample_df):
+    monkeypatch.setattr(llm_service, "_call_llm", _no_llm)
+    progress = []
+    answer = llm_service.answer_map_reduce(sample_df.iloc[:0], "how many vendors?",
+                                           progress_callback=lambda done, total: progress.append((done, total)))
+    assert "no rows" in answer
+    assert progress == [(1, 1)]
+
+
+def test_map_reduce_calls_map_then_reduce(monkeypatch, sample_df):
+    prompts = []
+
+    def fake(prompt, **kwargs):
+        prompts.append(prompt)
+        return "NO RELEVANT DATA" if "part" in prompt and "Extract only" in prompt else "final"
+    monkeypatch.setattr(llm_service, "_call_llm", fake)
+    answer = llm_service.answer_map_reduce(sample_df.head(50), "q", chunk_tokens=2000)
+    assert answer == "final"
+    assert len(prompts) >= 2
+
+
+@pytest.mark.parametrize("body", [
+    {"filename": "x.xlsx", "query": "q", "mode": "everything"},
+    {"filename": "x.xlsx", "query": "q", "mode": ""},
+])
+def test_unknown_mode_is_rejected(body):
+    from backend.main import app
+    assert TestClient(app).post("/query/", json=body).status_code == 422
+
+
+def test_unknown_batch_mode_is_rejected():
+    from backend.main import app
+    body = {"filename": "x.xlsx", "queries": ["q"], "mode": "fast"}
+    assert TestClient(app).post("/query/batch", json=body).status_code == 422
+
+
+# ---------- Hedged calls ----------
+
+@pytest.fixture
+def latency(monkeypatch):
+    from backend.services.histogram import LatencyHistogram
+    histograms = {"ollama": LatencyHistogram(), "gemini": LatencyHistogram()}
+    monkeypatch.setattr(llm_service, "_engine_latency", histograms)
+    return histograms
+
+
+def _engines(monkeypatch, ollama, gemini, delay=0.2):
+    """Stub both engines; returns {engine: (seconds after the call started, cancel_event)}."""
+    calls = {}
+    began = time.monotonic()
+
+    def fake_ollama(prompt, format_json=False, timeout=60, cancel_event=None):
+        calls["ollama"] = (time.monotonic() - began, cancel_event)
+        return ollama(cancel_event)
+
+    def fake_gemini(prompt, api_key, timeout=60, format_json=False, priority=0, cancel_event=None):
+        calls["gemini"] = (time.monotonic() - began, cancel_event)
+        return gemini(cancel_event)
+
+    monkeypatch.setattr(llm_service, "_call_ollama", fake_ollama)
+    monkeypatch.setattr(llm_service, "_call_gemini", fake_gemini)
+    monkeypatch.setattr(llm_service, "_hedge_delay", lambda: delay)
+    return calls
+
+
+def _hedged():
+    return llm_service._call_llm_hedged("prompt", "key", format_json=False, timeout=5, priority=0)
+
+
+def _slow(answer, seconds=2.0):
+    def call(cancel_event):
+        if cancel_event.wait(seconds):
+            raise llm_service.RequestCancelled("cancelled")
+        return answer
+    return call
+
+
+def test_hedge_delay_follows_ollama_latency(latency):
+    assert llm_service._hedge_delay() == llm_service.LLM_HEDGE_DEFAULT_DELAY
+    for _ in range(llm_service.LLM_HEDGE_MIN_SAMPLES):
+        latency["ollama"].observe(2.0)
+    assert llm_service.LLM_HEDGE_MIN_DELAY <= llm_service._hedge_delay() <= 2.5
+    for _ in range(100):
+        latency["ollama"].observe(1000.0)
+    assert llm_service._hedge_delay() == llm_service.LLM_HEDGE_MAX_DELAY
+
+
+def test_fast_primary_answers_without_hedging(monkeypatch, latency):
+    calls = _engines(monkeypatch, lambda cancel: "ollama", _no_llm)
+    assert _hedged() == "ollama"
+    assert "gemini" not in calls
+    assert latency["ollama"].count == 1
+
+
+def test_slow_primary_is_hedged_after_the_delay_and_cancelled(monkeypatch, latency):
+    calls = _engines(monkeypatch, _slow("ollama"), lambda cancel: "gemini", delay=0.2)
+    start = time.monotonic()
+    assert _hedged() == "gemini"
+    assert time.monotonic() - start < 1.5
+    assert 0.2 <= calls["gemini"][0] < 1.0  # not before the hedge delay
+    assert calls["ollama"][1].is_set()  # the losing call is told to stop
+
+
+def test_first_successful_engine_wins(monkeypatch, latency):
+    _engines(monkeypatch, _slow("ollama", 0.4), _slow("gemini", 1.5), delay=0.1)
+    assert _hedged() == "ollama"
+
+
+def test_failed_primary_falls_back_at_once(monkeypatch, latency):
+    def fail(cancel_event):
+        raise RuntimeError("ollama down")
+    calls = _engines(monkeypatch, fail, lambda cancel: "gemini", delay=5)
+    assert _hedged() == "gemini"
+    assert calls["gemini"][0] < 1.0  # didn't wait out the hedge delay
+
+
+def test_both_engines_failing_raises_the_last_error(monkeypatch, latency):
+    def fail(message):
+        def call(cancel_event):
+            raise RuntimeError(message)
+        return call
+    _engines(monkeypatch, fail("ollama down"), fail("gemini down"))
+    with pytest.raises(RuntimeError, match="gemini down"):
+        _hedged()
@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from backend.services.nl_filter import NLFilterParser
+from tests.conftest import ROOT_PATH
+
+with open(os.path.join(ROOT_PATH, "benchmarks", "nl_filter_corpus.json")) as f:
+    CORPUS = json.load(f)
+
+
+@pytest.fixture(scope="module")
+def parser(sample_df):
+    return NLFilterParser(sample_df)
+
+
+@pytest.mark.parametrize("item", CORPUS, ids=lambda item: item["query"])
+def test_corpus(parser, sample_df, item):
+    result = parser.parse(item["query"])
+    if item["expected"] is None:
+        assert result is None
+    else:
+        assert result is not None
+        assert sample_df.query(result).index.equals(sample_df.query(item["expected"]).index)
+
+
+@pytest.mark.parametrize("query", [
+    "how many vendors are not in Retail",
+    "how many vendors never had a major breach reported",
+    "how many vendors do not have fewer than 100 employees",
+    "how many vendors have bcp but no cyber insurance",
+])
+def test_unused_negation_goes_to_llm(parser, query):
+    assert parser.parse(query) is None
+
+
+def test_negation_stops_at_conjunction(parser):
+    assert parser.parse("how many vendors have no cyber insurance and a BCP") == \
+        "`Cyber Insurance` == 'No' and `Business Continuity Plan` == 'Yes'"
+    assert parser.parse("how many vendors are missing BCP and cyber insurance") == \
+        "`Business Continuity Plan` == 'No' and `Cyber Insurance` == 'No'"
+
+
+def test_contraction(parser):
+    assert parser.parse("how many vendors don’t have a BCP") == "`Business Continuity Plan` == 'No'"
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services.numeric_parsing import add_parsed_columns, add_parsed_columns_like, derived_columns
+
+
+def test_sample_workbook_gains_parsed_columns(sample_df):
+    df = add_parsed_columns(sample_df)
+    derived = derived_columns(df)
+    assert derived["RTO (seconds)"] == {"source": "RTO", "unit": "seconds"}
+    assert derived["Revenue Range Max (USD)"] == {"source": "Revenue Range", "unit": "USD"}
+    hours = sample_df["RTO"].str.extract(r"(\d+)")[0].astype(float) * 3600
+    assert np.array_equal(df["RTO (seconds)"].to_numpy(), hours.to_numpy())
+    assert list(sample_df.columns) == list(df.columns[:len(sample_df.columns)])
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("4 hours", 14_400), ("30 minutes", 1_800), ("1,200 s", 1_200), ("2 d", 172_800), ("1.5 h", 5_400),
+])
+def test_durations(text, seconds):
+    df = add_parsed_columns(pd.DataFrame({"RTO": [text, "1 hour"]}))
+    assert df["RTO (seconds)"].iloc[0] == seconds
+
+
+@pytest.mark.parametrize("text, low, high", [
+    ("$10M - $50M", 10e6, 50e6),
+    ("$1.5K to $2K", 1_500, 2_000),
+    ("< $1M", 0, 1e6),
+    ("under $500K", 0, 500e3),
+    ("> $100M", 100e6, np.nan),
+    ("$1B+", 1e9, np.nan),
+])
+def test_money_ranges(text, low, high):
+    df = add_parsed_columns(pd.DataFrame({"Revenue": [text, "$1M - $2M"]}))
+    assert df["Revenue Min (USD)"].iloc[0] == low
+    hi = df["Revenue Max (USD)"].iloc[0]
+    assert (np.isnan(hi) and np.isnan(high)) or hi == high
+
+
+def test_free_text_and_mixed_columns_are_left_alone():
+    df = pd.DataFrame({
+        "Name": ["Acme", "Globex", "Initech"],
+        "Mixed": ["4 hours", "ASAP", "2 hours"],
+        "Blank": [None, None, None],
+    })
+    assert add_parsed_columns(df) is df
+
+
+def test_missing_values_stay_missing():
+    df = add_parsed_columns(pd.DataFrame({"RTO": ["4 hours", None, "2 hours"]}))
+    assert np.isnan(df["RTO (seconds)"].iloc[1])
+
+
+def test_new_rows_parse_like_reference(sample_df):
+    reference = add_parsed_columns(sample_df)
+    rows = sample_df.iloc[:5].copy()
+    rows.loc[rows.index[0], "RTO"] = "not a duration"
+    parsed = add_parsed_columns_like(rows, reference)
+    assert list(parsed.columns) == list(reference.columns)
+    assert np.isnan(parsed["RTO (seconds)"].iloc[0])
+    pd.testing.assert_series_equal(parsed["Revenue Range Min (USD)"], reference["Revenue Range Min (USD)"].iloc[:5])
@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+from backend.services import portfolio_service
+from backend.services.aggregate_cube import AggregateCube, group_aggregate
+from backend.services.excel_service import build_graph_data, count_with_filter
+from backend.services.portfolio_service import (
+    Portfolio, PortfolioError, _merge_crosstabs, _merge_partials, delete_portfolio, get_portfolio_filenames,
+    save_portfolio
+)
+
+CONFIGS = [
+    {"x_col": "Primary Industry", "y_col": None, "aggregation": "count", "graph_type": "bar"},
+    {"x_col": "Revenue Range", "y_col": "Number of Employees", "aggregation": "mean", "graph_type": "bar"},
+    {"x_col": "Primary Industry", "y_col": "Years in Operation", "aggregation": "min", "graph_type": "bar"},
+    {"x_col": "Primary Industry", "y_col": "Number of Employees", "aggregation": "sum", "graph_type": "bar",
+     "filter": "`Cyber Insurance` == 'No'"},
+    {"x_col": "Primary Industry", "y_col": "Number of Employees", "aggregation": "max", "graph_type": "bar"},
+    {"x_col": "Primary Industry", "y_col": "Number of Employees", "aggregation": "median", "graph_type": "bar"},
+    {"x_col": "Primary Industry", "y_col": None, "aggregation": "count", "graph_type": "heatmap",
+     "group_col": "Revenue Range"},
+]
+
+
+@pytest.fixture(scope="module")
+def workbooks(sample_df, tmp_path_factory):
+    """The sample split into three workbooks, plus the whole of it as one."""
+    directory = tmp_path_factory.mktemp("portfolio")
+    paths = []
+    for i, part in enumerate((sample_df.iloc[:700], sample_df.iloc[700:1500], sample_df.iloc[1500:])):
+        paths.append(str(directory / f"unit{i}.xlsx"))
+        part.to_excel(paths[-1], index=False)
+    whole = str(directory / "all.xlsx")
+    sample_df.to_excel(whole, index=False)
+    return paths, whole
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda c: f"{c['aggregation']}-{c['graph_type']}")
+def test_charts_match_one_combined_workbook(workbooks, config):
+    paths, whole = workbooks
+    assert Portfolio("p", paths).graph_data([config]) == build_graph_data(whole, [config])
+
+
+@pytest.mark.parametrize("expression", [
+    "`Cyber Insurance` == 'No'",
+    "`Number of Employees` > 1000 & `Business Continuity Plan` == 'No'",
+    "bogus ==",
+])
+def test_counts_match_one_combined_workbook(workbooks, expression):
+    paths, whole = workbooks
+    assert Portfolio("p", paths).count_answer(expression) == count_with_filter(whole, expression)
+
+
+def test_concat_names_each_rows_workbook(workbooks, sample_df):
+    paths, _ = workbooks
+    portfolio = Portfolio("p", paths)
+    frame = portfolio.concat(["Legal Name"], "`Cyber Insurance` == 'No'")
+    assert list(frame.columns) == ["Legal Name", portfolio_service.SOURCE_COLUMN]
+    assert len(frame) == (sample_df["Cyber Insurance"] == "No").sum()
+    assert portfolio.n_rows == len(sample_df)
+    assert frame[portfolio_service.SOURCE_COLUMN].unique().tolist() == ["unit0.xlsx", "unit1.xlsx", "unit2.xlsx"]
+
+
+def test_merge_partials_equals_groupby_on_union(sample_df):
+    parts = [sample_df.iloc[:500], sample_df.iloc[500:]]
+    partials = [AggregateCube(part).partials("Revenue Range", "Number of Employees") for part in parts]
+    for aggregation in ("count", "sum", "mean", "min", "max"):
+        merged = _merge_partials(partials, "Revenue Range", "Number of Employees", aggregation)
+        expected = group_aggregate(sample_df, "Revenue Range", "Number of Employees", aggregation)
+        pd.testing.assert_frame_equal(merged, expected, check_dtype=False)
+    with pytest.raises(ValueError):
+        _merge_partials(partials, "Revenue Range", "Number of Employees", "median")
+
+
+def test_merge_crosstabs_adds_cells_and_aligns_labels():
+    a = pd.DataFrame([[1, 0], [2, 3]], index=["x", "y"], columns=["p", "q"])
+    b = pd.DataFrame([[4]], index=["z"], columns=["q"])
+    merged = _merge_crosstabs([a, b])
+    assert merged.loc["z", "q"] == 4 and merged.loc["y", "q"] == 3 and merged.loc["z", "p"] == 0
+    assert merged.dtypes.eq("int64").all()
+
+
+def test_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(portfolio_service, "PORTFOLIO_FILE", str(tmp_path / "portfolios.json"))
+    save_portfolio("emea", ["a.xlsx", "b.xlsx"])
+    assert get_portfolio_filenames("emea") == ["a.xlsx", "b.xlsx"]
+    for name, files in (("bad name!", ["a.xlsx"]), ("ok", []), ("ok", ["a.xlsx", "a.xlsx"])):
+        with pytest.raises(PortfolioError):
+            save_portfolio(name, files)
+    assert delete_portfolio("emea")
+    assert not delete_portfolio("emea")
+    assert get_portfolio_filenames("emea") is None
+
+
+def test_workbook_spans_reach_the_request_trace(workbooks):
+    from backend.services.tracing import trace_request
+    paths, _ = workbooks
+    with trace_request("test") as trace:
+        Portfolio("p", paths).count("`Cyber Insurance` == 'No'")
+    assert trace.stages["filter_count"][1] == len(paths)
+
+
+def test_workbooks_must_share_columns(workbooks, sample_df, tmp_path):
+    paths, _ = workbooks
+    Portfolio("p", paths).check_schema()
+    narrow = str(tmp_path / "narrow.xlsx")
+    sample_df.drop(columns=["Cyber Insurance"]).head(50).to_excel(narrow, index=False)
+    portfolio = Portfolio("p", paths + [narrow])
+    with pytest.raises(PortfolioError, match="narrow.xlsx.*lacks Cyber Insurance"):
+        portfolio.check_schema()
+    assert "Cyber Insurance" not in portfolio.columns
+    assert portfolio.columns == [col for col in Portfolio("p", paths).columns if col != "Cyber Insurance"]
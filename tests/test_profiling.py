@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services.profiling import Profiler, profiler
+
+
+def test_header_ignored_by_default(tmp_path):
+    p = Profiler(directory=str(tmp_path), sample_rate=0)
+    assert p.choose_mode("1") is None
+
+
+def test_header_needs_token_when_one_is_set(tmp_path):
+    p = Profiler(directory=str(tmp_path), sample_rate=0, allow_header=True, admin_token="secret")
+    assert p.choose_mode("sampling") is None
+    assert p.choose_mode("sampling", "wrong") is None
+    assert p.choose_mode("sampling", "secret") == "sampling"
+    assert p.choose_mode("1", "secret") == p.mode
+    assert p.choose_mode("off", "secret") is None
+
+
+def test_header_allowed_without_token_when_enabled(tmp_path):
+    p = Profiler(directory=str(tmp_path), sample_rate=0, allow_header=True, admin_token="")
+    assert p.choose_mode("cprofile") == "cprofile"
+
+
+def test_authorized_requires_configured_token(tmp_path):
+    assert not Profiler(directory=str(tmp_path), admin_token="").authorized("")
+    assert not Profiler(directory=str(tmp_path), admin_token="").authorized(None)
+    assert Profiler(directory=str(tmp_path), admin_token="t").authorized("t")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from backend.main import app
+    monkeypatch.setattr(profiler, "sample_rate", profiler.sample_rate)
+    monkeypatch.setattr(profiler, "allow_header", profiler.allow_header)
+    return TestClient(app)
+
+
+def test_config_endpoint_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(profiler, "admin_token", "")
+    response = client.put("/profiling/config", json={"sample_rate": 1.0})
+    assert response.status_code == 403
+    assert profiler.sample_rate != 1.0
+
+
+def test_config_endpoint_checks_token(client, monkeypatch):
+    monkeypatch.setattr(profiler, "admin_token", "secret")
+    assert client.put("/profiling/config", json={"sample_rate": 0.5},
+                      headers={"X-Profile-Token": "nope"}).status_code == 403
+    response = client.put("/profiling/config", json={"sample_rate": 0.5}, headers={"X-Profile-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["sample_rate"] == 0.5
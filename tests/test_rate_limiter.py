@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from backend.services.rate_limiter import (
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, PriorityScheduler, RateLimitExceeded, RequestCancelled, TokenBucket
+)
+
+
+def test_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate_per_minute=60, capacity=10)
+    now = bucket.updated
+    bucket.consume(10, now)
+    assert bucket.time_until(5, now) == pytest.approx(5.0)
+    assert bucket.time_until(5, now + 5) == 0.0
+    bucket._refill(now + 1000)
+    assert bucket.tokens == 10
+
+
+def test_refund_never_exceeds_capacity():
+    bucket = TokenBucket(rate_per_minute=600, capacity=100)
+    now = bucket.updated
+    bucket.consume(-50, now)
+    assert bucket.tokens == 100
+
+
+def test_reconcile_refund_does_not_allow_a_burst():
+    scheduler = PriorityScheduler(rpm=1000, tpm=1000, max_wait=0.01)
+    scheduler.acquire(400)
+    scheduler.reconcile(estimated_tokens=400, actual_tokens=0)
+    scheduler.reconcile(estimated_tokens=400, actual_tokens=0)
+    assert scheduler._tokens.tokens <= scheduler._tokens.capacity
+    scheduler.acquire(1000)
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire(400)
+
+
+def test_reconcile_charges_underestimates():
+    scheduler = PriorityScheduler(rpm=1000, tpm=1000, max_wait=0.01)
+    scheduler.acquire(100)
+    scheduler.reconcile(estimated_tokens=100, actual_tokens=900)
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        scheduler.acquire(500)
+    assert excinfo.value.retry_after > 0
+
+
+def test_rejects_when_queue_is_full():
+    scheduler = PriorityScheduler(rpm=1, tpm=10_000, max_queue=0)
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire(10)
+
+
+def test_waiters_are_served_by_priority():
+    scheduler = PriorityScheduler(rpm=600, tpm=100_000, max_wait=10)
+    scheduler._requests.tokens = 0  # next request slot opens in 0.1s
+    order = []
+
+    def call(name, priority):
+        scheduler.acquire(1, priority=priority)
+        order.append(name)
+
+    bulk = threading.Thread(target=call, args=("bulk", PRIORITY_BULK))
+    bulk.start()
+    while scheduler.queue_depth() < 1:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=call, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    bulk.join()
+    interactive.join()
+    assert order == ["interactive", "bulk"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    scheduler = PriorityScheduler(rpm=1, tpm=10_000, max_wait=120)
+    scheduler.acquire(1)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(RequestCancelled):
+        scheduler.acquire(1, cancel_event=cancel)
+    assert scheduler.queue_depth() == 0
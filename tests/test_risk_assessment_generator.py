@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from risk_assessment_generator import COLUMNS, _registration_numbers, generate_chunks
+
+KEY = "Business Registration Number"
+
+
+def test_registration_numbers_are_unique_across_chunks():
+    df = pd.concat(generate_chunks(50_000, seed=7, chunk_size=7_000), ignore_index=True)
+    assert list(df.columns) == COLUMNS
+    assert len(df) == 50_000
+    assert df[KEY].is_unique
+    assert df[KEY].str.fullmatch(r"[0-9a-f]{8}-[0-9a-f]{3}").all()
+
+
+def test_chunk_size_does_not_change_the_numbers():
+    a = pd.concat(generate_chunks(1_000, seed=3, chunk_size=1_000), ignore_index=True)
+    b = pd.concat(generate_chunks(1_000, seed=3, chunk_size=250), ignore_index=True)
+    assert a[KEY].tolist() == b[KEY].tolist()
+
+
+def test_same_seed_same_output():
+    a = next(generate_chunks(500, seed=11))
+    b = next(generate_chunks(500, seed=11))
+    pd.testing.assert_frame_equal(a, b)
+
+
+def test_other_seeds_do_not_reuse_numbers():
+    base = pd.concat(generate_chunks(20_000, seed=7), ignore_index=True)
+    delta = pd.concat(generate_chunks(2_000, seed=11), ignore_index=True)
+    assert not delta[KEY].isin(base[KEY]).any()
+
+
+def test_ids_near_the_wrap_stay_distinct():
+    numbers = _registration_numbers((1 << 44) - 1_000, 2_000)
+    assert len(np.unique(numbers)) == 2_000